@@ -0,0 +1,1209 @@
+import sys
+import os
+import re
+import time
+import random
+from typing import Callable, Dict, List
+
+# Import NLP
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "nlp"))
+
+from test_cases import TEST_CASES
+
+# ==============================================================================
+# BENCHMARK NLP: đo hiệu năng từng thành phần
+# Chạy: python benchmark.py            -> chạy tất cả
+#       python benchmark.py translate  -> chỉ chạy benchmark "translate"
+# ==============================================================================
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {}
+
+
+def benchmark(name: str):
+    """Đăng ký một hàm benchmark theo tên."""
+    def decorator(fn: Callable[[], None]) -> Callable[[], None]:
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+
+def time_per_call(fn: Callable, inputs: List, repeat: int = 5) -> float:
+    """Thời gian trung bình mỗi lần gọi (micro giây), lấy lần chạy nhanh nhất."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for x in inputs:
+            fn(x)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(inputs), 1) * 1e6
+
+
+def corpus() -> List[str]:
+    """Các câu lệnh trong test_cases.py."""
+    return [case["text"] for case in TEST_CASES]
+
+
+def print_header(title: str):
+    print("\n" + "=" * 90)
+    print(f"⏱️  {title}")
+    print("=" * 90)
+
+
+# ==============================================================================
+# 1. DỊCH TỪ ĐIỂN: regex từng khóa (cũ) vs trie DictMatcher
+# ==============================================================================
+def _legacy_dict_translation(text: str, dictionary: dict) -> str:
+    """Cài đặt cũ của Preprocessor._apply_dict_translation (mỗi khóa một lần re.finditer)."""
+    sorted_keys = sorted(dictionary.keys(), key=len, reverse=True)
+    for key in sorted_keys:
+        pattern = r'(?<!\w)' + re.escape(key) + r'(?!\w)'
+        matches = list(re.finditer(pattern, text, re.IGNORECASE))
+        for match in reversed(matches):
+            start, end = match.span()
+            text = text[:start] + dictionary[key] + text[end:]
+    return text
+
+
+@benchmark("translate")
+def bench_translate():
+    from preprocessor import Preprocessor
+    from dict_matcher import DictMatcher
+
+    print_header("DỊCH TỪ ĐIỂN (ambiguity + en_vi + replace)")
+    p = Preprocessor()
+    texts = [p._basic_normalize(t) for t in corpus()]
+    dicts = [p.ambiguity_dict, p.en_vi_dict, p.replace_dict]
+
+    def legacy(text):
+        for d in dicts:
+            text = _legacy_dict_translation(text, d)
+        return text
+
+    def trie(text):
+        for m in (p.ambiguity_matcher, p.en_vi_matcher, p.replace_matcher):
+            text = m.translate(text)
+        return text
+
+    mismatches = sum(legacy(t) != trie(t) for t in texts)
+    print(f"{'Cài đặt':<25} | {'µs/câu':>10}")
+    print("-" * 40)
+    print(f"{'regex từng khóa':<25} | {time_per_call(legacy, texts, 3):>10.1f}")
+    print(f"{'DictMatcher':<25} | {time_per_call(trie, texts):>10.1f}")
+    print(f"Kết quả khác nhau: {mismatches}/{len(texts)}")
+
+    print(f"\n{'Số khóa':<10} | {'regex µs/câu':>14} | {'trie µs/câu':>12}")
+    print("-" * 42)
+    rng = random.Random(0)
+    alphabet = "abcdeghiklmnopqrstuvxy"
+    for size in (100, 1000, 10000, 50000):
+        synthetic = dict(p.replace_dict)
+        while len(synthetic) < size:
+            key = "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 10)))
+            synthetic[key] = key.upper()
+        matcher = DictMatcher(synthetic)
+        sample = texts[:10]
+        legacy_us = time_per_call(lambda t: _legacy_dict_translation(t, synthetic), sample, 1) if size <= 10000 else float("nan")
+        print(f"{size:<10} | {legacy_us:>14.1f} | {time_per_call(matcher.translate, texts):>12.1f}")
+
+
+# ==============================================================================
+# 2. KHỞI ĐỘNG: import underthesea ngay (cũ) vs nạp nền
+# ==============================================================================
+_STARTUP_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+{eager}
+from nlp.nlp_engine import NLPEngine
+engine = NLPEngine()
+t1 = time.perf_counter()
+engine.preprocessor.wait_until_ready()
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t0)
+"""
+
+
+@benchmark("startup")
+def bench_startup():
+    import subprocess
+
+    print_header("KHỞI ĐỘNG NLPEngine (tiến trình Python mới, như lần chạy đầu của main.py)")
+    root = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'Chế độ':<32} | {'NLPEngine() (s)':>16} | {'tách từ sẵn sàng (s)':>21}")
+    print("-" * 76)
+    for label, eager in (
+        ("import underthesea ngay (cũ)", "from underthesea import word_tokenize; word_tokenize('khởi động')"),
+        ("nạp nền (hiện tại)", ""),
+    ):
+        code = _STARTUP_SNIPPET.format(root=root, eager=eager)
+        runs = []
+        for _ in range(3):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+            runs.append(tuple(float(x) for x in out.stdout.split()[-2:]))
+        ready, loaded = min(runs)
+        print(f"{label:<32} | {ready:>16.3f} | {loaded:>21.3f}")
+
+
+# ==============================================================================
+# 3. TÁCH TỪ: underthesea vs longest_match (độ trễ + độ chính xác trên test_cases.py)
+# ==============================================================================
+def _token_spans(tokens: List[str]) -> set:
+    """Đổi danh sách từ thành tập (vị trí âm tiết bắt đầu, số âm tiết) để tính F1."""
+    spans = set()
+    pos = 0
+    for tok in tokens:
+        size = len(tok.replace("_", " ").split())
+        spans.add((pos, size))
+        pos += size
+    return spans
+
+
+def _score_engine(engine) -> int:
+    """Số test case trong test_cases.py chạy đúng (không in bảng chi tiết)."""
+    from test_cases import TestRunner
+
+    runner = TestRunner.__new__(TestRunner)
+    passed = 0
+    for case in TEST_CASES:
+        result = engine.process_command(case["text"])
+        passed += not runner._compare(case["expect"], runner._map_result(result, case["expect"]))
+    return passed
+
+
+@benchmark("segmenter")
+def bench_segmenter():
+    from nlp_engine import NLPEngine
+    from segmenter import SEGMENTERS, UndertheseaSegmenter
+
+    print_header("TÁCH TỪ: so sánh backend (tham chiếu: underthesea)")
+    engine = NLPEngine()
+    engine.wait_until_ready()
+    texts = [engine.preprocessor.prepare(t).translated for t in corpus()]
+
+    reference = UndertheseaSegmenter()
+    reference.wait_until_ready()
+    ref_tokens = [reference.tokenize(t) for t in texts]
+
+    print(f"{'Backend':<15} | {'µs/câu':>9} | {'F1 từ':>7} | {'câu giống':>9} | {'processed giống':>15} | {'test_cases':>10}")
+    print("-" * 82)
+    for name, cls in SEGMENTERS.items():
+        seg = cls()
+        seg.wait_until_ready()
+        tokens = [seg.tokenize(t) for t in texts]
+
+        tp = fp = fn = 0
+        for ours, ref in zip(tokens, ref_tokens):
+            a, b = _token_spans(ours), _token_spans(ref)
+            tp += len(a & b)
+            fp += len(a - b)
+            fn += len(b - a)
+        f1 = 2 * tp / max(2 * tp + fp + fn, 1)
+        same_tokens = sum(ours == ref for ours, ref in zip(tokens, ref_tokens))
+        same_text = sum(
+            " ".join(ours).replace("_", " ") == " ".join(ref).replace("_", " ")
+            for ours, ref in zip(tokens, ref_tokens)
+        )
+
+        engine.preprocessor.segmenter = seg
+        score = _score_engine(engine)
+        latency = time_per_call(seg.tokenize, texts)
+        print(f"{name:<15} | {latency:>9.1f} | {f1:>7.3f} | {same_tokens:>4}/{len(texts):<4} | "
+              f"{same_text:>10}/{len(texts):<4} | {score:>5}/{len(TEST_CASES):<4}")
+
+
+# ==============================================================================
+# 4. CACHE process_command: lần đầu (miss) vs gửi lại (hit)
+# ==============================================================================
+@benchmark("cache")
+def bench_cache():
+    from nlp_engine import NLPEngine
+
+    print_header("CACHE LRU CHO process_command")
+    texts = corpus()
+    engine = NLPEngine(cache_size=len(texts))
+    engine.wait_until_ready()
+
+    uncached = NLPEngine()
+    uncached.preprocessor = engine.preprocessor
+    uncached.location_parser.wait_until_ready()
+    print(f"{'Trường hợp':<25} | {'µs/câu':>10}")
+    print("-" * 40)
+    print(f"{'không cache':<25} | {time_per_call(uncached.process_command, texts, 3):>10.1f}")
+    for t in texts:
+        engine.process_command(t)
+    print(f"{'cache hit':<25} | {time_per_call(engine.process_command, texts):>10.1f}")
+    print(f"Thống kê: {engine.cache_stats()}")
+
+
+# ==============================================================================
+# 5. BỎ DẤU: NFKD + unicodedata.category (cũ) vs bảng str.translate
+# ==============================================================================
+def _legacy_remove_diacritics(text: str) -> str:
+    """Cài đặt cũ của Preprocessor/NLPEngine._remove_diacritics."""
+    import unicodedata
+    if not text:
+        return ""
+    nfkd = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in nfkd if unicodedata.category(c) != 'Mn')
+
+
+@benchmark("diacritics")
+def bench_diacritics():
+    from text_utils import DIACRITICS_TABLE, remove_diacritics
+
+    print_header("BỎ DẤU TIẾNG VIỆT")
+    sentences = corpus()
+    places = [p for p in (c["expect"].get("loc") for c in TEST_CASES) if p]
+    long_text = " ".join(sentences)
+
+    # Kết quả chỉ khác ở đ/Đ (cách cũ giữ nguyên vì Unicode không tách được dấu của đ)
+    diff = sum(
+        _legacy_remove_diacritics(t) != remove_diacritics(t).replace("d", "đ").replace("D", "Đ")
+        and _legacy_remove_diacritics(t) != remove_diacritics(t)
+        for t in sentences
+    )
+    print(f"{'Đầu vào':<22} | {'cũ µs':>9} | {'translate µs':>12} | {'+ cache µs':>10}")
+    print("-" * 62)
+    for label, inputs in (("câu lệnh", sentences), ("tên địa điểm", places), ("đoạn dài (~2KB)", [long_text])):
+        legacy = time_per_call(_legacy_remove_diacritics, inputs)
+        table = time_per_call(lambda t: t.translate(DIACRITICS_TABLE), inputs)
+        cached = time_per_call(remove_diacritics, inputs)
+        print(f"{label:<22} | {legacy:>9.2f} | {table:>12.2f} | {cached:>10.2f}")
+    print(f"Khác biệt ngoài đ/Đ: {diff}/{len(sentences)}")
+
+
+# ==============================================================================
+# 6. NẠP LẠI TỪ ĐIỂN: dựng lại DictMatcher vs update() tăng dần
+# ==============================================================================
+@benchmark("reload")
+def bench_reload():
+    from preprocessor import Preprocessor
+    from dict_matcher import DictMatcher
+
+    print_header("NẠP LẠI TỪ ĐIỂN (sửa vài mục trong từ điển lớn)")
+    p = Preprocessor(auto_reload=False)
+    rng = random.Random(0)
+    alphabet = "abcdeghiklmnopqrstuvxy"
+    print(f"{'Số khóa':<10} | {'mục sửa':>8} | {'dựng lại ms':>12} | {'update ms':>10}")
+    print("-" * 50)
+    for size in (1000, 10000, 50000):
+        base = dict(p.replace_dict)
+        while len(base) < size:
+            key = "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 10)))
+            base[key] = key.upper()
+        for edits in (1, 10, 100):
+            new = dict(base)
+            for key in rng.sample(list(base), edits):
+                del new[key]
+                new[key + "x"] = key
+            matcher = DictMatcher(base)
+            start = time.perf_counter()
+            DictMatcher(new)
+            rebuild_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            matcher.update(new)
+            update_ms = (time.perf_counter() - start) * 1e3
+            print(f"{size:<10} | {edits:>8} | {rebuild_ms:>12.2f} | {update_ms:>10.2f}")
+
+
+# ==============================================================================
+# 7. XỬ LÝ HÀNG LOẠT: process_command tuần tự vs process_many nhiều tiến trình
+# ==============================================================================
+@benchmark("batch")
+def bench_batch():
+    from nlp_engine import NLPEngine
+
+    print_header("XỬ LÝ HÀNG LOẠT (process_many)")
+    engine = NLPEngine()
+    engine.wait_until_ready()
+    texts = corpus() * 40
+    cpus = os.cpu_count() or 1
+    print(f"{len(texts)} câu lệnh, {cpus} CPU (thời gian gồm cả khởi động pool)")
+    print(f"{'workers':<10} | {'giây':>8} | {'câu/giây':>10} | {'tăng tốc':>9}")
+    print("-" * 46)
+    baseline = None
+    expected = None
+    for workers in sorted({1, 2, 4, cpus}):
+        start = time.perf_counter()
+        results = list(engine.process_many(texts, workers=workers))
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline, expected = elapsed, results
+        status = "" if results == expected else "  ❌ khác kết quả tuần tự"
+        print(f"{workers:<10} | {elapsed:>8.2f} | {len(texts) / elapsed:>10.0f} | {baseline / elapsed:>8.2f}x{status}")
+
+
+# ==============================================================================
+# 8. ASYNC: gọi process_command ngay trong event loop vs AsyncNLPEngine
+# ==============================================================================
+@benchmark("async")
+def bench_async():
+    import asyncio
+    from async_engine import AsyncNLPEngine
+
+    print_header("ASYNC (độ trễ event loop khi 3 client gửi cùng bộ câu lệnh)")
+    texts = corpus() * 3
+
+    async def measure(handler) -> tuple:
+        lags = []
+
+        async def heartbeat():
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - start - 0.001)
+
+        beat = asyncio.ensure_future(heartbeat())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await asyncio.gather(*(handler(t) for t in texts))
+        elapsed = time.perf_counter() - start
+        beat.cancel()
+        return elapsed, max(lags, default=0.0)
+
+    async def run():
+        async with AsyncNLPEngine(max_workers=2) as engine:
+            engine.engine.wait_until_ready()
+
+            async def blocking(text):
+                return engine.engine.process_command(text)
+
+            print(f"{'Cách gọi':<28} | {'tổng ms':>9} | {'trễ loop tối đa ms':>19}")
+            print("-" * 62)
+            for label, handler in (("process_command (chặn)", blocking), ("AsyncNLPEngine", engine.process_command)):
+                elapsed, lag = await measure(handler)
+                print(f"{label:<28} | {elapsed * 1e3:>9.1f} | {lag * 1e3:>19.1f}")
+            print(f"Thống kê gộp yêu cầu: {engine.stats()}")
+
+    asyncio.run(run())
+
+
+# ==============================================================================
+# 9. PHÂN TÍCH THỜI GIAN: tách token một lần, các parser con đọc chung danh sách token
+# ==============================================================================
+@benchmark("timeparse")
+def bench_timeparse():
+    from datetime import datetime
+    from preprocessor import Preprocessor
+    from time_parser import TimeParser
+
+    print_header("TIME PARSER (µs mỗi câu, tách theo từng bước)")
+    parser = TimeParser()
+    preprocessor = Preprocessor(block_on_segmenter=True, auto_reload=False)
+    raw = corpus()
+    lite = [preprocessor.process_lite(t) for t in raw]
+    today = datetime.now()
+
+    raw_tokens = [parser.tokenize(t) for t in raw]
+    lite_tokens = [parser.tokenize(t) for t in lite]
+    stages = [
+        ("tokenize", parser.tokenize, raw, lite),
+        ("ngày (thứ / tương đối)", lambda tt: parser._extract_date(tt, today), raw_tokens, lite_tokens),
+        ("nhắc trước", parser._extract_reminder, raw_tokens, lite_tokens),
+        ("khoảng giờ từ ... đến", lambda tt: parser._parse_range_time(tt, today), raw_tokens, lite_tokens),
+        ("giờ bắt đầu", lambda tt: parser._match_start_prefix(tt) or parser._find_start_time(tt), raw_tokens, lite_tokens),
+        ("thời lượng", parser._parse_duration, raw_tokens, lite_tokens),
+        ("parse (toàn bộ)", parser.parse, raw, lite),
+    ]
+    print(f"{'Bước':<28} | {'câu gốc µs':>11} | {'process_lite µs':>15}")
+    print("-" * 62)
+    for name, fn, raw_inputs, lite_inputs in stages:
+        print(f"{name:<28} | {time_per_call(fn, raw_inputs):>11.2f} | {time_per_call(fn, lite_inputs):>15.2f}")
+
+# ==============================================================================
+# 10. CỔNG LỌC TRƯỚC: câu không có số / từ chỉ thời gian bỏ qua pipeline thời gian
+# ==============================================================================
+@benchmark("prefilter")
+def bench_prefilter():
+    from nlp_engine import NLPEngine
+    from time_parser import TimeParser
+
+    print_header("CỔNG LỌC THỜI GIAN (tần suất bỏ qua + µs mỗi câu)")
+    engine = NLPEngine()
+    engine.wait_until_ready()
+    for text in corpus():
+        engine.process_command(text)
+    stats = engine.time_parser.stats()
+    print(f"Trên {len(corpus())} câu của test_cases.py: {stats}")
+    print(f"  parse chỉ đọc ngày: {stats['parse_date_only'] / max(stats['parse'], 1):.0%}, "
+          f"bỏ qua hẳn: {stats['parse_skipped'] / max(stats['parse'], 1):.0%}, "
+          f"find_spans bỏ qua: {stats['find_spans_skipped'] / max(stats['find_spans'], 1):.0%}")
+
+    parser = TimeParser()
+    groups = {
+        "có số (chạy đủ)": ["Họp team lúc 9h sáng mai", "Chạy bộ 30 phút lúc 6h"],
+        "không số, có ngày": ["Đi chợ ngày mai", "Chủ nhật đi nhà thờ"],
+        "không số, không ngày": ["Đọc sách mỗi tối", "Gọi điện cho mẹ"],
+    }
+    print(f"{'Loại câu':<24} | {'parse µs':>9} | {'find_spans µs':>13}")
+    print("-" * 52)
+    for label, texts in groups.items():
+        print(f"{label:<24} | {time_per_call(parser.parse, texts * 50):>9.2f} | {time_per_call(parser.find_spans, texts * 50):>13.2f}")
+
+
+# ==============================================================================
+# 11. GAZETTEER: mỗi địa điểm một re.search (cũ) vs trie theo từ, theo số địa điểm
+# ==============================================================================
+_PLACE_SYLLABLES = (
+    "an bình minh hòa phú quý long thành tân hưng phước lộc thịnh mỹ đông tây nam bắc trung hải "
+    "sơn giang hồ cầu chợ phố đường quán cà phê nhà hàng khách sạn trường học viện công viên siêu thị"
+).split()
+
+
+def _synthetic_places(count: int, seed: int = 0) -> List[str]:
+    """Tên địa điểm giả (2-5 âm tiết), không trùng nhau, dài trước như locations_db."""
+    rng = random.Random(seed)
+    places: Dict[str, None] = {}
+    while len(places) < count:
+        places[" ".join(rng.choice(_PLACE_SYLLABLES) for _ in range(rng.randint(2, 5)))] = None
+    return sorted(places, key=len, reverse=True)
+
+
+@benchmark("gazetteer")
+def bench_gazetteer():
+    from gazetteer import Gazetteer
+    from location_parser import LocationParser
+
+    print_header("GAZETTEER (µs mỗi câu để tìm mọi địa điểm đã biết)")
+    sentences = [t.lower() for t in corpus()]
+    real = LocationParser(auto_reload=False)._read_locations() or []
+
+    def legacy_find(places: List[str], text: str) -> List[str]:
+        return [p for p in places if re.search(r"\b" + re.escape(p) + r"\b", text)]
+
+    print(f"{'Số địa điểm':>12} | {'dựng trie s':>11} | {'re.search µs':>12} | {'trie µs':>8}")
+    print("-" * 54)
+    for count in (len(real), 1_000, 10_000, 100_000, 300_000):
+        places = real if count == len(real) else _synthetic_places(count)
+        start = time.perf_counter()
+        gazetteer = Gazetteer(places)
+        build = time.perf_counter() - start
+        # Cách cũ quá chậm khi danh sách lớn: chỉ đo tới 10k địa điểm
+        legacy = time_per_call(lambda t: legacy_find(places, t), sentences[:10], repeat=1) if count <= 10_000 else None
+        trie = time_per_call(gazetteer.find, sentences)
+        legacy_str = f"{legacy:>12.1f}" if legacy is not None else f"{'-':>12}"
+        print(f"{count:>12,} | {build:>11.2f} | {legacy_str} | {trie:>8.2f}")
+
+    # Nạp lại locations.json sau khi sửa vài địa điểm: dựng lại cả trie vs update() chỉ sửa các nhánh bị đổi
+    print(f"\n{'Số địa điểm':>12} | {'mục sửa':>8} | {'dựng lại ms':>12} | {'update ms':>10}")
+    print("-" * 52)
+    rng = random.Random(0)
+    for count in (10_000, 100_000, 300_000):
+        places = _synthetic_places(count)
+        for edits in (1, 100):
+            removed = rng.sample(places, edits)
+            added = [place + " mới" for place in removed]
+            gone = set(removed)
+            new = sorted([place for place in places if place not in gone] + added, key=len, reverse=True)
+            gazetteer = Gazetteer(places)
+            start = time.perf_counter()
+            Gazetteer(new)
+            rebuild_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            gazetteer.update(added, removed, order=new)
+            update_ms = (time.perf_counter() - start) * 1e3
+            print(f"{count:>12,} | {edits:>8} | {rebuild_ms:>12.1f} | {update_ms:>10.1f}")
+
+
+# ==============================================================================
+# 12. GAZETTEER FILE: locations.json + trie (cũ) vs locations.gaz qua mmap
+# ==============================================================================
+_GAZ_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+{load}
+t1 = time.perf_counter()
+sentences = {sentences!r}
+t2 = time.perf_counter()
+for _ in range(5):
+    for text in sentences:
+        gazetteer.find(text)
+t3 = time.perf_counter()
+# RSS đỉnh của chính tiến trình này (ru_maxrss giữ cả đỉnh của tiến trình cha trước exec)
+rss = float("nan")
+try:
+    with open("/proc/self/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+except OSError:
+    pass
+print(t1 - t0, rss, (t3 - t2) / (5 * len(sentences)) * 1e6)
+"""
+
+_GAZ_LOADERS = (
+    ("locations.json + trie", (
+        "import json\n"
+        "from nlp.gazetteer import Gazetteer\n"
+        "data = json.load(open({json_path!r}, encoding='utf-8'))\n"
+        "gazetteer = Gazetteer(sorted((p for g in data.values() for p in g), key=len, reverse=True))"
+    )),
+    ("locations.gaz (mmap)", (
+        "from nlp.gazetteer import CompactGazetteer\n"
+        "gazetteer = CompactGazetteer({gaz_path!r})"
+    )),
+)
+
+
+@benchmark("gazetteer_file")
+def bench_gazetteer_file():
+    import json
+    import subprocess
+    import tempfile
+    from gazetteer import build_from_json, resolve_compact
+
+    print_header("FILE GAZETTEER (tiến trình Python mới: thời gian nạp, RSS đỉnh, µs mỗi câu)")
+    root = os.path.dirname(os.path.abspath(__file__))
+    rng = random.Random(0)
+    print(f"{'Số địa điểm':>12} | {'Cách nạp':<22} | {'file MB':>7} | {'nạp s':>6} | {'RSS MB':>7} | {'find µs':>7}")
+    print("-" * 78)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "locations.json")
+        gaz_path = os.path.join(tmp, "locations.gaz")
+        for count in (10_000, 100_000, 1_000_000):
+            places = _synthetic_places(count)
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump({"synthetic": places}, f, ensure_ascii=False)
+            build_from_json(json_path, gaz_path)
+            # Nửa số câu có chèn một địa điểm trong danh sách
+            sentences = [t.lower() + (" ở " + rng.choice(places) if i % 2 else "") for i, t in enumerate(corpus())]
+            for label, load in _GAZ_LOADERS:
+                code = _GAZ_SNIPPET.format(
+                    root=root, sentences=sentences,
+                    load=load.format(json_path=json_path, gaz_path=gaz_path),
+                )
+                out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+                loaded, rss, find = (float(x) for x in out.stdout.split()[-3:])
+                path = json_path if label.startswith("locations.json") else resolve_compact(gaz_path)
+                size = os.path.getsize(path) / 2**20
+                print(f"{count:>12,} | {label:<22} | {size:>7.1f} | {loaded:>6.2f} | {rss:>7.1f} | {find:>7.2f}")
+
+
+# ==============================================================================
+# 13. FUZZY GAZETTEER: khớp không dấu / gõ sai theo số địa điểm
+# ==============================================================================
+def _typo(word: str, rng: random.Random) -> str:
+    """Một lỗi gõ (xóa / thay / đổi chỗ) ở giữa từ đủ dài."""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice("aeiouy") + word[i + 1:]
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+
+
+@benchmark("fuzzy")
+def bench_fuzzy():
+    from fuzzy_gazetteer import FuzzyGazetteer
+    from text_utils import remove_diacritics
+
+    print_header("FUZZY GAZETTEER (không dấu + 1 lỗi gõ; µs mỗi truy vấn / câu)")
+    rng = random.Random(0)
+    plain = [t.lower() for t in corpus()]
+    print(f"{'Số địa điểm':>12} | {'dựng s':>6} | {'match µs':>8} | {'đúng %':>6} | {'câu thường µs':>13} | {'câu có địa điểm µs':>18}")
+    print("-" * 82)
+    for count in (10_000, 100_000, 300_000):
+        places = _synthetic_places(count)
+        start = time.perf_counter()
+        fuzzy = FuzzyGazetteer(places)
+        build = time.perf_counter() - start
+        targets = rng.sample(places, 200)
+        # Bỏ dấu, thêm 1 lỗi gõ vào một từ dài của tên
+        queries = []
+        for place in targets:
+            words = remove_diacritics(place).split()
+            i = max(range(len(words)), key=lambda k: len(words[k]))
+            words[i] = _typo(words[i], rng)
+            queries.append(" ".join(words))
+        match = time_per_call(fuzzy.match, queries)
+        hits = sum(1 for q, p in zip(queries, targets) if (fuzzy.match(q) or ("",))[0] == p)
+        sentences = [t + " ở " + q for t, q in zip(plain, queries)]
+        print(
+            f"{count:>12,} | {build:>6.2f} | {match:>8.1f} | {100 * hits / len(queries):>6.1f} | "
+            f"{time_per_call(fuzzy.find, plain):>13.1f} | {time_per_call(fuzzy.find, sentences):>18.1f}"
+        )
+
+
+# ==============================================================================
+# 14. KIỂM TRA ỨNG VIÊN ĐỊA ĐIỂM: regex dựng lại mỗi lần (cũ) vs alternation biên dịch sẵn
+# ==============================================================================
+_LEGACY_TIME_WORDS = [
+    "hôm nay", "ngày mai", "mốt", "tuần", "tháng", "năm", "sáng",
+    "trưa", "chiều", "tối", "đêm", "khuya", "thứ", "chủ nhật", "cn"
+]
+
+
+def _legacy_is_invalid(parser, text: str) -> bool:
+    text = text.lower().strip()
+    if re.search(r'\d+\s*(?:h|g|:|p|phút|giây|tiếng|am|pm)\b', text):
+        return True
+    if re.search(r'(?:ngày|tháng|năm|thứ)\s*\d+', text):
+        return True
+    if any(re.search(r'\b' + re.escape(w) + r'\b', text) for w in _LEGACY_TIME_WORDS):
+        return True
+    if len(text) < 2 or text.isdigit():
+        return True
+    return any(re.search(r'\b' + re.escape(b) + r'\b', text) for b in parser.black_list)
+
+
+def _legacy_clean_extracted_text(parser, text: str) -> str:
+    from location_parser import VALID_PAIRS
+
+    words = text.split()
+    result = []
+    for i, word in enumerate(words):
+        lower = word.lower()
+        prev = words[i - 1].lower() if i > 0 else ""
+        if lower in parser.stop_verbs or lower in ["phim", "ảnh", "hình"]:
+            # Bản cũ dựng lại tập cặp hợp lệ cho mỗi từ
+            valid_pairs = set(VALID_PAIRS)
+            if not ((prev, lower) in valid_pairs or (word[0].isupper() and i > 0)):
+                break
+        result.append(word)
+    return " ".join(result).strip()
+
+
+def _legacy_post_process_clean(text: str) -> str:
+    for p in (
+        r'^(địa chỉ|vị trí|nơi|nhà|quê)\s+(là|của|nằm|tại|ở)\s+',
+        r'^(là|của|nằm|tại|ở)\s+',
+        r'^(cái|ngôi|chiếc)\s+',
+    ):
+        text = re.sub(p, '', text, flags=re.IGNORECASE)
+    return text.strip()
+
+
+@benchmark("location_validate")
+def bench_location_validate():
+    from location_parser import EXAMPLES, LocationParser
+
+    print_header("KIỂM TRA ỨNG VIÊN ĐỊA ĐIỂM (µs mỗi câu mẫu của location_parser.py, chỉ phần kiểm tra)")
+    parser = LocationParser(auto_reload=False)
+
+    def legacy_validate(raw: str):
+        loc = parser._cut_time_tail(raw)
+        loc = _legacy_clean_extracted_text(parser, loc)
+        loc = _legacy_post_process_clean(loc)
+        loc = loc.strip(" .,?!")
+        return loc if loc and not _legacy_is_invalid(parser, loc) else None
+
+    for label, texts in (("câu mẫu location_parser.py", EXAMPLES), ("test_cases.py", corpus())):
+        candidates = [parser._candidates(t)[0] for t in texts]
+        assert [list(map(legacy_validate, c)) for c in candidates] == [list(map(parser._validate, c)) for c in candidates]
+        old = time_per_call(lambda c: [legacy_validate(raw) for raw in c], candidates)
+        new = time_per_call(lambda c: [parser._validate(raw) for raw in c], candidates)
+        per = sum(map(len, candidates)) / len(candidates)
+        print(f"{label:<28} | {per:.1f} ứng viên/câu | cũ {old:8.1f} µs | mới {new:7.1f} µs | x{old / new:.1f}")
+
+
+# ==============================================================================
+# 15. ỨNG VIÊN ĐỊA ĐIỂM TRÊN VĂN BẢN DÀI: re.findall (.*?) (cũ) vs bộ quét tuyến tính, 1-10 KB
+# ==============================================================================
+_LEGACY_TIME_STOPPERS = r"(?:\s+(?:lúc|vào|ngày|hôm|sáng|trưa|chiều|tối|đêm|mai|mốt|mỗi|hàng|mọi|hằng)|$|[.,?!])"
+
+
+def _long_text(size: int, kind: str, rng: random.Random) -> str:
+    """Đoạn văn dài: câu test_cases nối nhau, hoặc (xấu nhất cho regex cũ) nhiều "ở ..." không có điểm dừng trước xuống dòng."""
+    if kind == "xấu nhất":
+        unit = "đi chơi ở nhà bạn "
+        return unit * (size // len(unit)) + "\nhết"
+    texts = corpus()
+    parts: List[str] = []
+    while sum(map(len, parts)) < size:
+        parts.append(rng.choice(texts) + rng.choice([". ", " ", "\n"]))
+    return "".join(parts)[:size]
+
+
+@benchmark("location_long")
+def bench_location_long():
+    from location_parser import LocationParser
+
+    print_header("ỨNG VIÊN ĐỊA ĐIỂM TRÊN VĂN BẢN DÀI (ms mỗi văn bản; tạo ứng viên + cắt đuôi thời gian)")
+    parser = LocationParser(auto_reload=False)
+    prep = re.compile(f"{parser.prep_pattern.pattern}\\s+(.*?){_LEGACY_TIME_STOPPERS}", re.IGNORECASE)
+    noun = re.compile(f"(?:^|\\s)({parser.noun_pattern.pattern}\\s+.*?){_LEGACY_TIME_STOPPERS}", re.IGNORECASE)
+
+    def legacy_cut(text: str) -> str:
+        lower = " " + text.lower() + " "
+        cut_pos = min((lower.find(m) for m in parser.time_cut_markers if lower.find(m) != -1), default=None)
+        return text[:cut_pos].strip() if cut_pos is not None else text
+
+    def legacy(text: str) -> List[str]:
+        return [legacy_cut(c) for c in prep.findall(text) + noun.findall(text)]
+
+    def scan(text: str) -> List[str]:
+        return [parser._cut_time_tail(c) for c in parser._scan_candidates(text)]
+
+    rng = random.Random(0)
+    print(f"{'Văn bản':<10} | {'KB':>3} | {'cũ ms':>8} | {'mới ms':>7} | {'mới µs/KB':>9} | {'extract() ms':>12}")
+    print("-" * 66)
+    for kind in ("đoạn văn", "xấu nhất"):
+        for size in (1_000, 2_000, 5_000, 10_000):
+            text = _long_text(size, kind, rng)
+            assert legacy(text) == scan(text)
+            old = time_per_call(legacy, [text], repeat=3) / 1000
+            new = time_per_call(scan, [text], repeat=3) / 1000
+            full = time_per_call(parser.extract, [text], repeat=3) / 1000
+            print(f"{kind:<10} | {size // 1000:>3} | {old:>8.2f} | {new:>7.2f} | {new * 1000 / (size / 1000):>9.0f} | {full:>12.2f}")
+
+
+# ==============================================================================
+# 16. TẦN SUẤT THÓI QUEN: 4 pattern thử lần lượt + sub (cũ) vs một lượt quét có nhóm tên
+# ==============================================================================
+def _legacy_habit_patterns(parser) -> list:
+    """Các pattern cũ của HabitParser, thứ tự ưu tiên weekly > monthly > yearly > daily."""
+    from habit_parser import Frequency
+
+    q = parser._get_quantifier_pattern()
+    weekday_keywords = r"(?:tuần|thứ\s*[2-7]|chủ\s*nhật|c\.?n|t[2-7])"
+    return [
+        (Frequency.WEEKLY, re.compile(f"\\b{q}\\s+(?:{parser.TIME_PERIODS}\\s+)?{weekday_keywords}\\b", re.IGNORECASE)),
+        (Frequency.MONTHLY, re.compile(f"\\b{q}\\s+(?:tháng)\\b", re.IGNORECASE)),
+        (Frequency.YEARLY, re.compile(f"\\b{q}\\s+(?:năm)\\b", re.IGNORECASE)),
+        (Frequency.DAILY, re.compile(f"\\b{q}\\s+(?:ngày|{parser.TIME_PERIODS})\\b", re.IGNORECASE)),
+    ]
+
+
+@benchmark("habit")
+def bench_habit():
+    from habit_parser import HabitParser
+
+    print_header("TẦN SUẤT THÓI QUEN (µs mỗi câu, HabitParser.parse)")
+    parser = HabitParser()
+    patterns = _legacy_habit_patterns(parser)
+
+    def legacy(text: str):
+        for frequency, pattern in patterns:
+            if pattern.search(text):
+                return frequency, parser._clean_whitespace(pattern.sub(" ", text))
+        return None, text
+
+    texts = corpus()
+    groups = {
+        "test_cases.py": texts,
+        "có thói quen": [t for t in texts if parser.parse(t)["is_habit"]],
+        "không thói quen": [t for t in texts if not parser.parse(t)["is_habit"]],
+        "danh sách thứ": ["Học tiếng anh mỗi t3 và t5", "Chạy bộ mỗi sáng thứ 2, 4, 6 lúc 5h30"],
+    }
+    print(f"{'Nhóm câu':<18} | {'cũ µs':>7} | {'mới µs':>7} | luật lặp (câu đầu)")
+    print("-" * 90)
+    for label, group in groups.items():
+        old = time_per_call(legacy, group)
+        new = time_per_call(parser._extract_frequency_and_clean, group)
+        rule = parser.parse(group[0])["recurrence"]
+        print(f"{label:<18} | {old:>7.2f} | {new:>7.2f} | {rule.to_dict() if rule else '---'}")
+
+
+# ==============================================================================
+# 17. TRẢI LỊCH THÓI QUEN: trải từng ngày từ ngày bắt đầu (cũ) vs RecurrenceExpander theo tháng + cache
+# ==============================================================================
+def _naive_occurrences(rule, anchor, start, end):
+    """Duyệt từng ngày từ ngày bắt đầu của thói quen đến hết khoảng cần xem."""
+    from datetime import timedelta
+    from habit_parser import Frequency
+    from recurrence import _clamped
+
+    result = []
+    d = anchor
+    while d <= end:
+        if rule.frequency is Frequency.DAILY:
+            hit = (d - anchor).days % rule.interval == 0
+        elif rule.frequency is Frequency.WEEKLY:
+            weeks = ((d - anchor).days + anchor.weekday()) // 7
+            hit = d.weekday() in (rule.weekdays or (anchor.weekday(),)) and weeks % rule.interval == 0
+        else:
+            step = rule.interval * (12 if rule.frequency is Frequency.YEARLY else 1)
+            months = (d.year - anchor.year) * 12 + d.month - anchor.month
+            hit = months % step == 0 and d == _clamped(d.year, d.month, anchor.day)
+        if hit and d >= start:
+            result.append(d)
+        d += timedelta(days=1)
+    return result
+
+
+@benchmark("recurrence")
+def bench_recurrence():
+    from datetime import date, timedelta
+    from habit_parser import Frequency, RecurrenceRule
+    from recurrence import RecurrenceExpander
+
+    print_header("TRẢI LỊCH THÓI QUEN (ms cho cả danh sách, khoảng 1 tháng / 1 ngày)")
+    rng = random.Random(0)
+    rules = [RecurrenceRule(Frequency.DAILY), RecurrenceRule(Frequency.DAILY, 2), RecurrenceRule(Frequency.WEEKLY),
+             RecurrenceRule(Frequency.WEEKLY, 1, (1, 3)), RecurrenceRule(Frequency.WEEKLY, 1, (0, 2, 4)),
+             RecurrenceRule(Frequency.WEEKLY, 2, (5,)), RecurrenceRule(Frequency.MONTHLY), RecurrenceRule(Frequency.YEARLY)]
+    today = date(2026, 10, 18)
+    windows = {"tháng (lịch)": (date(2026, 10, 1), date(2026, 10, 31)), "hôm nay (nhắc)": (today, today)}
+    print(f"{'Số thói quen':>12} | {'Khoảng':<15} | {'cũ ms':>9} | {'mới (cache lạnh) ms':>19} | {'mới (cache nóng) ms':>19}")
+    print("-" * 88)
+    for count in (1_000, 10_000):
+        habits = [(rng.choice(rules), today - timedelta(days=rng.randint(0, 730))) for _ in range(count)]
+        for label, (start, end) in windows.items():
+            naive_sample = habits[:200]
+            check = RecurrenceExpander()
+            assert [check.between(r, a, start, end) for r, a in naive_sample] == [_naive_occurrences(r, a, start, end) for r, a in naive_sample]
+            cold = RecurrenceExpander()
+            t0 = time.perf_counter()
+            for rule, anchor in habits:
+                cold.between(rule, anchor, start, end)
+            cold_ms = (time.perf_counter() - t0) * 1000
+            warm_ms = time_per_call(lambda h: cold.between(h[0], h[1], start, end), habits, repeat=3) * count / 1000
+            # Cách cũ chậm: đo trên 200 thói quen rồi nhân lên
+            naive_ms = time_per_call(lambda h: _naive_occurrences(h[0], h[1], start, end), naive_sample, repeat=1) * count / 1000
+            print(f"{count:>12} | {label:<15} | {naive_ms:>9.1f} | {cold_ms:>19.1f} | {warm_ms:>19.1f}")
+    print(f"Cache: {cold.cache_stats()}")
+
+
+# ==============================================================================
+# 18. GOM NHÓM SỰ KIỆN: so với mọi nhóm (cũ) vs chia theo (ngày, địa điểm) + chỉ mục ngược từ
+# ==============================================================================
+def _legacy_group_events(parsed_results: list, name_threshold: float = 0.5) -> list:
+    """Cài đặt cũ của NLPEngine.group_events: mỗi kết quả so với mọi nhóm, dựng lại set mỗi lần so."""
+    from event_grouper import date_key, loc_key
+
+    def token_overlap(a, b):
+        if not a or not b:
+            return 0.0
+        sa, sb = set(a), set(b)
+        return len(sa & sb) / max(len(sa), len(sb)) if max(len(sa), len(sb)) > 0 else 0.0
+
+    buckets = []
+    for res in parsed_results:
+        data = res.get("data", {})
+        time_obj = data.get("time") or {}
+        date_k, loc_k = date_key(time_obj), loc_key(data.get("location"))
+        name_tokens = [t for t in (data.get("event_name") or "").split() if t and len(t) > 1]
+        rem = time_obj.get("reminder_minutes") if isinstance(time_obj, dict) else None
+        for b in buckets:
+            if b["date_key"] != date_k:
+                continue
+            if b["loc_key"] != "unknown" and loc_k != "unknown" and b["loc_key"] != loc_k:
+                continue
+            if token_overlap(name_tokens, b["name_tokens"]) >= name_threshold:
+                b["members"].append(res)
+                b["name_tokens"] = list(set(b["name_tokens"]) | set(name_tokens))
+                if rem is not None:
+                    b["reminder_minutes"] = rem if b["reminder_minutes"] is None else min(b["reminder_minutes"], rem)
+                break
+        else:
+            buckets.append({"name_tokens": name_tokens, "date_key": date_k, "loc_key": loc_k,
+                            "members": [res], "reminder_minutes": rem})
+    return [[id(m) for m in b["members"]] + [b["reminder_minutes"]] for b in buckets]
+
+
+_EVENT_WORDS = ["họp", "team", "đi", "chợ", "học", "tiếng", "anh", "gym", "ăn", "tối", "cà", "phê", "khách",
+                "hàng", "báo", "cáo", "dự", "án", "sinh", "nhật", "bạn", "đá", "bóng", "khám", "răng", "đón", "con"]
+_EVENT_PLACES = [None, None, "Công ty", "phòng họp", "Hà Nội", "quán cà phê", "nhà", "bệnh viện", "sân bóng"]
+
+
+def _synthetic_results(count: int, days: int = 365, seed: int = 0) -> List[dict]:
+    """Kết quả process_command giả lập: một năm sự kiện nhập lại, nhiều tên gần trùng."""
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    base_names = [rng.sample(_EVENT_WORDS, rng.randint(1, 3)) for _ in range(300)]
+    results = []
+    for _ in range(count):
+        # Tên gốc, đôi khi thêm một từ ("Họp team" / "họp team tuần")
+        words = list(rng.choice(base_names))
+        if rng.random() < 0.3:
+            words.append(rng.choice(_EVENT_WORDS))
+        name = " ".join(words)
+        results.append({"data": {
+            "event_name": name[0].upper() + name[1:],
+            "location": rng.choice(_EVENT_PLACES),
+            "time": {"date": start + timedelta(days=rng.randrange(days)), "reminder_minutes": rng.choice([None, 5, 15, 30])},
+        }})
+    return results
+
+
+@benchmark("group")
+def bench_group():
+    from event_grouper import EventGrouper, date_key
+
+    print_header("GOM NHÓM SỰ KIỆN (group_events trên kết quả giả lập trong một năm)")
+
+    def signature(groups):
+        return [[id(m) for m in g["members"]] + [g["reminder_minutes"]] for g in groups]
+
+    def legacy_by_date(results):
+        # Nhóm khác ngày không bao giờ gộp: chạy bản cũ trên từng ngày để có kết quả đối chiếu ở 100k
+        by_date = {}
+        for res in results:
+            by_date.setdefault(date_key(res["data"]["time"]), []).append(res)
+        expected = [b for day in by_date.values() for b in _legacy_group_events(day)]
+        return sorted(expected, key=lambda b: min(map(results_order.__getitem__, b[:-1])))
+
+    print(f"{'Số kết quả':>10} | {'số nhóm':>7} | {'cũ s':>8} | {'mới s':>7} | {'mới µs/kq':>9} | giống bản cũ")
+    print("-" * 70)
+    for count in (10_000, 100_000):
+        results = _synthetic_results(count)
+        results_order = {id(res): i for i, res in enumerate(results)}
+        t0 = time.perf_counter()
+        groups = EventGrouper().add_all(results).groups()
+        new = time.perf_counter() - t0
+        if count <= 10_000:
+            t0 = time.perf_counter()
+            expected = _legacy_group_events(results)
+            old = f"{time.perf_counter() - t0:8.2f}"
+        else:
+            old = f"{'(bỏ qua)':>8}"
+            expected = legacy_by_date(results)
+        same = signature(groups) == expected
+        print(f"{count:>10} | {len(groups):>7} | {old} | {new:>7.2f} | {new / count * 1e6:>9.1f} | {'✅' if same else '❌'}")
+
+
+# ==============================================================================
+# 19. GOM NHÓM THEO LUỒNG: đóng nhóm của ngày đã qua, bộ nhớ không tăng theo độ dài luồng
+# ==============================================================================
+def _synthetic_stream(count: int, per_day: int = 300, seed: int = 0, undated: float = 0.0):
+    """Luồng kết quả giả lập theo thứ tự ngày (như nhập lịch nhiều năm), sinh dần không giữ cả danh sách.
+
+    undated: tỉ lệ kết quả không rõ ngày.
+    """
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    base_names = [rng.sample(_EVENT_WORDS, rng.randint(1, 3)) for _ in range(300)]
+    for n in range(count):
+        words = list(rng.choice(base_names))
+        if rng.random() < 0.3:
+            words.append(rng.choice(_EVENT_WORDS))
+        name = " ".join(words)
+        day = None if undated and rng.random() < undated else start + timedelta(days=n // per_day)
+        yield {"data": {
+            "event_name": name[0].upper() + name[1:],
+            "location": rng.choice(_EVENT_PLACES),
+            "time": {"date": day, "reminder_minutes": rng.choice([None, 5, 15, 30])},
+        }}
+
+
+@benchmark("stream")
+def bench_stream():
+    from event_grouper import UNKNOWN, EventGrouper
+
+    print_header("GOM NHÓM THEO LUỒNG (feed + đóng ngày đã qua, retention_days=0)")
+
+    def signature(groups):
+        return [[id(m) for m in g["members"]] + [g["reminder_minutes"]] for g in groups]
+
+    # Đối chiếu: nhóm đã đóng khi chạy theo luồng == nhóm của bản gom cả danh sách
+    results = list(_synthetic_stream(100_000))
+    grouper = EventGrouper(retention_days=0)
+    closed = [u["group"] for u in grouper.feed(results) if u["type"] == "closed"]
+    closed += [u["group"] for u in grouper.flush()]
+    closed.sort(key=lambda g: g["group_id"])
+    same = signature(closed) == signature(EventGrouper().add_all(results).groups())
+    print(f"100000 kết quả: nhóm theo luồng giống bản gom cả danh sách: {'✅' if same else '❌'}")
+    del results
+
+    print(f"{'Số kết quả':>10} | {'cập nhật':>9} | {'s':>6} | {'µs/kq':>6} | {'nhóm mở tối đa':>14}")
+    print("-" * 60)
+    for count in (100_000, 1_000_000):
+        grouper = EventGrouper(retention_days=0)
+        updates = peak = 0
+        t0 = time.perf_counter()
+        for _ in grouper.feed(_synthetic_stream(count)):
+            updates += 1
+            if len(grouper) > peak:
+                peak = len(grouper)
+        updates += len(grouper.flush())
+        elapsed = time.perf_counter() - t0
+        print(f"{count:>10} | {updates:>9} | {elapsed:>6.2f} | {elapsed / count * 1e6:>6.1f} | {peak:>14}")
+
+    # Nhóm không rõ ngày không hết hạn theo ngày: không giới hạn thì số nhóm mở tăng theo độ dài luồng
+    print("\n10% kết quả không rõ ngày, tên kèm số thứ tự (ít gộp hơn, nhiều nhóm hơn)")
+    print(f"{'Số kết quả':>10} | {'max_undated':>11} | {'s':>6} | {'nhóm mở tối đa':>14} | {'đóng do giới hạn':>16}")
+    print("-" * 70)
+    for count in (100_000, 1_000_000):
+        for max_undated in (None, 1_000):
+            grouper = EventGrouper(retention_days=0, max_undated=max_undated)
+            peak = evicted = 0
+            t0 = time.perf_counter()
+            for update in grouper.feed(_numbered_undated(_synthetic_stream(count, undated=0.1))):
+                if update["type"] == "closed" and update["group"]["date"] == UNKNOWN:
+                    evicted += 1
+                if len(grouper) > peak:
+                    peak = len(grouper)
+            grouper.flush()
+            elapsed = time.perf_counter() - t0
+            print(f"{count:>10} | {str(max_undated):>11} | {elapsed:>6.2f} | {peak:>14} | {evicted:>16}")
+
+
+def _numbered_undated(results):
+    """Thêm số thứ tự vào tên các kết quả không rõ ngày (như các việc nhập tay không lặp lại)."""
+    for n, res in enumerate(results):
+        data = res["data"]
+        if data["time"]["date"] is None:
+            data["event_name"] = f"{data['event_name']} {n}"
+        yield res
+
+
+# ==============================================================================
+# 20. SỰ KIỆN TRÙNG: MinHash lưu theo dòng + LSH theo dải trên bảng events
+# ==============================================================================
+def _synthetic_event_rows(count: int, seed: int = 0) -> List[tuple]:
+    """(tên, địa điểm) giả lập: ~40% là bản nhập lại của sự kiện trước (thêm từ, đổi hoa thường, bỏ dấu)."""
+    from nlp.text_utils import remove_diacritics
+
+    rng = random.Random(seed)
+    vocab = [f"{w}{i}" for i in range(200) for w in _EVENT_WORDS[:25]]
+    rows = []
+    for _ in range(count):
+        if rows and rng.random() < 0.4:
+            name, place = rng.choice(rows)
+            change = rng.random()
+            if change < 0.4:
+                name = f"{name} {rng.choice(_EVENT_WORDS)}"
+            elif change < 0.7:
+                name = name.lower() if name[0].isupper() else name.capitalize()
+            else:
+                name = remove_diacritics(name)
+        else:
+            name = " ".join(rng.sample(vocab, 3)).capitalize()
+            place = rng.choice(_EVENT_PLACES)
+        rows.append((name, place))
+    return rows
+
+
+@benchmark("dedup")
+def bench_dedup():
+    import sqlite3
+    import tempfile
+
+    from database.database_service import EventManager
+    from nlp import minhash
+
+    print_header("SỰ KIỆN TRÙNG (MinHash + LSH trên events.eventName / place)")
+
+    rows = _synthetic_event_rows(20_000)
+    sigs = [tuple(sig) for sig in minhash.signatures_batch(rows).tolist()]
+    same_sig = sigs == [minhash.signature(*row) for row in rows]
+    ids = list(range(1, len(rows) + 1))
+    same = minhash.find_clusters(ids, sigs) == minhash._union_find_clusters(ids, sigs, minhash.THRESHOLD)
+    print(f"Chữ ký numpy == từng dòng: {'✅' if same_sig else '❌'} | cụm numpy == union-find thuần Python: {'✅' if same else '❌'}")
+
+    index = minhash.LSHIndex()
+    t0 = time.perf_counter()
+    for i, row in enumerate(rows, 1):
+        index.add(i, minhash.signature(*row))
+    add_us = (time.perf_counter() - t0) / len(rows) * 1e6
+    query_us = time_per_call(lambda row: index.query(minhash.signature(*row)), rows[:2000])
+    print(f"Cập nhật từng dòng (create_event): {add_us:.1f} µs/dòng | tìm sự kiện gần trùng: {query_us:.1f} µs/lần")
+
+    # find_similar_events: lần đầu dựng chỉ mục từ bảng (LSHIndex.build), các lần sau chỉ kiểm tra
+    # MAX(id) / COUNT(*) rồi tìm
+    print(f"\n{'Số dòng':>10} | {'chữ ký µs/dòng':>14} | {'tìm cụm s':>9} | {'số cụm':>7} | {'dòng trong cụm':>14} | "
+          f"{'add() từng dòng s':>17} | {'tìm gần trùng lần đầu s':>23} | {'lần sau ms':>10}")
+    print("-" * 136)
+    for count in (100_000, 1_000_000):
+        rows = _synthetic_event_rows(count)
+        t0 = time.perf_counter()
+        sigs = minhash.signatures_batch(rows)
+        sig_us = (time.perf_counter() - t0) / count * 1e6
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = EventManager(os.path.join(tmp, "bench.db"))
+            with sqlite3.connect(manager.db_name) as conn:
+                conn.executemany(
+                    "INSERT INTO events (eventName, place, startTime, status, signature) VALUES (?, ?, '2026-01-01', 'active', ?)",
+                    ((name, place, minhash.to_blob(sig)) for (name, place), sig in zip(rows, sigs)))
+            t0 = time.perf_counter()
+            clusters = manager.find_duplicate_clusters()
+            scan = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            manager.find_similar_events(*rows[0])
+            first = time.perf_counter() - t0
+            later_ms = time_per_call(lambda row: manager.find_similar_events(*row), rows[:200], repeat=1) / 1000
+        # Cách cũ: add() từng dòng vào các dict của LSHIndex
+        index = minhash.LSHIndex()
+        t0 = time.perf_counter()
+        for i, sig in enumerate(sigs.tolist(), 1):
+            index.add(i, tuple(sig))
+        per_row = time.perf_counter() - t0
+        del index
+        print(f"{count:>10} | {sig_us:>14.1f} | {scan:>9.2f} | {len(clusters):>7} | {sum(map(len, clusters)):>14} | "
+              f"{per_row:>17.2f} | {first:>23.2f} | {later_ms:>10.2f}")
+
+
+# ==============================================================================
+# 21. KẾT QUẢ process_command: dict + display_data format sẵn (cũ) vs ParseResult __slots__ + display lười
+# ==============================================================================
+@benchmark("result")
+def bench_result():
+    import tracemalloc
+    from nlp_engine import NLPEngine
+    from parse_result import ParseResult, format_display_data
+
+    print_header("KẾT QUẢ process_command GIỮ HÀNG LOẠT (20000 kết quả)")
+    engine = NLPEngine()
+    engine.wait_until_ready()
+    parsed = [engine.process_command(t) for t in corpus()]
+    count = 20_000
+
+    def legacy(res):
+        data = dict(res.data)
+        habit = (data["habit_frequency"] or "daily") if res.intent == "create_habit" else None
+        return {"intent": res.intent, "processed_text": res.processed_text, "data": data,
+                "display_data": format_display_data(data["time"], data["location"], habit)}
+
+    def slotted(res):
+        return ParseResult(res.intent, res.processed_text, dict(res.data))
+
+    print(f"{'Kiểu kết quả':<34} | {'tạo µs/kq':>9} | {'bộ nhớ B/kq':>11}")
+    print("-" * 62)
+    for label, make in (("dict + display_data (cũ)", legacy), ("ParseResult, display lười", slotted)):
+        inputs = [parsed[i % len(parsed)] for i in range(count)]
+        t0 = time.perf_counter()
+        held = [make(res) for res in inputs]
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()
+        held = [make(res) for res in inputs]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{label:<34} | {elapsed / count * 1e6:>9.2f} | {size / count:>11.0f}")
+    same = all(slotted(res).to_dict() == legacy(res) for res in parsed)
+    print(f"to_dict() giống dict cũ: {'✅' if same else '❌'}")
+
+
+# ==============================================================================
+# 22. ĐO THỜI GIAN TỪNG BƯỚC: chi phí khi tắt / bật instrumentation
+# ==============================================================================
+@benchmark("instrument")
+def bench_instrument():
+    from instrumentation import PipelineInstrumentation
+    from nlp_engine import NLPEngine
+
+    print_header("ĐO THỜI GIAN TỪNG BƯỚC CỦA PIPELINE (process_command trên test_cases)")
+    texts = corpus()
+    engine = NLPEngine(instrument=False)
+    engine.wait_until_ready()
+    instrumentation = PipelineInstrumentation()
+    # Máy đo nhiễu: đo xen kẽ tắt / bật nhiều vòng, lấy lần nhanh nhất của mỗi chế độ
+    off = on = float("inf")
+    for _ in range(5):
+        engine.instrumentation = None
+        off = min(off, time_per_call(engine.process_command, texts, 2))
+        engine.instrumentation = instrumentation
+        on = min(on, time_per_call(engine.process_command, texts, 2))
+    print(f"{'Tắt (mặc định)':<20} | {off:>10.1f} µs/câu")
+    print(f"{'Bật':<20} | {on:>10.1f} µs/câu ({(on - off) / off * 100:+.1f}%)")
+    print()
+    print(instrumentation.report())
+
+
+def main(argv: List[str]):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Không có benchmark '{name}'. Có sẵn: {', '.join(BENCHMARKS)}")
+            continue
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
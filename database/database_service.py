@@ -1,6 +1,9 @@
+import json
 import sqlite3
 from datetime import datetime, timedelta
 
+from nlp import minhash
+
 # --- DTO CLASSES ---
 class EventDto:
     def __init__(self, id, event_name, place, start_time, end_time, reminder_time, status):
@@ -23,7 +26,9 @@ class EventDto:
 
 class HabitDto:
     # [UPDATE] Thêm current_streak và last_completed
-    def __init__(self, id, habit_name, place, frequency, execution_time, reminder_time, status, current_streak, last_completed):
+    # [UPDATE] Thêm recurrence (luật lặp JSON, có thể None) và start_date (ngày bắt đầu lặp YYYY-MM-DD)
+    def __init__(self, id, habit_name, place, frequency, execution_time, reminder_time, status, current_streak, last_completed,
+                 recurrence=None, start_date=None):
         self.id = id
         self.habit_name = habit_name
         self.place = place
@@ -33,11 +38,17 @@ class HabitDto:
         self.status = status
         self.current_streak = current_streak
         self.last_completed = last_completed
+        self.recurrence = recurrence
+        self.start_date = start_date
 
 # --- MANAGER ---
 class EventManager:
     def __init__(self, db_name='data.db'):
         self.db_name = db_name
+        # Chỉ mục LSH tìm sự kiện gần trùng, dựng lần đầu khi cần rồi cập nhật theo từng thao tác;
+        # (MAX(id), COUNT(*)) của bảng events lúc chỉ mục khớp với bảng
+        self._duplicate_index = None
+        self._duplicate_state = None
         self._create_tables()
 
     def _get_connection(self):
@@ -52,7 +63,8 @@ class EventManager:
             startTime TEXT NOT NULL,
             endTime TEXT,
             reminderTime INTEGER,
-            status TEXT NOT NULL CHECK (status IN ('active', 'inactive'))
+            status TEXT NOT NULL CHECK (status IN ('active', 'inactive')),
+            signature BLOB -- Chữ ký MinHash của tên + địa điểm (nlp/minhash.py) để tìm sự kiện trùng
         );"""
         
         # [UPDATE] Thêm cột currentStreak và lastCompleted
@@ -66,24 +78,42 @@ class EventManager:
             reminderTime INTEGER,
             status TEXT NOT NULL DEFAULT 'active',
             currentStreak INTEGER DEFAULT 0,
-            lastCompleted TEXT -- Lưu ngày YYYY-MM-DD
+            lastCompleted TEXT, -- Lưu ngày YYYY-MM-DD
+            recurrence TEXT, -- Luật lặp JSON (RecurrenceRule.to_dict), NULL = chỉ theo frequency
+            startDate TEXT -- Ngày bắt đầu lặp YYYY-MM-DD
         );"""
         try:
             with self._get_connection() as conn:
                 conn.execute(events_sql)
                 conn.execute(habits_sql)
+                # DB cũ: thêm cột còn thiếu; chữ ký của sự kiện cũ được tính bù khi tìm trùng,
+                # thói quen cũ bắt đầu lặp từ ngày nâng cấp
+                if "signature" not in {row[1] for row in conn.execute("PRAGMA table_info(events)")}:
+                    conn.execute("ALTER TABLE events ADD COLUMN signature BLOB")
+                # Chỉ mục hẹp: lọc status='active' và COUNT(*) (kiểm tra chỉ mục trùng còn mới) không quét cả bảng
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_events_status ON events(status)")
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(habits)")}
+                if "recurrence" not in columns:
+                    conn.execute("ALTER TABLE habits ADD COLUMN recurrence TEXT")
+                if "startDate" not in columns:
+                    conn.execute("ALTER TABLE habits ADD COLUMN startDate TEXT")
+                    conn.execute("UPDATE habits SET startDate = date('now', 'localtime') WHERE startDate IS NULL")
                 conn.commit()
         except sqlite3.Error as e:
             print(f"DB Init Error: {e}")
 
     # --- EVENTS (Giữ nguyên) ---
     def create_event(self, eventName, startTime, status="active", place=None, endTime=None, reminderTime=5):
-        sql = "INSERT INTO events (eventName, place, startTime, endTime, reminderTime, status) VALUES (?, ?, ?, ?, ?, ?)"
+        sql = "INSERT INTO events (eventName, place, startTime, endTime, reminderTime, status, signature) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        sig = minhash.signature(eventName, place)
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(sql, (eventName, place, startTime, endTime, reminderTime, status))
+                cursor.execute(sql, (eventName, place, startTime, endTime, reminderTime, status, minhash.to_blob(sig)))
                 conn.commit()
+                if self._duplicate_index is not None:
+                    self._duplicate_index.add(cursor.lastrowid, sig)
+                    self._duplicate_state = self._table_state(conn)
                 return cursor.lastrowid
         except sqlite3.Error: return None
 
@@ -123,18 +153,72 @@ class EventManager:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM events WHERE id=?", (event_id,))
                 conn.commit()
+                if self._duplicate_index is not None:
+                    self._duplicate_index.remove(event_id)
+                    self._duplicate_state = self._table_state(conn)
                 return cursor.rowcount > 0
         except sqlite3.Error: return False
 
     def update_event(self, event_id, name, start_time, place, end_time, reminder_time, status):
+        sig = minhash.signature(name, place)
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE events
-                SET eventName = ?, startTime = ?, place = ?, endTime = ?, reminderTime = ?, status = ?
+                SET eventName = ?, startTime = ?, place = ?, endTime = ?, reminderTime = ?, status = ?, signature = ?
                 WHERE id = ?
-            """, (name, start_time, place, end_time, reminder_time, status, event_id))
+            """, (name, start_time, place, end_time, reminder_time, status, minhash.to_blob(sig), event_id))
+            conn.commit()
+        if self._duplicate_index is not None:
+            self._duplicate_index.add(event_id, sig)
+
+    # --- SỰ KIỆN TRÙNG (MinHash + LSH) ---
+    def _load_signatures(self, conn):
+        """(id, chữ ký) của mọi sự kiện; sự kiện chưa có chữ ký (DB cũ) được tính bù và lưu lại."""
+        missing = conn.execute("SELECT id, eventName, place FROM events WHERE signature IS NULL").fetchall()
+        if missing:
+            sigs = minhash.signatures_batch([(row[1], row[2]) for row in missing])
+            conn.executemany("UPDATE events SET signature = ? WHERE id = ?",
+                             [(minhash.to_blob(sig), row[0]) for row, sig in zip(missing, sigs)])
             conn.commit()
+        rows = conn.execute("SELECT id, signature FROM events").fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    @staticmethod
+    def _table_state(conn):
+        # Hai câu riêng: MAX(id) đọc thẳng cuối cây rowid, COUNT(*) quét idx_events_status
+        return (conn.execute("SELECT MAX(id) FROM events").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM events").fetchone()[0])
+
+    def find_duplicate_clusters(self, threshold=minhash.THRESHOLD):
+        """Các cụm id sự kiện gần trùng (tên + địa điểm), mỗi cụm >= 2 sự kiện."""
+        try:
+            with self._get_connection() as conn:
+                ids, blobs = self._load_signatures(conn)
+        except sqlite3.Error as e:
+            print(f"Duplicate scan error: {e}")
+            return []
+        return minhash.find_clusters(ids, minhash.from_blobs(blobs), threshold)
+
+    def find_similar_events(self, eventName, place=None, threshold=minhash.THRESHOLD):
+        """Các (id, độ giống) của sự kiện gần trùng với tên + địa điểm cho trước, giống nhất trước.
+
+        Trước mỗi lần tìm so (MAX(id), COUNT(*)) của bảng với lúc dựng chỉ mục: bảng đã được thêm / xóa
+        từ nơi khác (phiên Streamlit khác, script nhập liệu) thì dựng lại chỉ mục. Sửa tên ở nơi khác
+        không đổi hai số này nên chỉ thấy sau lần dựng lại kế tiếp.
+        """
+        try:
+            with self._get_connection() as conn:
+                state = self._table_state(conn)
+                if self._duplicate_index is None or state != self._duplicate_state:
+                    ids, blobs = self._load_signatures(conn)
+                    # Dựng cả bảng bằng numpy (khóa dải theo cột + mảng đã sắp xếp), không add() từng dòng
+                    self._duplicate_index = minhash.LSHIndex.build(ids, minhash.from_blobs(blobs))
+                    self._duplicate_state = state
+        except sqlite3.Error as e:
+            print(f"Duplicate index error: {e}")
+            return []
+        return self._duplicate_index.query(minhash.signature(eventName, place), threshold)
 
     def update_event_into_inactive(self, event_id,):
         status="inactive"
@@ -148,12 +232,16 @@ class EventManager:
             conn.commit()
 
     # --- HABITS (NÂNG CẤP LOGIC GIỮ LỬA) ---
-    def create_habit(self, habitName, frequency, place=None, executionTime=None, reminderTime=5, status="active"):
-        sql = "INSERT INTO habits (habitName, place, frequency, executionTime, reminderTime, status, currentStreak, lastCompleted) VALUES (?, ?, ?, ?, ?, ?, 0, NULL)"
+    def create_habit(self, habitName, frequency, place=None, executionTime=None, reminderTime=5, status="active",
+                     recurrence=None, startDate=None):
+        sql = "INSERT INTO habits (habitName, place, frequency, executionTime, reminderTime, status, currentStreak, lastCompleted, recurrence, startDate) VALUES (?, ?, ?, ?, ?, ?, 0, NULL, ?, ?)"
+        if isinstance(recurrence, dict):
+            recurrence = json.dumps(recurrence, ensure_ascii=False)
+        startDate = startDate or datetime.now().strftime("%Y-%m-%d")
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(sql, (habitName, place, frequency, executionTime, reminderTime, status))
+                cursor.execute(sql, (habitName, place, frequency, executionTime, reminderTime, status, recurrence, startDate))
                 conn.commit()
                 return cursor.lastrowid
         except sqlite3.Error: return None
@@ -170,7 +258,7 @@ class EventManager:
                     h_dto = HabitDto(
                         row["id"], row["habitName"], row["place"], row["frequency"],
                         row["executionTime"], row["reminderTime"], row["status"],
-                        row["currentStreak"], row["lastCompleted"]
+                        row["currentStreak"], row["lastCompleted"], row["recurrence"], row["startDate"]
                     )
                     
                     # Logic kiểm tra và reset streak nếu quá hạn
@@ -312,7 +400,9 @@ class EventManager:
                         "reminder_time": row["reminderTime"],
                         "status": row["status"],
                         "current_streak": row["currentStreak"],
-                        "last_completed": row["lastCompleted"]
+                        "last_completed": row["lastCompleted"],
+                        "recurrence": row["recurrence"],
+                        "start_date": row["startDate"]
                     })
                     
             return data
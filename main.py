@@ -2,7 +2,7 @@ from traceback import format_list
 import streamlit as st
 from streamlit_calendar import calendar
 from database.database_service import EventManager
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta
 import json
 import sys
 import os
@@ -14,6 +14,7 @@ try:
     from nlp.nlp_engine import NLPEngine
 except ImportError:
     from nlp.nlp_engine import NLPEngine 
+from nlp.recurrence import RecurrenceExpander, occurrence_time, rule_for_habit
 
 # --- 1. INIT ---
 st.set_page_config(layout="wide", page_title="App Đặt Lịch")
@@ -21,7 +22,10 @@ st.set_page_config(layout="wide", page_title="App Đặt Lịch")
 if "db_service" not in st.session_state:
     st.session_state.db_service = EventManager()
 if "nlp_engine" not in st.session_state:
-    st.session_state.nlp_engine = NLPEngine()
+    st.session_state.nlp_engine = NLPEngine(cache_size=128)
+if "recurrence" not in st.session_state:
+    st.session_state.recurrence = RecurrenceExpander()
+if "habit_reminded" not in st.session_state: st.session_state["habit_reminded"] = set()
 
 if "calendar_version" not in st.session_state: st.session_state["calendar_version"] = 0
 if "nlp_data_cache" not in st.session_state: st.session_state["nlp_data_cache"] = None
@@ -42,6 +46,25 @@ st.markdown("""
 # ==========================================
 # 2. HỆ THỐNG NHẮC NHỞ (CÓ ÂM THANH)
 # ==========================================
+def habit_occurrences(habits, start, end):
+    """Các lần lặp (thói quen, ngày, giờ hoặc None) của các thói quen đang hoạt động trong [start, end]."""
+    expander = st.session_state.recurrence
+    result = []
+    for h in habits:
+        if h.status != "active":
+            continue
+        rule = rule_for_habit(h.frequency, h.recurrence)
+        if rule is None:
+            continue
+        try:
+            anchor = date.fromisoformat(h.start_date) if h.start_date else start
+        except ValueError:
+            anchor = start
+        at = occurrence_time(rule, h.execution_time)
+        for d in expander.between(rule, anchor, start, end):
+            result.append((h, d, at))
+    return result
+
 @st.fragment(run_every=60) # Chạy ngầm mỗi 60 giây
 def check_reminders():
     """Quét DB để nhắc nhở sự kiện sắp tới"""
@@ -73,6 +96,22 @@ def check_reminders():
         except Exception:
             continue
             
+    # Thói quen: chỉ trải các lần lặp của hôm nay, mỗi lần lặp nhắc một lần
+    today = now.date()
+    reminded = st.session_state["habit_reminded"]
+    reminded.difference_update([key for key in reminded if key[1] != today])
+    for h, d, at in habit_occurrences(st.session_state.db_service.get_all_habits(), today, today):
+        if at is None or (h.id, d) in reminded:
+            continue
+        diff_minutes = (datetime.combine(d, at) - now).total_seconds() / 60
+        remind_limit = h.reminder_time if h.reminder_time is not None else 15
+        if 0 < diff_minutes <= remind_limit:
+            msg = f"🔥 Đến giờ thói quen: **{h.habit_name}** lúc {at.strftime('%H:%M')}"
+            if h.place: msg += f" tại {h.place}"
+            reminded.add((h.id, d))
+            st.toast(msg, icon="🔔")
+            found_alarm = True
+
     if found_alarm:
         sound_url = "assets/I-will-survive.mp3" 
         st.audio(sound_url, format="audio/mp3", autoplay=True)
@@ -160,7 +199,7 @@ def dialog_edit_habit(habit_id):
         name = st.text_input("Tên thói quen", value=h.habit_name)
         loc = st.text_input("Địa điểm", value=h.place or "")
         
-        freq_options = ["daily", "weekly", "monthly"]
+        freq_options = ["daily", "weekly", "monthly", "yearly"]
         idx = freq_options.index(h.frequency) if h.frequency in freq_options else 0
         freq = st.selectbox("Tần suất", freq_options, index=idx)
         
@@ -170,7 +209,11 @@ def dialog_edit_habit(habit_id):
         with col1:
             if st.form_submit_button("Cập nhật", use_container_width=True):
                 st.session_state.db_service.delete_habit(habit_id)
-                st.session_state.db_service.create_habit(name, freq, place=loc, reminderTime=remind)
+                st.session_state.db_service.create_habit(
+                    name, freq, place=loc, reminderTime=remind,
+                    recurrence=h.recurrence if freq == h.frequency else None, startDate=h.start_date
+                )
+                st.session_state["calendar_version"] += 1
                 
                 st.success("Đã cập nhật!")
                 st.session_state["active_dialog"] = None
@@ -188,11 +231,18 @@ def dialog_confirm_nlp(data, intent):
         loc = st.text_input("Địa điểm:", value=data['location'] if data['location'] else "")
         
         if intent == 'create_habit':
-            freq = st.selectbox("Tần suất:", ["daily", "weekly", "monthly"], index=0)
+            freq_options = ["daily", "weekly", "monthly", "yearly"]
+            nlp_freq = data.get('habit_frequency')
+            freq = st.selectbox("Tần suất:", freq_options, index=freq_options.index(nlp_freq) if nlp_freq in freq_options else 0)
             remind = st.number_input("Nhắc trước (phút):", value=int(data['reminder_minutes'] or 0))
             date_val = datetime.now().date()
             time_val = datetime.now().time()
         else:
+            # Cảnh báo sự kiện gần trùng đã có (tên + địa điểm, xem nlp/minhash.py)
+            similar = st.session_state.db_service.find_similar_events(data['event_name'], data['location'])
+            if similar:
+                names = [ev.event_name for ev in (st.session_state.db_service.get_event_by_id(i) for i, _ in similar[:3]) if ev]
+                st.warning(f"⚠️ Có thể trùng với sự kiện đã có: {', '.join(names)}")
             t = data['time']
             d_default = t['date'].date() if t.get('date') else datetime.now().date()
             t_default = time(t['start_time']['hour'], t['start_time']['minute']) if t.get('start_time') else datetime.now().time()
@@ -205,7 +255,9 @@ def dialog_confirm_nlp(data, intent):
 
         if st.form_submit_button("💾 Lưu ngay"):
             if intent == 'create_habit':
-                st.session_state.db_service.create_habit(name, freq, place=loc, reminderTime=remind)
+                # Giữ luật lặp chi tiết (thứ trong tuần, khoảng lặp, buổi) nếu người dùng không đổi tần suất
+                recurrence = data.get('habit_recurrence') if freq == data.get('habit_frequency') else None
+                st.session_state.db_service.create_habit(name, freq, place=loc, reminderTime=remind, recurrence=recurrence)
                 st.toast("Đã tạo thói quen!")
             else:
                 start_iso = datetime.combine(date_val, time_val).isoformat()
@@ -299,7 +351,7 @@ def render_header():
         search_kw = st.text_input("🔍 Tìm kiếm:", placeholder="Tìm sự kiện...", key="search_in")
     return user_text, search_kw
 
-def render_calendar(events):
+def render_calendar(events, habits):
     cal_events = [{
         "id": str(e.id),
         "title": e.event_name,
@@ -308,6 +360,20 @@ def render_calendar(events):
         "backgroundColor": "#3788d8"
     } for e in events]
 
+    # Thói quen: chỉ trải các lần lặp từ đầu tháng trước đến hết tháng sau (các nút prev/next quanh tháng hiện tại)
+    today = datetime.now().date()
+    window_start = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    next_month = today.replace(day=28) + timedelta(days=4)
+    window_end = (next_month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    for h, d, at in habit_occurrences(habits, window_start, window_end):
+        cal_events.append({
+            "id": f"habit-{h.id}-{d.isoformat()}",
+            "title": f"🔥 {h.habit_name}",
+            "start": datetime.combine(d, at).isoformat() if at else d.isoformat(),
+            "allDay": at is None,
+            "backgroundColor": "#e8590c"
+        })
+
     cal = calendar(
         events=cal_events,
         options={
@@ -331,8 +397,13 @@ def render_calendar(events):
     if cal and "eventClick" in cal:
         # Chỉ set nếu active_dialog chưa được set (tránh override)
         if not st.session_state.get("active_dialog"):
-            st.session_state["active_dialog"] = "detail"
-            st.session_state["dialog_event_id"] = cal["eventClick"]["event"]["id"]
+            clicked_id = cal["eventClick"]["event"]["id"]
+            if clicked_id.startswith("habit-"):
+                st.session_state["active_dialog"] = "edit_habit"
+                st.session_state["dialog_habit_id"] = int(clicked_id.split("-")[1])
+            else:
+                st.session_state["active_dialog"] = "detail"
+                st.session_state["dialog_event_id"] = clicked_id
             st.rerun()
 
     st.divider()
@@ -388,6 +459,7 @@ def render_habits(habits):
                             st.rerun()
                 if st.button("🗑️", key=f"del_h_{h.id}"):
                     st.session_state.db_service.delete_habit(h.id)
+                    st.session_state["calendar_version"] += 1
                     st.rerun()
     else:
         st.caption("Chưa có thói quen.")
@@ -492,13 +564,35 @@ def main():
                             h.get("frequency", "daily"),
                             place=h.get("place", ""),
                             reminderTime=h.get("reminder_time", 5),
-                            status=h.get("status", "active")
+                            status=h.get("status", "active"),
+                            recurrence=h.get("recurrence"),
+                            startDate=h.get("start_date")
                         )
                     st.success("Nhập dữ liệu thành công!")
                     st.session_state["calendar_version"] += 1
                     st.rerun()
             except Exception as ex:
                 st.error(f"Lỗi khi đọc file: {ex}")
+
+        # Debug: thời gian từng bước của pipeline NLP (bật bằng checkbox hoặc NLP_INSTRUMENT=1)
+        st.divider()
+        with st.expander("🐞 Debug NLP"):
+            engine = st.session_state.nlp_engine
+            if st.checkbox("Đo thời gian từng bước", value=engine.instrumentation is not None):
+                instrumentation = engine.enable_instrumentation()
+                stats = instrumentation.stats()
+                if stats:
+                    st.caption("Thời gian (ms) trên các lần gọi gần nhất")
+                    st.dataframe(pd.DataFrame(stats).T[["count", "p50", "p95", "p99", "max"]].round(2), use_container_width=True)
+                    st.caption("Các lần gọi gần nhất")
+                    st.dataframe(pd.DataFrame(instrumentation.traces(20)).drop(columns=["started_at"]).round(2), use_container_width=True)
+                else:
+                    st.info("Chưa có lần gọi nào được đo.")
+                if st.button("🧹 Xóa số liệu", use_container_width=True):
+                    instrumentation.reset()
+                    st.rerun()
+            else:
+                engine.disable_instrumentation()
     
     if st.session_state["nlp_data_cache"]:
         res = st.session_state["nlp_data_cache"]
@@ -507,11 +601,11 @@ def main():
     col_cal, col_habit = st.columns([2.5, 1])
     with col_cal:
         events = st.session_state.db_service.get_all_events()
+        habits = st.session_state.db_service.get_all_habits()
         if search_kw:
             events = [e for e in events if search_kw.lower() in e.event_name.lower()]
-        render_calendar(events)
+        render_calendar(events, [h for h in habits if not search_kw or search_kw.lower() in h.habit_name.lower()])
     with col_habit:
-        habits = st.session_state.db_service.get_all_habits()
         render_habits(habits)
 
 if __name__ == "__main__" or True:  # Streamlit runs the script top-down, so just call main()
@@ -0,0 +1,91 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from nlp_engine import NLPEngine
+    from parse_result import ParseResult
+except ImportError:
+    from nlp.nlp_engine import NLPEngine
+    from nlp.parse_result import ParseResult
+
+
+class AsyncNLPEngine:
+    """Bọc NLPEngine cho backend asyncio: chạy pipeline trong executor giới hạn để không chặn event loop.
+
+    - max_workers: số luồng chạy pipeline cùng lúc.
+    - max_pending: số câu lệnh khác nhau đang xử lý/xếp hàng trong executor; vượt quá thì phải chờ chỗ trống
+      trước khi câu lệnh được đưa vào hàng. Phía gửi muốn bị chặn lại (không tự tạo hàng nghìn coroutine
+      bằng gather) thì dùng `await submit(...)`: chỉ trả về khi câu lệnh đã có chỗ trong hàng.
+    - Các lời gọi trùng câu lệnh đang xử lý dùng chung một lần tính (kết quả dùng chung: không sửa trực tiếp).
+    """
+
+    def __init__(self, engine: Optional[NLPEngine] = None, max_workers: int = 2, max_pending: int = 64):
+        if max_workers <= 0 or max_pending <= 0:
+            raise ValueError("max_workers and max_pending must be positive")
+        self.engine = engine if engine is not None else NLPEngine()
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nlp-engine")
+        # Semaphore gắn với event loop nên được tạo ở lần gọi đầu tiên
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[Tuple[str, Optional[datetime]], "asyncio.Future[ParseResult]"] = {}
+        self.computed = 0
+        self.coalesced = 0
+
+    async def process_command(self, raw_text: str, now: Optional[datetime] = None) -> ParseResult:
+        """Phiên bản async của NLPEngine.process_command."""
+        future = await self.submit(raw_text, now)
+        # shield: một lời gọi bị hủy không làm hủy phép tính mà các lời gọi khác đang chờ
+        return await asyncio.shield(future)
+
+    async def submit(self, raw_text: str, now: Optional[datetime] = None) -> "asyncio.Future[ParseResult]":
+        """Đưa câu lệnh vào hàng xử lý, chờ nếu đã có max_pending câu lệnh khác nhau đang chờ/chạy.
+
+        Trả về future của kết quả; câu lệnh trùng câu đang xử lý dùng chung future, không chiếm thêm chỗ.
+        """
+        if not raw_text or not isinstance(raw_text, str) or not raw_text.strip():
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(self.engine.process_command(raw_text, now))
+            return future
+
+        # process_command cũng strip() trước khi xử lý nên hai câu chỉ khác khoảng trắng đầu/cuối cho cùng kết quả
+        key = (raw_text.strip(), now)
+        future = self._inflight.get(key)
+        if future is None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_pending)
+            # Giữ chỗ TRƯỚC khi tạo task: lúc hàng đầy, câu lệnh chưa được lên lịch và người gửi phải chờ
+            await self._semaphore.acquire()
+            # Trong lúc chờ, một lời gọi khác có thể đã bắt đầu tính cùng câu lệnh
+            future = self._inflight.get(key)
+            if future is not None:
+                self._semaphore.release()
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(loop.run_in_executor(self._executor, self.engine.process_command, *key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.computed += 1
+        else:
+            self.coalesced += 1
+        return future
+
+    def _forget(self, key: Tuple[str, Optional[datetime]], future: "asyncio.Future[ParseResult]") -> None:
+        self._semaphore.release()
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Số lần tính thật, số lời gọi được gộp và số câu lệnh đang xử lý."""
+        return {"computed": self.computed, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+    def close(self) -> None:
+        """Dừng executor (chờ các câu lệnh đang chạy xong)."""
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncNLPEngine":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
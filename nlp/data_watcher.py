@@ -0,0 +1,41 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+class FileWatcher:
+    """Theo dõi mtime của các file dữ liệu; chỉ stat lại tối đa một lần mỗi `interval` giây."""
+
+    def __init__(self, paths: Iterable[str], interval: float = 2.0):
+        self.interval = interval
+        self._mtimes: Dict[str, Optional[int]] = {p: self._mtime(p) for p in paths}
+        self._next_check = time.monotonic() + interval
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self, force: bool = False) -> List[str]:
+        """Danh sách file đã đổi từ lần kiểm tra trước (rỗng nếu chưa tới lượt kiểm tra)."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return []
+        # Chỉ một luồng kiểm tra, các luồng khác đi tiếp với dữ liệu hiện tại
+        if not self._lock.acquire(blocking=force):
+            return []
+        try:
+            self._next_check = now + self.interval
+            changed = []
+            for path, old in self._mtimes.items():
+                new = self._mtime(path)
+                if new != old:
+                    self._mtimes[path] = new
+                    changed.append(path)
+            return changed
+        finally:
+            self._lock.release()
@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Tuple
+
+# Ký hiệu đánh dấu nút kết thúc trong trie (không bao giờ trùng với một ký tự)
+_END = ""
+
+
+def _is_word_char(ch: str) -> bool:
+    """Tương đương với \\w của regex Unicode."""
+    return ch.isalnum() or ch == "_"
+
+
+def _normalize_entries(dictionary: Dict[str, str]) -> Dict[str, str]:
+    """Khóa chữ thường, bỏ khóa rỗng; trùng khóa thì giữ mục xuất hiện trước."""
+    entries: Dict[str, str] = {}
+    for key, value in dictionary.items():
+        low = key.lower()
+        if low and low not in entries:
+            entries[low] = value
+    return entries
+
+
+def _rank_keys(entries: Dict[str, str]) -> Dict[str, int]:
+    """Thứ tự ưu tiên giống cách cũ: khóa dài xử lý trước, cùng độ dài giữ thứ tự file."""
+    return {key: i for i, key in enumerate(sorted(entries, key=len, reverse=True))}
+
+
+def _trie_insert(root: dict, key: str) -> dict:
+    """Thêm khóa, chỉ sao chép các nút trên đường đi (trie cũ vẫn nguyên vẹn)."""
+    new_root = dict(root)
+    node = new_root
+    for ch in key:
+        child = node.get(ch)
+        child = dict(child) if child is not None else {}
+        node[ch] = child
+        node = child
+    node[_END] = key
+    return new_root
+
+
+def _trie_remove(root: dict, key: str) -> dict:
+    """Xóa khóa, chỉ sao chép các nút trên đường đi và cắt bỏ nhánh rỗng."""
+    path = [root]
+    for ch in key:
+        child = path[-1].get(ch)
+        if child is None:
+            return root
+        path.append(child)
+    if _END not in path[-1]:
+        return root
+
+    new_node = dict(path[-1])
+    del new_node[_END]
+    for depth in range(len(key) - 1, -1, -1):
+        parent = dict(path[depth])
+        if new_node:
+            parent[key[depth]] = new_node
+        else:
+            del parent[key[depth]]
+        new_node = parent
+    return new_node
+
+
+class DictMatcher:
+    """Trie ký tự thay thế nhiều khóa từ điển trong một lượt quét, có so khớp ranh giới từ."""
+
+    def __init__(self, dictionary: Dict[str, str]):
+        entries = _normalize_entries(dictionary or {})
+        root: dict = {}
+        for key in entries:
+            node = root
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[_END] = key
+        # (trie, rank, values) được thay cả bộ trong một lần gán để update() không làm hỏng
+        # các lượt translate() đang chạy ở luồng khác
+        self._state: Tuple[dict, Dict[str, int], Dict[str, str]] = (root, _rank_keys(entries), entries)
+
+    def __len__(self) -> int:
+        return len(self._state[2])
+
+    def update(self, dictionary: Dict[str, str]) -> Tuple[int, int, int]:
+        """Cập nhật theo từ điển mới, chỉ sửa các nhánh trie bị đổi. Trả về (thêm, xóa, sửa giá trị)."""
+        root, _, values = self._state
+        entries = _normalize_entries(dictionary or {})
+
+        removed = [key for key in values if key not in entries]
+        added = [key for key in entries if key not in values]
+        changed = sum(1 for key, value in entries.items() if key in values and values[key] != value)
+
+        for key in removed:
+            root = _trie_remove(root, key)
+        for key in added:
+            root = _trie_insert(root, key)
+
+        self._state = (root, _rank_keys(entries), entries)
+        return len(added), len(removed), changed
+
+    @staticmethod
+    def _find_candidates(root: dict, ranks: Dict[str, int], low: str, min_rank: int) -> List[Tuple[int, int, int, str]]:
+        """Tìm mọi khóa khớp ranh giới từ: (rank, start, end, key)."""
+        candidates = []
+        n = len(low)
+        for i in range(n):
+            if i > 0 and _is_word_char(low[i - 1]):
+                continue
+            node = root.get(low[i])
+            j = i + 1
+            while node is not None:
+                key = node.get(_END)
+                if key is not None and (j == n or not _is_word_char(low[j])):
+                    rank = ranks[key]
+                    if rank >= min_rank:
+                        candidates.append((rank, i, j, key))
+                if j == n:
+                    break
+                node = node.get(low[j])
+                j += 1
+        return candidates
+
+    @staticmethod
+    def _lower(text: str) -> str:
+        low = text.lower()
+        if len(low) != len(text):
+            # Giữ nguyên độ dài để vị trí khớp trên bản chữ thường dùng được cho text gốc
+            low = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        return low
+
+    def _translate(self, text: str) -> str:
+        """Mô phỏng đúng thứ tự thay thế cũ (khóa dài trước) nhưng chỉ quét lại khi có thay thế."""
+        root, ranks, values = self._state
+        min_rank = 0
+        while True:
+            candidates = self._find_candidates(root, ranks, self._lower(text), min_rank)
+            if not candidates:
+                return text
+
+            # Chỉ khóa có độ ưu tiên cao nhất được áp dụng ở lượt này, như re.finditer cũ
+            rank = min(c[0] for c in candidates)
+            parts = []
+            pos = 0
+            for r, start, end, key in sorted(c for c in candidates if c[0] == rank):
+                if start < pos:
+                    continue
+                parts.append(text[pos:start])
+                parts.append(values[key])
+                pos = end
+            parts.append(text[pos:])
+            text = "".join(parts)
+
+            # Giá trị vừa chèn có thể tạo khớp mới cho các khóa ngắn hơn (vd: "ngay mai" -> "ngày ngày mai")
+            min_rank = rank + 1
+
+    def translate(self, text: Optional[str]) -> Optional[str]:
+        """Thay thế mọi khóa xuất hiện trong text (không phân biệt hoa thường)."""
+        if not text or not self._state[2]:
+            return text
+        return self._translate(text)
@@ -0,0 +1,272 @@
+import heapq
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+try:
+    from text_utils import remove_diacritics
+except ImportError:
+    from nlp.text_utils import remove_diacritics
+
+UNKNOWN = "unknown"
+
+
+def date_key(time_obj: Any) -> str:
+    """Ngày của kết quả dạng YYYY-MM-DD, "unknown" nếu không có."""
+    if not time_obj:
+        return UNKNOWN
+    d = time_obj.get("date")
+    try:
+        return d.strftime("%Y-%m-%d")
+    except Exception:
+        return UNKNOWN
+
+
+@lru_cache(maxsize=4096)
+def loc_key(loc: Optional[str]) -> str:
+    """Địa điểm chuẩn hóa (chữ thường, không dấu, bỏ dấu câu), "unknown" nếu không có."""
+    if not loc:
+        return UNKNOWN
+    s = remove_diacritics(loc.lower())
+    s = re.sub(r'[^\w\s]', ' ', s)
+    s = re.sub(r'\s+', ' ', s).strip()
+    return s or UNKNOWN
+
+
+def name_tokens(name: str) -> Set[str]:
+    """Các từ (dài hơn 1 ký tự) của tên sự kiện."""
+    return {t for t in name.split() if len(t) > 1}
+
+
+class _Bucket:
+    __slots__ = ("date_key", "loc_key", "tokens", "members", "reminder_minutes")
+
+    def __init__(self, date_k: str, loc_k: str, tokens: Set[str], res: Dict[str, Any], reminder: Optional[int]):
+        self.date_key = date_k
+        self.loc_key = loc_k
+        self.tokens = tokens
+        self.members = [res]
+        self.reminder_minutes = reminder
+
+
+class EventGrouper:
+    """Gom các kết quả process_command cùng ngày, cùng địa điểm (hoặc không rõ địa điểm) và tên gần giống.
+
+    Một kết quả vào nhóm tạo sớm nhất có tỉ lệ từ chung |A ∩ B| / max(|A|, |B|) >= name_threshold.
+    Nhóm được chia theo (ngày, địa điểm), mỗi phần có chỉ mục ngược từ -> nhóm: kết quả mới chỉ xét
+    các nhóm có chung ít nhất một từ (số từ chung đếm luôn qua chỉ mục), thay vì so với mọi nhóm.
+
+    Dùng theo luồng: add() từng kết quả hoặc feed() từng đợt, nhận các cập nhật "created" / "updated" /
+    "closed". Nhóm khác ngày không bao giờ gộp nên nhóm của ngày đã qua có thể đóng và bỏ khỏi bộ nhớ:
+    evict_before(ngày) tự gọi, hoặc retention_days để tự đóng các ngày cũ hơn ngày mới nhất đã gặp
+    quá retention_days ngày. Nhóm không rõ ngày không có ngày để hết hạn: max_undated giới hạn số nhóm
+    không rõ ngày đang mở, vượt quá thì feed() đóng nhóm lâu nhất chưa nhận thêm kết quả (kết quả
+    đến sau giống nhóm đó sẽ tạo nhóm mới). max_undated=None: chỉ đóng khi flush().
+    """
+
+    def __init__(self, name_threshold: float = 0.5, retention_days: Optional[int] = None,
+                 max_undated: Optional[int] = None):
+        self.name_threshold = name_threshold
+        self.retention_days = retention_days
+        self.max_undated = max_undated
+        # Chỉ số nhóm tăng dần, không dùng lại sau khi nhóm bị đóng (dict giữ thứ tự tạo)
+        self._buckets: Dict[int, _Bucket] = {}
+        self._next_id = 0
+        # (ngày, địa điểm) -> từ -> chỉ số các nhóm chứa từ đó
+        self._index: Dict[Tuple[str, str], Dict[str, List[int]]] = {}
+        # ngày -> các địa điểm có nhóm (theo thứ tự xuất hiện) / chỉ số các nhóm
+        self._locs_by_date: Dict[str, List[str]] = {}
+        self._buckets_by_date: Dict[str, List[int]] = {}
+        # Heap các ngày đang có nhóm (trừ "unknown"): đóng ngày cũ nhất trước; YYYY-MM-DD so sánh được như chuỗi
+        self._dates: List[str] = []
+        self._latest: Optional[str] = None
+        self._cutoff: Optional[str] = None
+        # Các nhóm không rõ ngày, nhóm nhận kết quả gần nhất ở cuối (dict giữ thứ tự)
+        self._undated: Dict[int, None] = {}
+
+    def __len__(self) -> int:
+        """Số nhóm đang mở."""
+        return len(self._buckets)
+
+    def _partitions(self, date_k: str, loc_k: str) -> List[Tuple[str, str]]:
+        """Các phần (ngày, địa điểm) mà kết quả có thể vào: cùng địa điểm hoặc một bên không rõ địa điểm."""
+        if loc_k == UNKNOWN:
+            return [(date_k, loc) for loc in self._locs_by_date.get(date_k, ())]
+        return [(date_k, loc_k), (date_k, UNKNOWN)]
+
+    def _find_bucket(self, date_k: str, loc_k: str, tokens: Set[str]) -> Optional[int]:
+        if self.name_threshold <= 0:
+            # Ngưỡng <= 0: mọi nhóm hợp ngày / địa điểm đều khớp, kể cả không có từ chung
+            for i in self._buckets_by_date.get(date_k, ()):
+                b = self._buckets[i]
+                if b.loc_key == UNKNOWN or loc_k == UNKNOWN or b.loc_key == loc_k:
+                    return i
+            return None
+
+        # Số từ chung với từng nhóm, đếm qua chỉ mục (mỗi nhóm chỉ nằm trong một phần)
+        shared: Counter = Counter()
+        for partition in self._partitions(date_k, loc_k):
+            postings = self._index.get(partition)
+            if not postings:
+                continue
+            for token in tokens:
+                ids = postings.get(token)
+                if ids:
+                    shared.update(ids)
+        best = None
+        buckets, n, threshold = self._buckets, len(tokens), self.name_threshold
+        for i, count in shared.items():
+            if (best is None or i < best) and count / max(n, len(buckets[i].tokens)) >= threshold:
+                best = i
+        return best
+
+    def _index_tokens(self, i: int, tokens: Iterable[str]) -> None:
+        b = self._buckets[i]
+        postings = self._index.get((b.date_key, b.loc_key))
+        if postings is None:
+            postings = self._index[(b.date_key, b.loc_key)] = {}
+            self._locs_by_date.setdefault(b.date_key, []).append(b.loc_key)
+        for token in tokens:
+            postings.setdefault(token, []).append(i)
+
+    def _add(self, res: Dict[str, Any]) -> Tuple[int, bool]:
+        data = res.get("data", {})
+        time_obj = data.get("time") or {}
+        date_k = date_key(time_obj)
+        loc_k = loc_key(data.get("location"))
+        tokens = name_tokens(data.get("event_name") or "")
+        rem = time_obj.get("reminder_minutes") if isinstance(time_obj, dict) else None
+
+        i = self._find_bucket(date_k, loc_k, tokens)
+        if i is None:
+            i = self._next_id
+            self._next_id += 1
+            self._buckets[i] = _Bucket(date_k, loc_k, tokens, res, rem)
+            ids = self._buckets_by_date.get(date_k)
+            if ids is None:
+                ids = self._buckets_by_date[date_k] = []
+                if date_k != UNKNOWN:
+                    heapq.heappush(self._dates, date_k)
+            ids.append(i)
+            self._index_tokens(i, tokens)
+            if date_k == UNKNOWN:
+                self._undated[i] = None
+            if date_k != UNKNOWN and (self._latest is None or date_k > self._latest):
+                self._advance(date_k)
+            return i, True
+
+        b = self._buckets[i]
+        b.members.append(res)
+        if date_k == UNKNOWN:
+            del self._undated[i]
+            self._undated[i] = None
+        new_tokens = tokens - b.tokens
+        if new_tokens:
+            b.tokens = b.tokens | new_tokens
+            self._index_tokens(i, new_tokens)
+        if rem is not None:
+            b.reminder_minutes = rem if b.reminder_minutes is None else min(b.reminder_minutes, rem)
+        return i, False
+
+    def _advance(self, latest: str) -> None:
+        """Ghi nhận ngày mới nhất đã gặp và ngày đóng tự động theo retention_days."""
+        self._latest = latest
+        if self.retention_days is not None:
+            cutoff = datetime.strptime(latest, "%Y-%m-%d") - timedelta(days=self.retention_days)
+            self._cutoff = cutoff.strftime("%Y-%m-%d")
+
+    def add(self, res: Dict[str, Any]) -> int:
+        """Thêm một kết quả, trả về chỉ số nhóm (0, 1, ...) mà nó thuộc về. Không tự đóng ngày cũ."""
+        return self._add(res)[0]
+
+    def add_all(self, results: Iterable[Dict[str, Any]]) -> "EventGrouper":
+        for res in results:
+            self._add(res)
+        return self
+
+    def feed(self, results: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Thêm một đợt kết quả (list hoặc luồng vô hạn), lần lượt trả về các cập nhật nhóm.
+
+        Mỗi cập nhật là {"type": "created" | "updated" | "closed", "group": nhóm như groups()}.
+        Với retention_days, nhóm của các ngày quá hạn được đóng ngay khi ngày mới nhất tiến lên
+        (kết quả đến muộn cho ngày đã đóng tạo nhóm mới và được đóng lại ngay). Với max_undated,
+        nhóm không rõ ngày lâu nhất chưa được cập nhật bị đóng khi số nhóm không rõ ngày vượt giới hạn.
+        """
+        for res in results:
+            i, created = self._add(res)
+            yield {"type": "created" if created else "updated", "group": self._group(i)}
+            if self._cutoff is not None and self._dates and self._dates[0] < self._cutoff:
+                yield from self.evict_before(self._cutoff)
+            if self.max_undated is not None:
+                while len(self._undated) > self.max_undated:
+                    yield self._close_bucket(next(iter(self._undated)))
+
+    def evict_before(self, cutoff: Union[date, str]) -> List[Dict[str, Any]]:
+        """Đóng và bỏ khỏi bộ nhớ mọi nhóm có ngày trước cutoff. Trả về các cập nhật "closed"."""
+        if not isinstance(cutoff, str):
+            cutoff = cutoff.strftime("%Y-%m-%d")
+        closed = []
+        while self._dates and self._dates[0] < cutoff:
+            closed.extend(self._close_date(heapq.heappop(self._dates)))
+        return closed
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Đóng mọi nhóm còn mở (kể cả nhóm không rõ ngày), ví dụ khi luồng kết thúc."""
+        closed = []
+        while self._dates:
+            closed.extend(self._close_date(heapq.heappop(self._dates)))
+        closed.extend(self._close_date(UNKNOWN))
+        return closed
+
+    def _close_date(self, date_k: str) -> List[Dict[str, Any]]:
+        closed = []
+        for i in self._buckets_by_date.pop(date_k, ()):
+            closed.append({"type": "closed", "group": self._group(i)})
+            del self._buckets[i]
+            self._undated.pop(i, None)
+        for loc in self._locs_by_date.pop(date_k, ()):
+            del self._index[(date_k, loc)]
+        return closed
+
+    def _close_bucket(self, i: int) -> Dict[str, Any]:
+        """Đóng một nhóm (không đóng cả ngày của nó), bỏ nhóm khỏi chỉ mục. Trả về cập nhật "closed"."""
+        update = {"type": "closed", "group": self._group(i)}
+        b = self._buckets.pop(i)
+        self._undated.pop(i, None)
+        ids = self._buckets_by_date[b.date_key]
+        ids.remove(i)
+        if not ids:
+            del self._buckets_by_date[b.date_key]
+        partition = (b.date_key, b.loc_key)
+        postings = self._index[partition]
+        for token in b.tokens:
+            posting = postings[token]
+            posting.remove(i)
+            if not posting:
+                del postings[token]
+        if not postings:
+            del self._index[partition]
+            locs = self._locs_by_date[b.date_key]
+            locs.remove(b.loc_key)
+            if not locs:
+                del self._locs_by_date[b.date_key]
+        return update
+
+    def _group(self, i: int) -> Dict[str, Any]:
+        b = self._buckets[i]
+        first_member = b.members[0]
+        return {
+            "group_id": i + 1,
+            "representative_name": first_member["data"]["event_name"],
+            "date": b.date_key,
+            "location": None if b.loc_key == UNKNOWN else first_member["data"]["location"],
+            "count": len(b.members),
+            "members": b.members,
+            "reminder_minutes": b.reminder_minutes,
+        }
+
+    def groups(self) -> List[Dict[str, Any]]:
+        """Các nhóm đang mở theo thứ tự tạo, group_id từ 1."""
+        return [self._group(i) for i in self._buckets]
@@ -0,0 +1,168 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from text_utils import remove_diacritics
+except ImportError:
+    from nlp.text_utils import remove_diacritics
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Chỉ chấp nhận gõ sai (1 lỗi mỗi từ) với từ chữ cái đủ dài: "gon" / "gom" quá dễ trùng từ thường
+_TYPO_MIN_LEN = 3
+_TYPO_LONGER_MIN_LEN = 4
+# Số từ (không dấu) được nhớ danh sách từ gần đúng; đa số câu lặp lại các từ thông dụng
+_VARIANTS_CACHE_MAX = 4096
+
+# Nút trie: {từ không dấu: nút con, "": [(địa điểm có dấu, các từ của nó)]}
+_Terminal = List[Tuple[str, Tuple[str, ...]]]
+
+
+def _deletes(word: str) -> List[str]:
+    return [word[:i] + word[i + 1:] for i in range(len(word))]
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """a, b cách nhau đúng một phép thêm / xóa / thay / đổi chỗ hai ký tự liền nhau."""
+    la, lb = len(a), len(b)
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    if lb - la > 1 or a == b:
+        return False
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:] or (
+            i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+        )
+    return a[i:] == b[i + 1:]
+
+
+def _typo_allowed(word: str) -> bool:
+    return len(word) >= _TYPO_MIN_LEN and word.isalpha()
+
+
+class FuzzyGazetteer:
+    """Tìm địa điểm không phân biệt dấu và chịu lỗi gõ ("sai gon", "ho boi", "sai gonn" -> "sài gòn").
+
+    Trie theo từ không dấu trên danh sách địa điểm; mỗi từ trong câu được mở rộng thành các từ
+    không dấu gần đúng nhờ chỉ mục symmetric-delete trên bộ từ vựng địa điểm (nhỏ hơn nhiều số địa điểm).
+    Điểm = 1 - lỗi / độ dài tên: gõ không dấu không bị trừ, gõ sai dấu ("huệ" vs "huế") hay sai chữ trừ 1 lỗi.
+    """
+
+    def __init__(self, places: Iterable[str], min_score: float = 0.85):
+        self.min_score = min_score
+        root: dict = {}
+        seen: Set[str] = set()
+        vocab: Set[str] = set()
+        for place in places:
+            place = place.lower()
+            words = tuple(_WORD_PATTERN.findall(place))
+            if not words or place in seen:
+                continue
+            seen.add(place)
+            node = root
+            for word in words:
+                folded = remove_diacritics(word)
+                vocab.add(folded)
+                node = node.setdefault(folded, {})
+            node.setdefault("", []).append((place, words))
+
+        deletes: Dict[str, List[str]] = {}
+        for word in vocab:
+            if _typo_allowed(word):
+                for variant in _deletes(word):
+                    deletes.setdefault(variant, []).append(word)
+        self._state: Tuple[dict, Set[str], Dict[str, List[str]]] = (root, vocab, deletes)
+        self._variants_cache: Dict[str, Tuple[str, ...]] = {}
+        self._size = len(seen)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _variants(self, folded: str) -> Tuple[str, ...]:
+        """Các từ trong bộ từ vựng khớp folded: chính nó (nếu có) và các từ cách 1 lỗi gõ."""
+        cached = self._variants_cache.get(folded)
+        if cached is not None:
+            return cached
+        _, vocab, deletes = self._state
+        found = [folded] if folded in vocab else []
+        if _typo_allowed(folded):
+            # symmetric delete: hai từ cách 1 lỗi luôn có chung một dạng xóa-1-ký-tự (hoặc một từ là dạng xóa của từ kia)
+            for key in [folded] + _deletes(folded):
+                for word in deletes.get(key, ()):
+                    if (
+                        word not in found
+                        and max(len(word), len(folded)) >= _TYPO_LONGER_MIN_LEN
+                        and _within_one_edit(word, folded)
+                    ):
+                        found.append(word)
+            for word in _deletes(folded):
+                if word not in found and word in vocab and len(word) >= _TYPO_MIN_LEN:
+                    found.append(word)
+        result = tuple(found)
+        if len(self._variants_cache) >= _VARIANTS_CACHE_MAX:
+            self._variants_cache.clear()
+        self._variants_cache[folded] = result
+        return result
+
+    @staticmethod
+    def _cost(query: List[str], words: Tuple[str, ...]) -> int:
+        """Số lỗi giữa các từ người dùng gõ và các từ của địa điểm (đã biết là khớp từng cặp khi bỏ dấu / 1 lỗi gõ)."""
+        cost = 0
+        for q, w in zip(query, words):
+            if q == w:
+                continue
+            folded = remove_diacritics(q)
+            if folded != remove_diacritics(w):
+                cost += 1
+                continue
+            # Cùng chữ khi bỏ dấu: chỉ tính các ký tự người dùng có gõ dấu nhưng khác dấu
+            cost += sum(1 for qc, fc, wc in zip(q, folded, w) if qc != fc and qc != wc)
+        return cost
+
+    def _walk(self, words: List[str], folded: List[str], i: int) -> Iterable[Tuple[int, str, float]]:
+        """(j, địa điểm, điểm) cho mọi địa điểm khớp các từ words[i..j]."""
+        nodes = [self._state[0]]
+        for j in range(i, len(words)):
+            variants = self._variants(folded[j])
+            nodes = [child for node in nodes for v in variants for child in (node.get(v),) if child is not None]
+            if not nodes:
+                return
+            for node in nodes:
+                for place, place_words in node.get("", ()):
+                    cost = self._cost(words[i:j + 1], place_words)
+                    yield j, place, 1.0 - cost / len(place)
+
+    def match(self, query: str) -> Optional[Tuple[str, float]]:
+        """Địa điểm (có dấu) gần nhất với cả chuỗi query, kèm điểm 0..1; None nếu dưới min_score."""
+        words = _WORD_PATTERN.findall(query.lower())
+        if not words:
+            return None
+        folded = [remove_diacritics(w) for w in words]
+        best: Optional[Tuple[str, float]] = None
+        for j, place, score in self._walk(words, folded, 0):
+            if j == len(words) - 1 and score >= self.min_score and (best is None or score > best[1]):
+                best = (place, score)
+        return best
+
+    def find(self, text: str) -> List[Tuple[str, float, int, int]]:
+        """(địa điểm có dấu, điểm, start, end) cho các cụm từ trong text khớp mờ một địa điểm, điểm cao trước.
+
+        Mỗi cụm chỉ giữ địa điểm điểm cao nhất (trùng điểm: địa điểm nạp trước).
+        """
+        matches = list(_WORD_PATTERN.finditer(text.lower()))
+        if not matches or not self._state[0]:
+            return []
+        words = [m.group() for m in matches]
+        folded = [remove_diacritics(w) for w in words]
+        best: Dict[Tuple[int, int], Tuple[str, float]] = {}
+        for i in range(len(words)):
+            for j, place, score in self._walk(words, folded, i):
+                span = (matches[i].start(), matches[j].end())
+                if score >= self.min_score and (span not in best or score > best[span][1]):
+                    best[span] = (place, score)
+        found = [(place, score, start, end) for (start, end), (place, score) in best.items()]
+        found.sort(key=lambda m: (-m[1], m[2] - m[3], m[2]))
+        return found
@@ -0,0 +1,436 @@
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Nút trie: dict {cạnh: nút con, "": tên địa điểm kết thúc tại đây}; nút lá chỉ là chuỗi tên địa điểm
+# (đa số địa điểm không là tiền tố của địa điểm khác nên không cần dict riêng)
+_Node = Union[dict, str]
+
+
+def _edges(place: str) -> List[str]:
+    """Các cạnh của một địa điểm: từ đầu tiên, sau đó mỗi từ kèm đúng phần phân cách đứng trước nó."""
+    edges = []
+    pos = None
+    for m in _WORD_PATTERN.finditer(place):
+        edges.append(sys.intern(place[m.start() if pos is None else pos:m.end()]))
+        pos = m.end()
+    return edges
+
+
+class Gazetteer:
+    """Trie theo từ của danh sách địa điểm: tìm mọi địa điểm đã biết trong câu bằng một lượt quét.
+
+    Mỗi cạnh là một từ (\\w+) kèm phân cách đứng trước nên "hà nội" chỉ khớp "hà nội" (một dấu cách),
+    giống re.search(r"\\b" + re.escape(place) + r"\\b"). Thời gian tìm phụ thuộc độ dài câu, không phụ thuộc số địa điểm.
+    """
+
+    def __init__(self, places: Iterable[str]):
+        root: dict = {}
+        ranks: Dict[str, int] = {}
+        for place in places:
+            place = place.lower()
+            edges = _edges(place)
+            if not edges or place in ranks:
+                continue
+            ranks[place] = len(ranks)
+            self._insert(root, edges, place)
+        # Gán cả bộ một lần (giống DictMatcher): lượt tìm đang chạy ở luồng khác không thấy trie dở dang
+        self._state: Tuple[dict, Dict[str, int]] = (root, ranks)
+
+    @staticmethod
+    def _insert(root: dict, edges: List[str], place: str) -> None:
+        node = root
+        for edge in edges[:-1]:
+            child = node.get(edge)
+            if child is None:
+                child = node[edge] = {}
+            elif isinstance(child, str):
+                child = node[edge] = {"": child}
+            node = child
+        last = edges[-1]
+        child = node.get(last)
+        if child is None:
+            node[last] = place
+        elif isinstance(child, dict) and "" not in child:
+            child[""] = place
+
+    @staticmethod
+    def _own(parent: dict, edge: str, fresh: Set[int]) -> dict:
+        """Nút con parent[edge] dạng dict sửa được: sao chép (hoặc tạo mới) một lần mỗi lượt update()."""
+        child = parent.get(edge)
+        if child is None:
+            child = {}
+        elif isinstance(child, str):
+            child = {"": child}
+        elif id(child) in fresh:
+            return child
+        else:
+            child = dict(child)
+        fresh.add(id(child))
+        parent[edge] = child
+        return child
+
+    def update(self, added: Iterable[str], removed: Iterable[str],
+               order: Optional[Iterable[str]] = None) -> Tuple[int, int]:
+        """Thêm / bỏ địa điểm, chỉ sao chép các nhánh trie bị đổi (như DictMatcher.update). Trả về (thêm, bỏ).
+
+        order: toàn bộ danh sách mới theo thứ tự nạp, để thứ tự kết quả find() giống hệt khi dựng lại
+        từ đầu; bỏ trống thì các địa điểm cũ giữ thứ tự, địa điểm mới xếp sau.
+        """
+        root, ranks = self._state
+        new_root = dict(root)
+        # id các nút đã sao chép trong lượt này (các nút cũ vẫn sống trong trie cũ nên id không bị dùng lại)
+        fresh: Set[int] = {id(new_root)}
+        dropped: Set[str] = set()
+        for place in removed:
+            place = place.lower()
+            if place in ranks and place not in dropped:
+                dropped.add(place)
+                self._remove(new_root, _edges(place), place, fresh)
+        appended: Dict[str, None] = {}
+        for place in added:
+            place = place.lower()
+            edges = _edges(place)
+            if not edges or (place in ranks and place not in dropped) or place in appended:
+                continue
+            appended[place] = None
+            node = new_root
+            for edge in edges[:-1]:
+                node = self._own(node, edge, fresh)
+            last = edges[-1]
+            child = node.get(last)
+            if child is None:
+                node[last] = place
+            elif isinstance(child, dict) and "" not in child:
+                self._own(node, last, fresh)[""] = place
+
+        if order is None:
+            new_ranks = dict(ranks)
+            for place in dropped:
+                del new_ranks[place]
+            # Thứ tự chỉ dùng để so sánh nên không cần đánh số lại cho liền
+            last = next(reversed(ranks.values()), -1)
+            for place in appended:
+                if place not in new_ranks:
+                    last += 1
+                    new_ranks[place] = last
+        else:
+            lowered = [place.lower() for place in order]
+            # Duyệt ngược để tên trùng giữ vị trí xuất hiện đầu tiên
+            new_ranks = dict(zip(reversed(lowered), range(len(lowered) - 1, -1, -1)))
+            kept = (ranks.keys() - dropped) | appended.keys()
+            for place in new_ranks.keys() - kept:
+                del new_ranks[place]
+            for place in kept - new_ranks.keys():
+                new_ranks[place] = len(lowered) + len(new_ranks)
+        # Thay cả bộ trong một lần gán: lượt find() đang chạy vẫn đọc trie cũ nguyên vẹn
+        self._state = (new_root, new_ranks)
+        return len(appended), len(dropped)
+
+    @classmethod
+    def _remove(cls, root: dict, edges: List[str], place: str, fresh: Set[int]) -> None:
+        path = [root]
+        for edge in edges[:-1]:
+            child = path[-1].get(edge)
+            if not isinstance(child, dict):
+                return
+            path.append(child)
+        last = edges[-1]
+        child = path[-1].get(last)
+        if not (child == place or (isinstance(child, dict) and child.get("") == place)):
+            return
+        # Sao chép đường đi từ gốc xuống (gốc đã là bản sao)
+        node = root
+        for edge in edges[:-1]:
+            node = cls._own(node, edge, fresh)
+        if isinstance(child, str):
+            del node[last]
+        else:
+            rest = cls._own(node, last, fresh)
+            del rest[""]
+            if not rest:
+                del node[last]
+        # Cắt các nút rỗng từ dưới lên
+        nodes = [root]
+        for edge in edges[:-1]:
+            nodes.append(nodes[-1][edge])
+        for depth in range(len(edges) - 1, 0, -1):
+            if nodes[depth]:
+                break
+            del nodes[depth - 1][edges[depth - 1]]
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+    def __iter__(self) -> Iterator[str]:
+        """Các địa điểm (chữ thường) theo thứ tự nạp."""
+        ranks = self._state[1]
+        return iter(sorted(ranks, key=ranks.__getitem__))
+
+    def find(self, text: str) -> List[str]:
+        """Các địa điểm xuất hiện trong text (đã chuyển chữ thường), mỗi địa điểm một lần, theo thứ tự nạp."""
+        root, ranks = self._state
+        if not root or not text:
+            return []
+        spans = [m.span() for m in _WORD_PATTERN.finditer(text)]
+        found = set()
+        n = len(spans)
+        for i in range(n):
+            start, end = spans[i]
+            node = root.get(text[start:end])
+            j = i
+            while node is not None:
+                if isinstance(node, str):
+                    found.add(node)
+                    break
+                place = node.get("")
+                if place is not None:
+                    found.add(place)
+                j += 1
+                if j == n:
+                    break
+                node = node.get(text[end:spans[j][1]])
+                end = spans[j][1]
+        return sorted(found, key=ranks.__getitem__)
+
+
+# ==============================================================================
+# File gazetteer gọn (.gaz): khóa sắp xếp + chỉ mục tiền tố, đọc qua mmap
+# ==============================================================================
+# Bố cục (số nguyên uint32 little-endian):
+#   header   MAGIC, số khóa N, số bit bloom khóa, số bit bloom tiền tố, độ dài blob
+#   buckets  65537 số: chỉ số khóa đầu tiên có 2 byte đầu >= b (b = byte0 << 8 | byte1)
+#   offsets  N + 1 số: vị trí (tính từ đầu file) của mỗi khóa trong blob
+#   ranks    N số: thứ tự nạp (dài trước như locations_db) của mỗi khóa
+#   bloom    bitmap các khóa, rồi bitmap các tiền tố theo từ ("hồ", "hồ hoàn" của "hồ hoàn kiếm")
+#   blob     các khóa UTF-8 chữ thường, sắp xếp theo byte
+#
+# locations.gaz chỉ là con trỏ (POINTER_MAGIC + tên file) tới file dữ liệu có phiên bản
+# "locations-<phiên bản>.gaz" cùng thư mục: dựng lại ghi ra file dữ liệu mới rồi đổi con trỏ, không
+# ghi đè file đang được mmap (Windows không cho đổi tên / xóa file đang map). File dữ liệu cũ kiểu
+# một file (bắt đầu bằng MAGIC) vẫn đọc được.
+MAGIC = b"GAZ1"
+POINTER_MAGIC = b"GAZP"
+_HEADER = struct.Struct("<4sIIII")
+_BUCKETS = 1 << 16
+# 16 bit mỗi phần tử, 2 hàm băm: ~1.5% dương tính giả
+_BLOOM_BITS_PER_ITEM = 16
+
+
+def _bucket(key: bytes) -> int:
+    return key[0] << 8 | (key[1] if len(key) > 1 else 0)
+
+
+def _bloom_positions(key: bytes, bits: int) -> Tuple[int, int]:
+    return zlib.crc32(key) % bits, (zlib.adler32(key) * 0x9E3779B1 & 0xFFFFFFFF) % bits
+
+
+def _bloom(keys: Iterable[bytes], count: int) -> Tuple[int, bytearray]:
+    bits = max(64, -(-count * _BLOOM_BITS_PER_ITEM // 8) * 8)
+    bitmap = bytearray(bits // 8)
+    for key in keys:
+        for pos in _bloom_positions(key, bits):
+            bitmap[pos >> 3] |= 1 << (pos & 7)
+    return bits, bitmap
+
+
+def _uint32(values: Iterable[int]) -> bytes:
+    data = array("I", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def resolve_compact(path: str) -> str:
+    """File dữ liệu mà path trỏ tới (chính path nếu là file .gaz kiểu cũ)."""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    if head.startswith(POINTER_MAGIC):
+        return os.path.join(os.path.dirname(os.path.abspath(path)), head[len(POINTER_MAGIC):].decode("utf-8"))
+    return path
+
+
+def _remove_stale_versions(path: str, keep: Iterable[str]) -> None:
+    """Xóa các file dữ liệu cũ của path trừ keep; file còn được map (Windows) thì để lần dựng sau."""
+    directory = os.path.dirname(os.path.abspath(path))
+    stem, ext = os.path.splitext(os.path.basename(path))
+    pattern = re.compile(re.escape(stem) + r"-[0-9a-f]+" + re.escape(ext))
+    keep = {os.path.basename(name) for name in keep}
+    for name in os.listdir(directory):
+        if pattern.fullmatch(name) and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def build_compact(places: Iterable[str], path: str) -> int:
+    """Ghi danh sách địa điểm ra file .gaz (file dữ liệu mới + con trỏ path). Trả về số khóa đã ghi."""
+    ranks: Dict[bytes, int] = {}
+    prefixes = set()
+    for place in places:
+        # Khóa bỏ phân cách ở hai đầu như các cạnh của Gazetteer
+        edges = _edges(place.lower())
+        key = "".join(edges).encode("utf-8")
+        if not key or key in ranks:
+            continue
+        ranks[key] = len(ranks)
+        for i in range(1, len(edges)):
+            prefixes.add("".join(edges[:i]).encode("utf-8"))
+    keys = sorted(ranks)
+
+    buckets = []
+    i = 0
+    for b in range(_BUCKETS):
+        while i < len(keys) and _bucket(keys[i]) < b:
+            i += 1
+        buckets.append(i)
+    buckets.append(len(keys))
+
+    key_bits, key_bloom = _bloom(keys, len(keys))
+    prefix_bits, prefix_bloom = _bloom(prefixes, len(prefixes))
+    offsets = [_HEADER.size + 4 * ((_BUCKETS + 1) + (len(keys) + 1) + len(keys)) + (key_bits + prefix_bits) // 8]
+    for key in keys:
+        offsets.append(offsets[-1] + len(key))
+
+    # Tên file mới mỗi lần dựng: không ghi đè file mà tiến trình khác đang mmap
+    stem, ext = os.path.splitext(path)
+    data_path = f"{stem}-{time.time_ns():x}{ext}"
+    # Ghi ra file tạm rồi đổi tên: watcher và các tiến trình đang đọc không thấy file ghi dở
+    tmp_path = data_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(keys), key_bits, prefix_bits, offsets[-1] - offsets[0]))
+        f.write(_uint32(buckets))
+        f.write(_uint32(offsets))
+        f.write(_uint32(ranks[key] for key in keys))
+        f.write(key_bloom)
+        f.write(prefix_bloom)
+        f.write(b"".join(keys))
+    os.replace(tmp_path, data_path)
+
+    try:
+        previous = resolve_compact(path)
+    except OSError:
+        previous = path
+    # Con trỏ chỉ được đọc rồi đóng ngay (không map) nên thay được cả khi file dữ liệu cũ còn mở
+    with open(path + ".tmp", "wb") as f:
+        f.write(POINTER_MAGIC + os.path.basename(data_path).encode("utf-8"))
+    os.replace(path + ".tmp", path)
+    # Giữ bản ngay trước: tiến trình vừa đọc con trỏ cũ vẫn mở được file của nó
+    _remove_stale_versions(path, (data_path, previous))
+    return len(keys)
+
+
+def build_from_json(json_path: str, path: str) -> int:
+    """Dựng file .gaz từ locations.json (các nhóm địa điểm), dài trước như LocationParser."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    locations = [loc for group in data.values() for loc in group]
+    return build_compact(sorted(locations, key=len, reverse=True), path)
+
+
+class CompactGazetteer:
+    """Đọc file .gaz qua mmap, cùng API find() với Gazetteer.
+
+    Không nạp danh sách vào bộ nhớ: bloom loại ngay các cụm từ không phải địa điểm / tiền tố địa điểm,
+    cụm còn lại được tìm nhị phân trong đoạn khóa có cùng 2 byte đầu; chỉ giải mã các địa điểm thực sự khớp.
+    Khởi động gần như tức thì dù file có hàng triệu địa điểm. Các bảng số (vài MB) được chép ra khỏi mmap
+    để không giữ memoryview nào trên nó: close() đóng được map bất cứ lúc nào.
+    """
+
+    def __init__(self, path: str):
+        with open(resolve_compact(path), "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, key_bits, prefix_bits, blob_size = _HEADER.unpack_from(self._mm, 0)
+        start = _HEADER.size
+        end = start + 4 * ((_BUCKETS + 1) + (count + 1) + count)
+        if magic != MAGIC or len(self._mm) != end + (key_bits + prefix_bits) // 8 + blob_size:
+            self._mm.close()
+            raise ValueError(f"{path} không phải file gazetteer hợp lệ")
+
+        table = array("I")
+        table.frombytes(self._mm[start:end])
+        if sys.byteorder != "little":
+            table.byteswap()
+        self._count = count
+        self._buckets = table[:_BUCKETS + 1]
+        self._offsets = table[_BUCKETS + 1:_BUCKETS + count + 2]
+        self._ranks = table[_BUCKETS + count + 2:]
+        self._key_bloom = (end, key_bits)
+        self._prefix_bloom = (end + key_bits // 8, prefix_bits)
+
+    def close(self) -> None:
+        """Đóng mmap (sau đó không dùng find() được nữa)."""
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """Các địa điểm theo thứ tự nạp. Giải mã cả file: chỉ dùng khi thật cần toàn bộ danh sách."""
+        by_rank = array("I", bytes(4 * self._count))
+        for index, rank in enumerate(self._ranks):
+            by_rank[rank] = index
+        mm, offsets = self._mm, self._offsets
+        for index in by_rank:
+            yield mm[offsets[index]:offsets[index + 1]].decode("utf-8")
+
+    def _index(self, key: bytes) -> int:
+        """Chỉ số của key trong file, -1 nếu không có."""
+        if len(key) > 1:
+            b = key[0] << 8 | key[1]
+        else:
+            b = key[0] << 8
+        lo, hi = self._buckets[b], self._buckets[b + 1]
+        mm, offsets = self._mm, self._offsets
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mm[offsets[mid]:offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._buckets[b + 1] and mm[offsets[lo]:offsets[lo + 1]] == key:
+            return lo
+        return -1
+
+    def find(self, text: str) -> List[str]:
+        """Các địa điểm xuất hiện trong text (đã chuyển chữ thường), mỗi địa điểm một lần, theo thứ tự nạp."""
+        if not self._count or not text:
+            return []
+        mm, crc32, adler32 = self._mm, zlib.crc32, zlib.adler32
+        (key_base, key_bits), (prefix_base, prefix_bits) = self._key_bloom, self._prefix_bloom
+        spans = [m.span() for m in _WORD_PATTERN.finditer(text)]
+        found: Dict[int, bytes] = {}
+        n = len(spans)
+        for i in range(n):
+            start = spans[i][0]
+            for j in range(i, n):
+                key = text[start:spans[j][1]].encode("utf-8")
+                h1, h2 = crc32(key), adler32(key) * 0x9E3779B1 & 0xFFFFFFFF
+                pos1, pos2 = h1 % key_bits, h2 % key_bits
+                if mm[key_base + (pos1 >> 3)] >> (pos1 & 7) & 1 and mm[key_base + (pos2 >> 3)] >> (pos2 & 7) & 1:
+                    index = self._index(key)
+                    if index >= 0:
+                        found[self._ranks[index]] = key
+                # Không địa điểm nào bắt đầu bằng cụm này: dừng, như trie hết nhánh
+                pos1, pos2 = h1 % prefix_bits, h2 % prefix_bits
+                if not (mm[prefix_base + (pos1 >> 3)] >> (pos1 & 7) & 1 and mm[prefix_base + (pos2 >> 3)] >> (pos2 & 7) & 1):
+                    break
+        return [found[rank].decode("utf-8") for rank in sorted(found)]
+
+
+if __name__ == "__main__":
+    # Bước build: python nlp/gazetteer.py [locations.json] [locations.gaz]
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data_dir, "locations.json")
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0] + ".gaz"
+    print(f"✅ {dst}: {build_from_json(src, dst)} địa điểm")
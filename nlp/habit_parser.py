@@ -7,6 +7,63 @@ class Frequency(Enum):
     WEEKLY = "weekly"
     MONTHLY = "monthly"
     YEARLY = "yearly"
+
+
+class RecurrenceRule:
+    """Luật lặp của thói quen: mỗi `interval` ngày/tuần/tháng/năm, vào các thứ `weekdays`, buổi `period`.
+
+    weekdays theo datetime.weekday() (0 = thứ 2 ... 6 = chủ nhật), rỗng nếu câu không nói thứ nào.
+    Bất biến và hash được: dùng làm khóa cache khi trải lịch.
+    """
+
+    __slots__ = ("frequency", "interval", "weekdays", "period")
+
+    def __init__(
+        self,
+        frequency: Frequency,
+        interval: int = 1,
+        weekdays: Tuple[int, ...] = (),
+        period: Optional[str] = None,
+    ):
+        self.frequency = frequency
+        self.interval = interval
+        self.weekdays = tuple(weekdays)
+        self.period = period
+
+    def _key(self) -> Tuple[Frequency, int, Tuple[int, ...], Optional[str]]:
+        return self.frequency, self.interval, self.weekdays, self.period
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RecurrenceRule) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (
+            f"RecurrenceRule({self.frequency.value}, interval={self.interval}, "
+            f"weekdays={self.weekdays}, period={self.period!r})"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frequency": self.frequency.value,
+            "interval": self.interval,
+            "weekdays": list(self.weekdays),
+            "period": self.period,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RecurrenceRule":
+        """Ngược với to_dict(); chỉ cần "frequency" (cột habits.frequency cũ là "daily" / "weekly"...)."""
+        return cls(
+            Frequency(data["frequency"]),
+            int(data.get("interval") or 1),
+            tuple(sorted(int(d) for d in data.get("weekdays") or ())),
+            data.get("period"),
+        )
+
+
 class HabitParser:
     # =========================================================================
     # CONSTANTS
@@ -15,6 +72,8 @@ class HabitParser:
     TIME_PERIODS = r"(?:sáng|trưa|chiều|tối|đêm)"
     # Từ khóa chỉ tần suất
     QUANTIFIER_WORDS = r"(?:mỗi|mọi|mõi|hàng)"
+    # Từ khóa chỉ tần suất trong câu gốc, kể cả viết sai/không dấu
+    MENTION_QUANTIFIER_WORDS = r"(?:mỗi|mõi|moi|hàng|mọi)"
     # Từ cụm từ (loại trừ khỏi quantifier "hàng")
     EXCLUDED_PHRASES_BEFORE_HANG = [
         r"(?<!khách\s)",   # "khách hàng"
@@ -23,83 +82,154 @@ class HabitParser:
         r"(?<!cửa\s)",     # "cửa hàng"
         r"(?<!tạp\s)",     # "tạp hàng"
     ]
+    # Một thứ trong tuần: thứ 2 / thứ hai, chủ nhật, cn, t2..t7
+    WEEKDAY = r"(?:thứ\s*(?:[2-7]|hai|ba|tư|năm|sáu|bảy|bẩy)|chủ\s*nhật|c\.?n|t[2-7])"
+    # Phần tiếp theo của danh sách thứ: "và t5", ", 4" (số trần không phải giờ: "thứ 2, 3 giờ")
+    WEEKDAY_MORE = r"(?:\s*(?:,|và|&|hoặc)\s*(?:{weekday}|[2-7](?!\s*(?:h\b|g\b|giờ|phút|tiếng|:))))"
+
+    # Số thứ tự -> datetime.weekday()
+    WEEKDAY_NUMBERS = {"hai": 2, "ba": 3, "tư": 4, "năm": 5, "sáu": 6, "bảy": 7, "bẩy": 7}
+    SUNDAY = 6
+    UNIT_FREQUENCIES = {
+        "ngày": Frequency.DAILY,
+        "tuần": Frequency.WEEKLY,
+        "tháng": Frequency.MONTHLY,
+        "năm": Frequency.YEARLY,
+    }
+    # Nhánh đã khớp (nhóm đóng sau cùng, Match.lastgroup) -> tần suất; nhánh "unit" tra UNIT_FREQUENCIES
+    GROUP_FREQUENCIES = {
+        "weekdays": Frequency.WEEKLY,
+        "week": Frequency.WEEKLY,
+        "week_days": Frequency.WEEKLY,
+        "interval_days": Frequency.WEEKLY,
+        "monthly": Frequency.MONTHLY,
+        "yearly": Frequency.YEARLY,
+        "daily": Frequency.DAILY,
+    }
+    # Nhánh có thể kèm buổi -> nhóm chứa buổi
+    PERIOD_GROUPS = {"weekdays": "period", "week": "period", "week_days": "period", "daily": "daily_period"}
+    # Số cụm danh sách thứ được nhớ kết quả
+    WEEKDAY_CACHE_MAX = 1024
+    # Khi câu có nhiều cụm tần suất khác loại, loại đứng trước thắng
+    PRIORITY = (Frequency.WEEKLY, Frequency.MONTHLY, Frequency.YEARLY, Frequency.DAILY)
 
     def __init__(self):
         """Khởi tạo parser và compile regex patterns."""
-        self.patterns = self._build_patterns()
+        self.scan_pattern = self._build_scan_pattern(self._get_quantifier_pattern())
+        self.mention_pattern = self._build_scan_pattern(self.MENTION_QUANTIFIER_WORDS)
+        self.weekday_item_pattern = re.compile(
+            r"(?:thứ\s*)?([2-7]|hai|ba|tư|năm|sáu|bảy|bẩy)\b|chủ\s*nhật|c\.?n",
+            re.IGNORECASE,
+        )
+        self._weekday_cache: Dict[str, Tuple[int, ...]] = {}
     # =========================================================================
     # PATTERN BUILDING
     # =========================================================================
-    def _build_patterns(self) -> List[Tuple[Frequency, re.Pattern]]:
-        """Xây dựng và trả về danh sách các pattern regex cho từng tần suất."""
-        return [
-            (Frequency.WEEKLY, self._build_weekly_pattern()),
-            (Frequency.MONTHLY, self._build_monthly_pattern()),
-            (Frequency.YEARLY, self._build_yearly_pattern()),
-            (Frequency.DAILY, self._build_daily_pattern()),
-        ]
     def _get_quantifier_pattern(self) -> str:
         """Trả về pattern regex cho từ chỉ tần suất (mỗi/mọi/hàng)."""
         excluded = "".join(self.EXCLUDED_PHRASES_BEFORE_HANG)
         return f"(?:{self.QUANTIFIER_WORDS}|{excluded}hàng)"
-    
-    def _build_weekly_pattern(self) -> re.Pattern:
-        """Pattern: mỗi [buổi] [thứ/chủ nhật/tuần]."""
-        quantifier = self._get_quantifier_pattern()
-        time_period_group = f"(?:{self.TIME_PERIODS}\\s+)?"
-        weekday_keywords = r"(?:tuần|thứ\s*[2-7]|chủ\s*nhật|c\.?n|t[2-7])"
-        
-        pattern = f"\\b{quantifier}\\s+{time_period_group}{weekday_keywords}\\b"
-        return re.compile(pattern, re.IGNORECASE)
-    
-    def _build_monthly_pattern(self) -> re.Pattern:
-        """Pattern: mỗi/mọi tháng."""
-        quantifier = self._get_quantifier_pattern()
-        pattern = f"\\b{quantifier}\\s+(?:tháng)\\b"
-        return re.compile(pattern, re.IGNORECASE)
-    
-    def _build_yearly_pattern(self) -> re.Pattern:
-        """Pattern: mỗi/mọi năm."""
-        quantifier = self._get_quantifier_pattern()
-        pattern = f"\\b{quantifier}\\s+(?:năm)\\b"
-        return re.compile(pattern, re.IGNORECASE)
-    
-    def _build_daily_pattern(self) -> re.Pattern:
-        """Pattern: mỗi [buổi/ngày]."""
-        quantifier = self._get_quantifier_pattern()
-        pattern = f"\\b{quantifier}\\s+(?:ngày|{self.TIME_PERIODS})\\b"
+
+    def _build_scan_pattern(self, quantifier: str) -> re.Pattern:
+        """Một pattern cho mọi cụm tần suất, các nhánh thử theo thứ tự:
+
+        - weekly: mỗi [buổi] thứ 2 và thứ 4 / mỗi [buổi] tuần [vào thứ 2]
+        - có khoảng lặp: mỗi 2 ngày / tuần [vào thứ 3] / tháng / năm
+        - monthly: mỗi tháng; yearly: mỗi năm
+        - daily: mỗi ngày / mỗi [buổi]
+        """
+        weekdays = f"{self.WEEKDAY}{self.WEEKDAY_MORE.format(weekday=self.WEEKDAY)}*"
+        period = self.TIME_PERIODS
+        pattern = (
+            rf"\b{quantifier}\s+(?:"
+            rf"(?:(?P<period>{period})\s+)?(?:(?P<weekdays>{weekdays})"
+            rf"|(?P<week>tuần)(?:\s+(?:vào\s+)?(?P<week_days>{weekdays}))?)"
+            rf"|(?P<interval>[1-9]\d?)\s+(?P<unit>ngày|tuần|tháng|năm)"
+            rf"(?:(?<=tuần)\s+(?:vào\s+)?(?P<interval_days>{weekdays}))?"
+            rf"|(?P<monthly>tháng)"
+            rf"|(?P<yearly>năm)"
+            rf"|(?P<daily>ngày|(?P<daily_period>{period}))"
+            rf")\b"
+        )
         return re.compile(pattern, re.IGNORECASE)
-    
+
     # =========================================================================
     # MAIN PARSING
     # =========================================================================
     
     def parse(self, text: str) -> Dict[str, Any]:
 
-        frequency, clean_text = self._extract_frequency_and_clean(text)
+        rule, clean_text = self._extract_frequency_and_clean(text)
         
         return {
-            "is_habit": frequency is not None,
-            "frequency": frequency.value if frequency else None,
+            "is_habit": rule is not None,
+            "frequency": rule.frequency.value if rule else None,
+            "recurrence": rule,
             "remaining_text": clean_text
         }
     
-    def _extract_frequency_and_clean(self, text: str) -> Tuple[Optional[Frequency], str]:
-        """Trích xuất tần suất thói quen và trả về text đã làm sạch."""
-        for frequency, pattern in self.patterns:
-            if pattern.search(text):
-                # Xóa pattern match khỏi text
-                clean_text = pattern.sub(" ", text)
-                # Làm sạch khoảng trắng thừa
-                clean_text = self._clean_whitespace(clean_text)
-                return frequency, clean_text
-        
-        return None, text
+    def _extract_frequency_and_clean(self, text: str) -> Tuple[Optional[RecurrenceRule], str]:
+        """Trích xuất luật lặp của thói quen và trả về text đã bỏ các cụm tần suất (một lượt quét)."""
+        matches = list(self.scan_pattern.finditer(text))
+        if not matches:
+            return None, text
+
+        # Nhóm đóng sau cùng cho biết nhánh nào đã khớp
+        kinds = [self._match_frequency(m) for m in matches]
+        frequency = kinds[0] if len(kinds) == 1 else min(kinds, key=self.PRIORITY.index)
+        interval = 1
+        weekdays = set()
+        period = None
+        parts = []
+        pos = 0
+        for m, kind in zip(matches, kinds):
+            # Buổi lấy từ bất kỳ cụm nào ("chạy bộ mỗi sáng hàng tuần")
+            if period is None and m.lastgroup in self.PERIOD_GROUPS:
+                period = m.group(self.PERIOD_GROUPS[m.lastgroup])
+                if period is not None:
+                    period = period.lower()
+            if kind is not frequency:
+                continue
+            if m.lastgroup in ("unit", "interval_days") and interval == 1:
+                interval = int(m.group("interval"))
+            if m.lastgroup in ("weekdays", "week_days", "interval_days"):
+                weekdays.update(self._parse_weekdays(m.group(m.lastgroup)))
+            # Xóa cụm tần suất khỏi text (chỉ các cụm cùng loại đã chọn)
+            parts.append(text[pos:m.start()])
+            pos = m.end()
+        parts.append(text[pos:])
+
+        rule = RecurrenceRule(frequency, interval, tuple(sorted(weekdays)), period)
+        return rule, self._clean_whitespace(" ".join(parts))
+
+    def _match_frequency(self, match: re.Match) -> Frequency:
+        group = match.lastgroup
+        if group == "unit":
+            return self.UNIT_FREQUENCIES[match.group("unit").lower()]
+        return self.GROUP_FREQUENCIES[group]
+
+    def _parse_weekdays(self, text: str) -> Tuple[int, ...]:
+        """Các thứ trong cụm "thứ 3 và t5" -> (1, 3) (datetime.weekday())."""
+        key = text.lower()
+        days = self._weekday_cache.get(key)
+        if days is None:
+            days = tuple(
+                self.SUNDAY if m.group(1) is None else int(self.WEEKDAY_NUMBERS.get(m.group(1), m.group(1))) - 2
+                for m in self.weekday_item_pattern.finditer(key)
+            )
+            if len(self._weekday_cache) >= self.WEEKDAY_CACHE_MAX:
+                self._weekday_cache.clear()
+            self._weekday_cache[key] = days
+        return days
     
+    def find_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Vị trí (start, end) các cụm chỉ tần suất trong text."""
+        return [m.span() for m in self.mention_pattern.finditer(text)]
+
     @staticmethod
     def _clean_whitespace(text: str) -> str:
         """Làm sạch khoảng trắng thừa trong chuỗi."""
-        return re.sub(r'\s+', ' ', text).strip()
+        return " ".join(text.split())
 # =========================================================================
 # TESTING
 # =========================================================================
@@ -119,12 +249,16 @@ def run_tests():
         # --- Weekly cases ---
         ("họp team hàng tuần", "weekly", "họp team"),
         ("đi nhà thờ mỗi chủ nhật", "weekly", "đi nhà thờ"),
-        ("học tiếng anh mỗi t3 và t5", "weekly", "học tiếng anh và t5"),
+        ("học tiếng anh mỗi t3 và t5", "weekly", "học tiếng anh"),
+        ("tập gym mỗi thứ hai và thứ tư", "weekly", "tập gym"),
+        ("họp hàng tuần vào thứ 2", "weekly", "họp"),
+        ("họp mỗi 2 tuần vào thứ 3", "weekly", "họp"),
         
         # --- Daily cases ---
         ("chạy bộ mỗi sáng", "daily", "chạy bộ"),
         ("uống thuốc mỗi ngày", "daily", "uống thuốc"),
         ("đọc sách hàng đêm", "daily", "đọc sách"),
+        ("tưới cây mỗi 3 ngày", "daily", "tưới cây"),
         
         # --- Monthly cases ---
         ("trả tiền nhà mỗi tháng", "monthly", "trả tiền nhà"),
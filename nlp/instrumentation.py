@@ -0,0 +1,128 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Các bước của NLPEngine.process_command theo thứ tự chạy; "total" là cả lời gọi (kể cả cache hit)
+STAGES = ("preprocess", "segment", "habit", "location", "time", "event_name")
+TOTAL = "total"
+
+
+class RollingHistogram:
+    """Thời gian (ms) của window lần đo gần nhất; phân vị tính khi đọc nên ghi chỉ là một append."""
+
+    __slots__ = ("samples", "count")
+
+    def __init__(self, window: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=window)
+        # Tổng số lần đo từ đầu (kể cả các lần đã trôi khỏi cửa sổ)
+        self.count = 0
+
+    def add(self, ms: float) -> None:
+        self.samples.append(ms)
+        self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": self.count, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+        def percentile(p: float) -> float:
+            return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+        return {
+            "count": self.count,
+            "mean": sum(ordered) / len(ordered),
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+            "max": ordered[-1],
+        }
+
+
+class Trace:
+    """Thời gian từng bước của một lần gọi process_command."""
+
+    __slots__ = ("text", "started_at", "cache_hit", "stages", "total_ms", "_start", "_last")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.started_at = time.time()
+        self.cache_hit = False
+        self.stages: Dict[str, float] = {}
+        self.total_ms = 0.0
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """Kết thúc bước stage: ghi thời gian từ lần lap trước (hoặc từ lúc bắt đầu)."""
+        now = time.perf_counter()
+        self.stages[stage] = (now - self._last) * 1000
+        self._last = now
+
+    def stop(self) -> None:
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "started_at": self.started_at,
+            "cache_hit": self.cache_hit,
+            **self.stages,
+            TOTAL: self.total_ms,
+        }
+
+
+class PipelineInstrumentation:
+    """Đo thời gian từng bước của pipeline NLP (bật tùy chọn, xem NLPEngine.enable_instrumentation).
+
+    Mỗi bước có một RollingHistogram (p50/p95/p99 trên window lần gọi gần nhất), cùng trace_size
+    trace gần nhất để xem câu lệnh nào chậm ở bước nào. An toàn khi nhiều luồng cùng ghi.
+    """
+
+    def __init__(self, window: int = 1000, trace_size: int = 50):
+        self.window = window
+        self._histograms: Dict[str, RollingHistogram] = {}
+        self._traces: Deque[Trace] = deque(maxlen=trace_size)
+        self._lock = threading.Lock()
+
+    def start(self, text: str) -> Trace:
+        return Trace(text)
+
+    def finish(self, trace: Trace) -> None:
+        trace.stop()
+        with self._lock:
+            for stage, ms in [*trace.stages.items(), (TOTAL, trace.total_ms)]:
+                histogram = self._histograms.get(stage)
+                if histogram is None:
+                    histogram = self._histograms[stage] = RollingHistogram(self.window)
+                histogram.add(ms)
+            self._traces.append(trace)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{bước: {count, mean, p50, p95, p99, max}} (ms), theo thứ tự pipeline, "total" cuối cùng."""
+        with self._lock:
+            order = [s for s in STAGES if s in self._histograms]
+            order += [s for s in self._histograms if s not in STAGES and s != TOTAL]
+            if TOTAL in self._histograms:
+                order.append(TOTAL)
+            return {stage: self._histograms[stage].summary() for stage in order}
+
+    def traces(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Các trace gần nhất, mới nhất trước."""
+        with self._lock:
+            recent = list(self._traces)[::-1]
+        return [t.to_dict() for t in recent[:limit]]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._traces.clear()
+
+    def report(self) -> str:
+        """Bảng thống kê dạng văn bản (in ra console)."""
+        lines = [f"{'Bước':<12} | {'số lần':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'max ms':>8}"]
+        lines.append("-" * len(lines[0]))
+        for stage, s in self.stats().items():
+            lines.append(f"{stage:<12} | {s['count']:>7} | {s['p50']:>8.2f} | {s['p95']:>8.2f} | {s['p99']:>8.2f} | {s['max']:>8.2f}")
+        return "\n".join(lines)
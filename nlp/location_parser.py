@@ -1,16 +1,111 @@
 import json
 import os
 import re
-from typing import List, Optional, Set
+import threading
+from bisect import bisect_left
+from typing import Dict, FrozenSet, List, Optional, Tuple, Union
+
+try:
+    from data_watcher import FileWatcher
+    from fuzzy_gazetteer import FuzzyGazetteer
+    from gazetteer import CompactGazetteer, Gazetteer
+except ImportError:
+    from nlp.data_watcher import FileWatcher
+    from nlp.fuzzy_gazetteer import FuzzyGazetteer
+    from nlp.gazetteer import CompactGazetteer, Gazetteer
+
+
+# Câu mẫu cho `python nlp/location_parser.py` và benchmark.py
+EXAMPLES = [
+    "thuê nhà ở ngõ 123 phố Huế",
+    "tập gym ở phòng tập thể hình",
+    "đi siêu thị lúc 9 giờ tối",
+    "ghé 539/2/9 bình thới",
+    "Đi bơi ở hồ bơi lam sơn",
+    "Gửi xe ở bãi giữ xe rạp phim",
+    "ăn uống tại quán phở 24/7",
+    "học bài ở nhà bạn",
+    "làm việc ở công ty ABC",
+    "tắm rửa ở nhà",
+    "đi chơi ở công viên 9/10",
+    "đi khám bệnh viện đa khoa",
+    "đi đá bóng ở sân tập thể thao",
+    "đi xem phim ở rạp chiếu bóng",
+    "Sáng mai 8h đưa con đi học ở trường tiểu học",
+    "Đá banh vào ngày tại sân huỳnh đức",
+    "bay vào sai gon ngày mai",
+    "đi bệnh vien cho ray khám lúc 8h",
+]
+
+# Các từ thời gian làm một cụm không còn là địa điểm
+TIME_WORDS = (
+    "hôm nay", "ngày mai", "mốt", "tuần", "tháng", "năm", "sáng",
+    "trưa", "chiều", "tối", "đêm", "khuya", "thứ", "chủ nhật", "cn",
+)
+
+# Động từ / "phim", "ảnh", "hình" được giữ lại trong tên địa điểm khi đi sau từ này ("hồ bơi", "rạp phim")
+VALID_PAIRS: FrozenSet[Tuple[str, str]] = frozenset({
+    ("bãi", "gửi"), ("bãi", "giữ"), ("hồ", "bơi"),
+    ("vui", "chơi"), ("phòng", "tập"), ("sân", "tập"),
+    ("trung tâm", "tập"), ("khu", "tập"), ("sân", "đá"),
+    ("bãi", "đá"), ("rạp", "phim"), ("coi", "phim"),
+    ("xem", "phim"), ("chụp", "ảnh"), ("studio", "ảnh"),
+    ("chụp", "hình"), ("studio", "hình"), ("thể", "hình"),
+    ("truyền", "hình"), ("màn", "hình"),
+    ("quán", "ăn"), ("nhà", "hàng"), ("sân", "bóng"),
+    ("sân", "vận"), ("sân", "bay"), ("sân", "khấu"),
+    ("cửa", "hàng"), ("điểm", "hẹn"), ("nơi", "ở"),
+})
+MEDIA_WORDS: FrozenSet[str] = frozenset({"phim", "ảnh", "hình"})
+
+# Từ thời gian kết thúc một ứng viên ("ở nhà bạn lúc 8h" -> "nhà bạn")
+STOP_WORDS = ("lúc", "vào", "ngày", "hôm", "sáng", "trưa", "chiều", "tối", "đêm", "mai", "mốt", "mỗi", "hàng", "mọi", "hằng")
+
+
+class _ScanPatterns:
+    """Các regex của bộ quét ứng viên cho một bộ cờ."""
+
+    __slots__ = ("prep_head", "noun_head", "noun_heads", "stop_word", "stop")
+
+    def __init__(self, preps: str, nouns: List[str], flags: int):
+        self.prep_head = re.compile(preps + r"(\s+)", flags)
+        self.noun_head = re.compile(r"(?:" + "|".join(nouns) + r")(\s+)", flags)
+        self.noun_heads = [re.compile(re.escape(noun) + r"(\s+)", flags) for noun in nouns]
+        self.stop_word = re.compile(r"(?:" + "|".join(STOP_WORDS) + r")", flags)
+        self.stop = re.compile(r"\s+(?:" + "|".join(STOP_WORDS) + r")|[.,?!]", flags)
+
+
+POST_CLEAN_PATTERNS = [
+    re.compile(r'^(địa chỉ|vị trí|nơi|nhà|quê)\s+(là|của|nằm|tại|ở)\s+', re.IGNORECASE),
+    re.compile(r'^(là|của|nằm|tại|ở)\s+', re.IGNORECASE),
+    re.compile(r'^(cái|ngôi|chiếc)\s+', re.IGNORECASE),
+]
 
 
 class LocationParser:
     """Trích xuất địa điểm từ câu tiếng Việt."""
     
-    def __init__(self):
-        self.locations_db = self._load_locations()
+    def __init__(self, auto_reload: bool = True, reload_interval: float = 2.0):
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.data_path = os.path.join(base_dir, "data", "locations.json")
+        # File gọn dựng bởi `python nlp/gazetteer.py` (hoặc setup_data.py), ưu tiên khi không cũ hơn locations.json
+        self.compact_path = os.path.join(base_dir, "data", "locations.gaz")
+        self.gazetteer: Union[Gazetteer, CompactGazetteer]
+        self.gazetteer, self.locations_db = self._load_gazetteer() or (Gazetteer([]), [])
+        # Chỉ mục khớp mờ (không dấu / gõ sai) kèm version của danh sách mà nó được dựng từ
+        self._fuzzy: Optional[Tuple[int, FuzzyGazetteer]] = None
+        self._fuzzy_ready = threading.Event()
+
+        # Tăng mỗi lần nạp lại locations.json (NLPEngine dùng để bỏ các kết quả cache cũ)
+        self.version = 0
+        # Mỗi lúc chỉ một lượt nạp lại (ở luồng nền hoặc force=True)
+        self._reload_lock = threading.Lock()
+        self._start_fuzzy_build()
+        self.watcher: Optional[FileWatcher] = (
+            FileWatcher([self.data_path, self.compact_path], reload_interval) if auto_reload else None
+        )
         
-        self.stop_verbs: Set[str] = {
+        self.stop_verbs: FrozenSet[str] = frozenset({
             "mua", "bán", "thuê", "ăn", "uống", "chơi", "ngủ", "nghỉ",
             "tắm", "vệ", "làm", "kiếm", "quẩy", "đi", "đá", "tập",
             "xem", "sửa", "khám", "chữa", "tuyển", "thăm", "đón", "rước",
@@ -20,9 +115,9 @@ class LocationParser:
             "hò", "đánh", "tìm", "cất", "la", "mắng", "chửi", "vào", "ra",
             "lên", "xuống", "biết", "hiểu", "dám", "thèm", "ưa", "ngán",
             "nhớ", "quên", "gửi", "bơi", "giữ",
-        }
+        })
         
-        self.black_list: Set[str] = {
+        self.black_list: FrozenSet[str] = frozenset({
             "ngủ thôi", "chơi nhé", "nghỉ ngơi", "vệ sinh", "làm việc",
             "học bài", "tắm rửa", "kiếm tiền", "đâu đó", "đâu", "nhé",
             "nha", "thôi", "luôn", "rồi", "ngay", "mạng", "lòng", "vẻ",
@@ -32,8 +127,16 @@ class LocationParser:
             "chiều", "tối", "đêm", "khuya", "hôm nay", "ngày mai", "mốt",
             "tuần", "tháng", "năm", "thứ 2", "thứ 3", "thứ 4", "thứ 5",
             "thứ 6", "thứ 7", "chủ nhật", "cn",
-            
-        }
+        })
+
+        # Mọi luật của _is_invalid gộp thành một alternation: giờ ("9h", "30 phút"), ngày ("thứ 2"),
+        # từ thời gian và black_list (dài trước để re thử cụm dài trước)
+        words = sorted(set(TIME_WORDS) | self.black_list, key=len, reverse=True)
+        self.invalid_pattern = re.compile(
+            r"\d+\s*(?:h|g|:|p|phút|giây|tiếng|am|pm)\b"
+            r"|(?:ngày|tháng|năm|thứ)\s*\d+"
+            r"|\b(?:" + "|".join(re.escape(w) for w in words) + r")\b"
+        )
         
         self.prep_pattern = re.compile(
             r"(?:tại|ở|đến|về|ghé|ra|trong|trên|tới|lên|xuống|vào)",
@@ -52,59 +155,112 @@ class LocationParser:
             r"(?:" + "|".join(noun_list) + r")",
             re.IGNORECASE
         )
+
+        # Bộ quét ứng viên (_scan_candidates). Quét trên text.lower() không cờ IGNORECASE để re bỏ qua nhanh các vị trí
+        # không thể bắt đầu bằng ký tự đầu của alternation; bản IGNORECASE chỉ dùng khi lower() đổi độ dài chuỗi
+        self.scanners = {
+            flags: _ScanPatterns(self.prep_pattern.pattern, noun_list, flags) for flags in (0, re.IGNORECASE)
+        }
         
         self.time_cut_markers = [
             " lúc ", " vào ", " trong ", " ngày ", " hôm ", " sáng ", " trưa ",
             " chiều ", " tối ", " mai ", " mốt ", " tuần ", " tháng ", " năm ",
             " thứ ", " cn "," mỗi ", " mọi ", " hằng "
         ]
+        # Vị trí sớm nhất của mọi marker trong một lần search (thay cho mỗi marker hai lần str.find)
+        self.time_cut_pattern = re.compile("|".join(re.escape(m) for m in self.time_cut_markers))
     
-    def _load_locations(self) -> List[str]:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        data_path = os.path.join(base_dir, "data", "locations.json")
-        
-        if not os.path.exists(data_path):
-            return []
+    def _read_locations(self) -> Optional[List[str]]:
+        """Đọc locations.json thành danh sách phẳng, dài trước. None nếu không đọc được."""
+        if not os.path.exists(self.data_path):
+            return None
         
         try:
-            with open(data_path, "r", encoding="utf-8") as f:
+            with open(self.data_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
                 locations = [loc for group in data.values() for loc in group]
                 return sorted(locations, key=len, reverse=True)
         except Exception:
-            return []
+            return None
+
+    def _compact_is_fresh(self) -> bool:
+        try:
+            compact_mtime = os.path.getmtime(self.compact_path)
+        except OSError:
+            return False
+        try:
+            return compact_mtime >= os.path.getmtime(self.data_path)
+        except OSError:
+            return True
+
+    def _load_gazetteer(self) -> Optional[Tuple[Union[Gazetteer, CompactGazetteer], List[str]]]:
+        """(gazetteer, locations_db): mmap locations.gaz nếu còn mới (locations_db rỗng), không thì dựng trie từ locations.json."""
+        if self._compact_is_fresh():
+            try:
+                return CompactGazetteer(self.compact_path), []
+            except (OSError, ValueError) as e:
+                print(f"❌ Error loading locations.gaz: {e}")
+        locations = self._read_locations()
+        if locations is None:
+            return None
+        # Trie theo từ thay cho mỗi địa điểm một lần re.search
+        return Gazetteer(locations), locations
+
+    def _reload_gazetteer(self) -> Optional[Tuple[Union[Gazetteer, CompactGazetteer], List[str]]]:
+        """Như _load_gazetteer, nhưng khi vẫn đọc locations.json thì chỉ sửa các nhánh trie của địa điểm thêm / bỏ."""
+        gazetteer = self.gazetteer
+        if not isinstance(gazetteer, Gazetteer) or self._compact_is_fresh():
+            return self._load_gazetteer()
+        locations = self._read_locations()
+        if locations is None:
+            return None
+        old = {place.lower() for place in self.locations_db}
+        new = {place.lower() for place in locations}
+        gazetteer.update(
+            [place for place in locations if place.lower() not in old],
+            [place for place in self.locations_db if place.lower() not in new],
+            order=locations,
+        )
+        return gazetteer, locations
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Nạp lại locations.json / locations.gaz nếu file bị sửa. True nếu đã nạp lại xong trong lời gọi này.
+
+        Mặc định việc nạp chạy ở luồng nền (đọc JSON + cập nhật trie mất cỡ giây với hàng trăm nghìn địa điểm):
+        lời gọi trả về ngay, các câu tới vẫn dùng danh sách cũ cho tới khi `version` tăng.
+        force=True nạp ngay trong lời gọi.
+        """
+        if self.watcher is None or not self.watcher.changed(force):
+            return False
+        if force:
+            return self._reload()
+        threading.Thread(target=self._reload, name="locations-reload", daemon=True).start()
+        return False
+
+    def _reload(self) -> bool:
+        with self._reload_lock:
+            loaded = self._reload_gazetteer()
+            if loaded is None:
+                # File đang ghi dở hoặc lỗi cú pháp: giữ nguyên danh sách đang chạy
+                return False
+            # Trie mới (hoặc bản cập nhật chép-khi-sửa) được thay cả bộ: các lượt extract() đang chạy vẫn dùng trie cũ đến hết
+            self.gazetteer, self.locations_db = loaded
+            self.version += 1
+            self._start_fuzzy_build()
+        source = "locations.gaz" if isinstance(self.gazetteer, CompactGazetteer) else "locations.json"
+        print(f"🔄 Reloaded {source}: {len(self.gazetteer)} locations")
+        return True
     
     def _is_invalid(self, text: str) -> bool:
         text = text.lower().strip()
-        
-        if re.search(r'\d+\s*(?:h|g|:|p|phút|giây|tiếng|am|pm)\b', text):
-            return True
-        
-        if re.search(r'(?:ngày|tháng|năm|thứ)\s*\d+', text):
-            return True
-        
-        time_words = [
-            "hôm nay", "ngày mai", "mốt", "tuần", "tháng", "năm", "sáng",
-            "trưa", "chiều", "tối", "đêm", "khuya", "thứ", "chủ nhật", "cn"
-        ]
-        if any(re.search(r'\b' + re.escape(w) + r'\b', text) for w in time_words):
-            return True
-        
         if len(text) < 2 or text.isdigit():
             return True
-        
-        if any(re.search(r'\b' + re.escape(b) + r'\b', text) for b in self.black_list):
-            return True
-        
-        return False
+        return self.invalid_pattern.search(text) is not None
     
     def _cut_time_tail(self, text: str) -> str:
         lower = " " + text.lower() + " "
-        cut_pos = min(
-            (lower.find(mark) for mark in self.time_cut_markers if lower.find(mark) != -1),
-            default=None
-        )
-        return text[:cut_pos].strip() if cut_pos is not None else text
+        match = self.time_cut_pattern.search(lower)
+        return text[:match.start()].strip() if match else text
     
     def _clean_extracted_text(self, text: str) -> str:
         words = text.split()
@@ -114,23 +270,10 @@ class LocationParser:
             lower = word.lower()
             prev = words[i - 1].lower() if i > 0 else ""
             
-            if lower in self.stop_verbs or lower in ["phim", "ảnh", "hình"]:
+            if lower in self.stop_verbs or lower in MEDIA_WORDS:
                 allow = False
                 
-                valid_pairs = {
-                    ("bãi", "gửi"), ("bãi", "giữ"), ("hồ", "bơi"),
-                    ("vui", "chơi"), ("phòng", "tập"), ("sân", "tập"),
-                    ("trung tâm", "tập"), ("khu", "tập"), ("sân", "đá"),
-                    ("bãi", "đá"), ("rạp", "phim"), ("coi", "phim"),
-                    ("xem", "phim"), ("chụp", "ảnh"), ("studio", "ảnh"),
-                    ("chụp", "hình"), ("studio", "hình"), ("thể", "hình"),
-                    ("truyền", "hình"), ("màn", "hình"),
-                    ("quán", "ăn"), ("nhà", "hàng"), ("sân", "bóng"), 
-                    ("sân", "vận"), ("sân", "bay"), ("sân", "khấu"),
-                    ("cửa", "hàng"), ("điểm", "hẹn"), ("nơi", "ở")
-                }
-                
-                if (prev, lower) in valid_pairs:
+                if (prev, lower) in VALID_PAIRS:
                     allow = True
                 
                 if word[0].isupper() and i > 0:
@@ -144,63 +287,187 @@ class LocationParser:
         return " ".join(result).strip()
     
     def _post_process_clean(self, text: str) -> str:
-        patterns = [
-            r'^(địa chỉ|vị trí|nơi|nhà|quê)\s+(là|của|nằm|tại|ở)\s+',
-            r'^(là|của|nằm|tại|ở)\s+',
-            r'^(cái|ngôi|chiếc)\s+'
-        ]
-        for p in patterns:
-            text = re.sub(p, '', text, flags=re.IGNORECASE)
+        for pattern in POST_CLEAN_PATTERNS:
+            text = pattern.sub('', text)
         return text.strip()
     
     def extract(self, text: str) -> Optional[str]:
+        return self._extract(text)[0]
+
+    def _start_fuzzy_build(self) -> None:
+        """Dựng chỉ mục khớp mờ cho danh sách hiện tại ở luồng nền.
+
+        Dựng chỉ mục phải giải mã mọi địa điểm (cả file .gaz): cỡ giây với hàng trăm nghìn địa điểm,
+        không được để rơi vào lượt extract() của một câu lệnh.
+        """
+        ready = self._fuzzy_ready = threading.Event()
+        threading.Thread(
+            target=self._build_fuzzy, args=(self.gazetteer, self.version, ready), name="fuzzy-gazetteer", daemon=True
+        ).start()
+
+    def _build_fuzzy(self, gazetteer: Union[Gazetteer, CompactGazetteer], version: int, ready: threading.Event) -> None:
+        try:
+            fuzzy = FuzzyGazetteer(gazetteer)
+            # Danh sách đã được nạp lại trong lúc dựng: bỏ, luồng của lần nạp sau sẽ dựng bản mới
+            if version == self.version:
+                self._fuzzy = (version, fuzzy)
+        except Exception as e:
+            print(f"❌ Error building fuzzy gazetteer: {e}")
+        finally:
+            ready.set()
+
+    def is_ready(self) -> bool:
+        """Chỉ mục khớp mờ của danh sách hiện tại đã dựng xong."""
+        return self.fuzzy_gazetteer() is not None
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Chờ chỉ mục khớp mờ dựng xong. Trả về True nếu đã sẵn sàng."""
+        self._fuzzy_ready.wait(timeout)
+        return self.is_ready()
+
+    def fuzzy_gazetteer(self) -> Optional[FuzzyGazetteer]:
+        """Chỉ mục khớp mờ trên danh sách địa điểm hiện tại; None khi luồng nền chưa dựng xong."""
+        entry = self._fuzzy
+        if entry is None or entry[0] != self.version:
+            return None
+        return entry[1]
+
+    def find_spans(self, text: str, location: str) -> List[Tuple[int, int]]:
+        """Vị trí (start, end) mọi lần xuất hiện của location trong text (không phân biệt hoa thường)."""
+        words = location.split()
+        if not words:
+            return []
+        pattern = r"\b" + r"\s+".join(re.escape(w) for w in words) + r"\b"
+        return [m.span() for m in re.finditer(pattern, text, re.IGNORECASE)]
+
+    def extract_with_spans(self, text: str) -> Tuple[Optional[str], List[Tuple[int, int]]]:
+        """Như extract, kèm vị trí của địa điểm trong text để bên gọi không phải tìm lại."""
+        location, span = self._extract(text)
+        if location is None:
+            return None, []
+        if span is not None:
+            return location, [span]
+        return location, self.find_spans(text, location)
+
+    def _validate(self, raw: str) -> Optional[str]:
+        """Cắt đuôi thời gian và dọn một ứng viên; None nếu không còn là địa điểm."""
+        loc = self._cut_time_tail(raw)
+        loc = self._clean_extracted_text(loc)
+        loc = self._post_process_clean(loc)
+        loc = loc.strip(" .,?!")
+        if loc and not self._is_invalid(loc):
+            return loc
+        return None
+
+    def _candidates(self, text: str) -> Tuple[List[str], Dict[str, Tuple[str, Tuple[int, int]]]]:
+        """Các ứng viên thô (chưa cắt / dọn), kèm bảng khớp mờ: chữ người dùng gõ / tên chuẩn -> (tên chuẩn, vị trí)."""
         text_lower = text.lower()
-        candidates = []
-        
-        for place in self.locations_db:
-            if re.search(r'\b' + re.escape(place) + r'\b', text_lower):
+        candidates = self.gazetteer.find(text_lower)
+        fuzzy: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+        fuzzy_gazetteer = self.fuzzy_gazetteer() if not candidates else None
+        if fuzzy_gazetteer is not None:
+            # Không khớp đúng địa điểm nào: thử khớp không dấu / gõ sai ("sai gon" -> "sài gòn").
+            # Chỉ mục chưa dựng xong (vừa khởi động / vừa nạp lại) thì bỏ qua bước này
+            for place, _, start, end in fuzzy_gazetteer.find(text_lower):
+                if place in fuzzy:
+                    continue
+                fuzzy[place] = (place, (start, end))
+                fuzzy.setdefault(text_lower[start:end], fuzzy[place])
                 candidates.append(place)
-        time_stoppers = r"(?:\s+(?:lúc|vào|ngày|hôm|sáng|trưa|chiều|tối|đêm|mai|mốt|mỗi|hàng|mọi|hằng)|$|[.,?!])"
-        candidates += re.findall(f"{self.prep_pattern.pattern}\s+(.*?){time_stoppers}", text, re.IGNORECASE)
-        candidates += re.findall(f"(?:^|\s)({self.noun_pattern.pattern}\s+.*?){time_stoppers}", text, re.IGNORECASE)
-        valid = []
-        for raw in candidates:
-            loc = self._cut_time_tail(raw)
-            loc = self._clean_extracted_text(loc)
-            loc = self._post_process_clean(loc)
-            loc = loc.strip(" .,?!")
-            
-            if loc and not self._is_invalid(loc):
-                valid.append(loc)
-        
-        return max(valid, key=len) if valid else None
+        candidates += self._scan_candidates(text, text_lower)
+        return candidates, fuzzy
+
+    @staticmethod
+    def _stop_table(text: str, patterns: _ScanPatterns) -> Tuple[List[int], Dict[int, int], List[int]]:
+        """Các vị trí kết thúc ứng viên (tăng dần) và nơi phần khớp kết thúc, cùng các dấu xuống dòng chặn ứng viên.
+
+        Kết thúc tại: đầu một khoảng trắng đứng trước từ thời gian, dấu [.,?!], cuối chuỗi (kể cả trước "\\n" cuối).
+        """
+        ends = {m.start(): m.end() for m in patterns.stop.finditer(text)}
+        n = len(text)
+        ends[n] = n
+        if text.endswith("\n"):
+            ends[n - 1] = n - 1
+        blocks = [m.start() for m in re.finditer(r"\n", text) if m.start() not in ends]
+        return sorted(ends), ends, blocks
+
+    def _scan_candidates(self, text: str, text_lower: Optional[str] = None) -> List[str]:
+        """Ứng viên sau giới từ ("ở X") rồi ứng viên bắt đầu bằng danh từ ("quán X"), kết thúc ở từ thời gian / dấu câu.
+
+        Cùng kết quả với re.findall(r"giới_từ\\s+(.*?)(?:\\s+từ_thời_gian|$|[.,?!])") (và bản danh từ) nhưng tuyến tính:
+        mỗi vị trí bắt đầu tra điểm kết thúc bằng bisect trong bảng tính một lần, thay vì quét lại tới dấu xuống dòng.
+        """
+        if text_lower is None:
+            text_lower = text.lower()
+        if len(text_lower) == len(text):
+            scan, patterns = text_lower, self.scanners[0]
+        else:
+            scan, patterns = text, self.scanners[re.IGNORECASE]
+        stops, stop_ends, blocks = self._stop_table(scan, patterns)
+
+        def end_after(head_end: int, body: int) -> Optional[Tuple[int, int]]:
+            """(cuối ứng viên, cuối phần khớp) cho ứng viên bắt đầu sau khoảng trắng [head_end, body)."""
+            stop = stops[bisect_left(stops, body)]
+            i = bisect_left(blocks, body)
+            if i == len(blocks) or stop < blocks[i]:
+                return stop, stop_ends[stop]
+            # Không tới được điểm kết thúc (xuống dòng): regex trả bớt khoảng trắng, chỉ khớp được nếu từ thời gian đứng ngay sau
+            word = patterns.stop_word.match(scan, body) if body - head_end >= 2 else None
+            return (body - 1, word.end()) if word else None
+
+        found = []
+        # Như findall: sau một ứng viên tìm tiếp từ cuối phần khớp; ứng viên hỏng thì thử vị trí kế tiếp
+        pos = 0
+        head = patterns.prep_head.search(scan, pos)
+        while head is not None:
+            end = end_after(head.start(1), head.end())
+            if end is not None:
+                found.append(text[head.end():end[0]])
+                pos = end[1]
+            else:
+                pos = head.start() + 1
+            head = patterns.prep_head.search(scan, pos)
+
+        # (?:^|\s) trước danh từ: bắt đầu ở đầu chuỗi, hoặc sau một khoảng trắng nằm từ cuối ứng viên trước trở đi
+        pos = 0
+        head = patterns.noun_head.search(scan, 0)
+        while head is not None:
+            start = head.start()
+            end = None
+            if start == 0 or scan[start - 1].isspace():
+                end = end_after(head.start(1), head.end())
+                # Danh từ đầu tiên khớp không tới được điểm kết thúc: thử lần lượt như alternation của regex
+                for pattern in patterns.noun_heads if end is None else ():
+                    other = pattern.match(scan, start)
+                    end = end_after(other.start(1), other.end()) if other else None
+                    if end is not None:
+                        break
+            if end is not None:
+                found.append(text[start:end[0]])
+                pos = end[1] + 1
+            else:
+                pos = start + 1
+            head = patterns.noun_head.search(scan, pos)
+        return found
+
+    def _extract(self, text: str) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
+        """(địa điểm, vị trí trong text nếu là tên chuẩn lấy từ khớp mờ)."""
+        self.reload_if_changed()
+        candidates, fuzzy = self._candidates(text)
+        valid = [loc for loc in map(self._validate, candidates) if loc]
+        if not valid:
+            return None, None
+        location = max(valid, key=len)
+        if location.lower() in fuzzy:
+            return fuzzy[location.lower()]
+        return location, None
 
 
 if __name__ == "__main__":
     parser = LocationParser()
+    parser.wait_until_ready()
     print("\n🚀 LOCATION PARSER TEST\n")
-    
-    test_cases = [
-        "thuê nhà ở ngõ 123 phố Huế",
-        "tập gym ở phòng tập thể hình",
-        "đi siêu thị lúc 9 giờ tối",
-        "ghé 539/2/9 bình thới",
-        "Đi bơi ở hồ bơi lam sơn",
-        "Gửi xe ở bãi giữ xe rạp phim",
-        "ăn uống tại quán phở 24/7",
-        "học bài ở nhà bạn",
-        "làm việc ở công ty ABC",
-        "tắm rửa ở nhà",
-        "đi chơi ở công viên 9/10",
-        "đi khám bệnh viện đa khoa",
-        "đi đá bóng ở sân tập thể thao",
-        "đi xem phim ở rạp chiếu bóng",
-        "Sáng mai 8h đưa con đi học ở trường tiểu học",
-        "Đá banh vào ngày tại sân huỳnh đức"
-        ""
-    ]
-    
     print(f"{'INPUT':<45} | {'OUTPUT'}")
     print("-" * 80)
-    for t in test_cases:
+    for t in EXAMPLES:
         print(f"{t:<45} | {parser.extract(t)}")
\ No newline at end of file
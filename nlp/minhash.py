@@ -0,0 +1,384 @@
+import random
+import re
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+from itertools import chain
+from operator import eq
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from text_utils import remove_diacritics
+except ImportError:
+    from nlp.text_utils import remove_diacritics
+
+# 32 hàm băm chia 8 dải x 4 hàng: hai sự kiện có độ giống Jaccard s thành ứng viên với xác suất
+# 1 - (1 - s^4)^8 (s = 0.67 như "Họp team" / "họp team tuần" -> ~87%, s = 0.3 -> ~6%)
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+# Ngưỡng giống nhau (tỉ lệ hàm băm trùng, ước lượng Jaccard) để coi là trùng
+THRESHOLD = 0.6
+
+# Hoán vị ngẫu nhiên h -> (a*h + b) mod P trên mã crc32 của từ; a < 2^31 để a*h + b không tràn uint64
+_PRIME = 4294967291
+_rng = random.Random(20240611)
+_A = tuple(_rng.randrange(1, 1 << 31) for _ in range(NUM_PERM))
+_B = tuple(_rng.randrange(0, _PRIME) for _ in range(NUM_PERM))
+# Chữ ký của tên rỗng: không bao giờ được coi là trùng
+EMPTY = (0xFFFFFFFF,) * NUM_PERM
+
+_PUNCT_PATTERN = re.compile(r"[^\w\s]")
+
+Signature = Tuple[int, ...]
+
+
+@lru_cache(maxsize=65536)
+def _normalize_word(word: str) -> Tuple[str, ...]:
+    """Một từ gốc -> các từ chuẩn hóa (chữ thường, không dấu, dấu câu tách từ), cache theo từ."""
+    return tuple(_PUNCT_PATTERN.sub(" ", remove_diacritics(word.lower())).split())
+
+
+@lru_cache(maxsize=65536)
+def _normalize_place_word(word: str) -> Tuple[str, ...]:
+    return tuple("@" + w for w in _normalize_word(word))
+
+
+def shingles(event_name: Optional[str], place: Optional[str] = None) -> Set[str]:
+    """Các từ của tên (chữ thường, không dấu, bỏ dấu câu) và của địa điểm (đánh dấu "@")."""
+    words = set(chain.from_iterable(map(_normalize_word, (event_name or "").split())))
+    if place:
+        words.update(chain.from_iterable(map(_normalize_place_word, place.split())))
+    return words
+
+
+@lru_cache(maxsize=65536)
+def _word_hashes(word: str) -> Signature:
+    """Giá trị của một từ qua NUM_PERM hoán vị. Từ vựng lịch lặp lại rất nhiều nên được cache:
+    chữ ký của một sự kiện chỉ còn là min theo cột của vài bộ số có sẵn."""
+    h = zlib.crc32(word.encode("utf-8"))
+    return tuple((a * h + b) % _PRIME for a, b in zip(_A, _B))
+
+
+def signature(event_name: Optional[str], place: Optional[str] = None) -> Signature:
+    """Chữ ký MinHash (NUM_PERM số uint32) của một sự kiện."""
+    words = shingles(event_name, place)
+    if not words:
+        return EMPTY
+    return tuple(map(min, zip(*map(_word_hashes, words))))
+
+
+def to_blob(sig: Signature) -> bytes:
+    """Chữ ký -> BLOB lưu trong cột events.signature (uint32 little-endian)."""
+    data = array("I", sig)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def from_blob(blob: bytes) -> Signature:
+    data = array("I", blob)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return tuple(data)
+
+
+def from_blobs(blobs: Sequence[bytes]):
+    """Nhiều BLOB một lần: mảng numpy (len(blobs), NUM_PERM) nếu có numpy, không thì danh sách chữ ký."""
+    if np is None:
+        return [from_blob(blob) for blob in blobs]
+    return np.frombuffer(b"".join(blobs), dtype="<u4").reshape(len(blobs), NUM_PERM).astype(np.uint32)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Độ giống Jaccard ước lượng: tỉ lệ hàm băm trùng nhau."""
+    if a == EMPTY or b == EMPTY:
+        return 0.0
+    return sum(map(eq, a, b)) / NUM_PERM
+
+
+def signatures_batch(rows: Sequence[Tuple[Optional[str], Optional[str]]], chunk: int = 100_000):
+    """Chữ ký của nhiều (tên, địa điểm) một lần (giống hệt signature() từng dòng).
+
+    Có numpy: trả về mảng (len(rows), NUM_PERM) uint32, min theo cột tính một lần cho cả đợt dòng;
+    không có numpy: danh sách chữ ký.
+    """
+    if np is None:
+        return [signature(name, place) for name, place in rows]
+    result = np.full((len(rows), NUM_PERM), 0xFFFFFFFF, dtype=np.uint32)
+    vocab = _Vocabulary()
+    hashes = [EMPTY]
+    for offset in range(0, len(rows), chunk):
+        word_ids, counts = [], []
+        for name, place in rows[offset:offset + chunk]:
+            words = shingles(name, place)
+            word_ids.extend(map(vocab.__getitem__, words))
+            counts.append(len(words))
+        hashes.extend(map(_word_hashes, list(vocab)[len(hashes) - 1:]))
+        table = np.asarray(hashes, dtype=np.uint32)
+        # Bảng (dòng, vị trí từ) -> mã từ trong table, chỗ trống trỏ tới dòng 0 (EMPTY, không đổi min);
+        # min theo cột lần lượt qua từng vị trí từ
+        counts_array = np.asarray(counts)
+        width = int(counts_array.max(initial=0))
+        if not width:
+            continue
+        row_of_word = np.repeat(np.arange(len(counts)), counts_array)
+        position = np.arange(len(word_ids)) - np.repeat(np.cumsum(counts_array) - counts_array, counts_array)
+        padded = np.zeros((len(counts), width), dtype=np.int64)
+        padded[row_of_word, position] = np.asarray(word_ids) + 1
+        block = result[offset:offset + len(counts)]
+        for k in range(width):
+            np.minimum(block, table[padded[:, k]], out=block)
+    return result
+
+
+class _Vocabulary(dict):
+    """Từ -> số thứ tự, từ mới nhận số tiếp theo."""
+
+    def __missing__(self, word: str) -> int:
+        index = self[word] = len(self)
+        return index
+
+
+def _band_keys(sig: Signature) -> List[int]:
+    return [hash(sig[i:i + ROWS]) for i in range(0, NUM_PERM, ROWS)]
+
+
+def _band_key_matrix(matrix) -> "np.ndarray":
+    """Khóa 64 bit của từng dải cho mọi dòng của ma trận chữ ký: mảng (số dòng, BANDS) uint64."""
+    # Hai cột uint32 liền nhau đọc như một uint64: khóa 64 bit của dải ghép từ ROWS // 2 số
+    packed = np.ascontiguousarray(matrix, dtype=np.uint32).view(np.uint64)
+    keys = packed[:, ::ROWS // 2].copy()
+    for col in range(1, ROWS // 2):
+        keys = keys * np.uint64(0x100000001B3) ^ packed[:, col::ROWS // 2]
+    return keys
+
+
+class _BandedMatrix:
+    """Phần dựng sẵn của LSHIndex (cần numpy): mỗi dải là một mảng khóa đã sắp xếp, tìm bằng searchsorted."""
+
+    __slots__ = ("ids", "matrix", "keys", "rows")
+
+    def __init__(self, ids: Sequence[int], sigs):
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.ascontiguousarray(sigs, dtype=np.uint32).reshape(len(ids), NUM_PERM)
+        order = np.argsort(ids, kind="stable")
+        self.ids, self.matrix = ids[order], matrix[order]
+        band_keys = _band_key_matrix(self.matrix)
+        # Chữ ký rỗng không bao giờ là ứng viên: không đưa vào dải nào
+        valid = np.flatnonzero(self.matrix[:, 0] != 0xFFFFFFFF)
+        self.keys, self.rows = [], []
+        for band in range(BANDS):
+            key = band_keys[valid, band]
+            by_key = np.argsort(key, kind="stable")
+            self.keys.append(key[by_key])
+            self.rows.append(valid[by_key])
+
+    def row(self, item_id: int) -> int:
+        """Dòng của item_id, -1 nếu không có."""
+        row = int(np.searchsorted(self.ids, item_id))
+        return row if row < len(self.ids) and self.ids[row] == item_id else -1
+
+    def candidates(self, sig: Signature) -> "np.ndarray":
+        """Các dòng chung ít nhất một khóa dải với sig."""
+        keys = _band_key_matrix(np.asarray([sig], dtype=np.uint32))[0]
+        found = []
+        for band in range(BANDS):
+            sorted_keys = self.keys[band]
+            lo = np.searchsorted(sorted_keys, keys[band], side="left")
+            hi = np.searchsorted(sorted_keys, keys[band], side="right")
+            if lo < hi:
+                found.append(self.rows[band][lo:hi])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+
+class LSHIndex:
+    """Chỉ mục LSH theo dải cập nhật từng dòng: thêm / xóa sự kiện và tìm sự kiện gần trùng.
+
+    Mỗi dải ROWS hàm băm là một khóa; sự kiện chung ít nhất một khóa là ứng viên, rồi được lọc
+    lại bằng độ giống ước lượng, nên một lần tìm chỉ xét vài sự kiện thay vì cả bảng.
+
+    LSHIndex.build() dựng cả bảng một lần: có numpy thì khóa dải tính theo cột cho mọi dòng và mỗi dải
+    là một mảng đã sắp xếp (không tạo hàng triệu list Python); add() / remove() sau đó ghi vào phần
+    dict cập nhật từng dòng và che dòng cũ trong phần dựng sẵn.
+    """
+
+    def __init__(self):
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self._signatures: Dict[int, Signature] = {}
+        self._base: Optional[_BandedMatrix] = None
+        # Id trong phần dựng sẵn đã bị xóa / thay bằng chữ ký mới
+        self._masked: Set[int] = set()
+
+    @classmethod
+    def build(cls, ids: Sequence[int], sigs) -> "LSHIndex":
+        """Chỉ mục cho cả bảng. sigs: danh sách chữ ký hoặc mảng numpy (len(ids), NUM_PERM) như from_blobs()."""
+        index = cls()
+        if np is None:
+            for item_id, sig in zip(ids, sigs):
+                index.add(item_id, tuple(sig))
+        elif len(ids):
+            index._base = _BandedMatrix(ids, sigs)
+        return index
+
+    def _in_base(self, item_id: int) -> bool:
+        return self._base is not None and item_id not in self._masked and self._base.row(item_id) >= 0
+
+    def __len__(self) -> int:
+        base = len(self._base.ids) - len(self._masked) if self._base is not None else 0
+        return base + len(self._signatures)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._signatures or self._in_base(item_id)
+
+    def add(self, item_id: int, sig: Signature) -> None:
+        if item_id in self._signatures:
+            self.remove(item_id)
+        elif self._in_base(item_id):
+            self._masked.add(item_id)
+        self._signatures[item_id] = sig
+        if sig == EMPTY:
+            return
+        for band, key in zip(self._bands, _band_keys(sig)):
+            band.setdefault(key, []).append(item_id)
+
+    def remove(self, item_id: int) -> None:
+        if self._in_base(item_id):
+            self._masked.add(item_id)
+        sig = self._signatures.pop(item_id, None)
+        if sig is None or sig == EMPTY:
+            return
+        for band, key in zip(self._bands, _band_keys(sig)):
+            ids = band.get(key)
+            if ids and item_id in ids:
+                ids.remove(item_id)
+                if not ids:
+                    del band[key]
+
+    def query(self, sig: Signature, threshold: float = THRESHOLD) -> List[Tuple[int, float]]:
+        """Các (id, độ giống) có độ giống >= threshold, giống nhất trước."""
+        if sig == EMPTY:
+            return []
+        candidates = set()
+        for band, key in zip(self._bands, _band_keys(sig)):
+            candidates.update(band.get(key, ()))
+        found = [(i, similarity(sig, self._signatures[i])) for i in candidates]
+        if self._base is not None:
+            rows = self._base.candidates(sig)
+            scores = (self._base.matrix[rows] == np.asarray(sig, dtype=np.uint32)).sum(axis=1) / NUM_PERM
+            found += [(i, s) for i, s in zip(self._base.ids[rows].tolist(), scores.tolist()) if i not in self._masked]
+        return sorted(((i, s) for i, s in found if s >= threshold), key=lambda x: (-x[1], x[0]))
+
+    def clusters(self, threshold: float = THRESHOLD) -> List[List[int]]:
+        """Các cụm trùng (>= 2 id) trong chỉ mục."""
+        ids = list(self._signatures)
+        sigs = [self._signatures[i] for i in ids]
+        if self._base is None:
+            return find_clusters(ids, sigs, threshold)
+        keep = np.flatnonzero(~np.isin(self._base.ids, list(self._masked)))
+        matrix = self._base.matrix[keep]
+        if sigs:
+            matrix = np.vstack((matrix, np.asarray(sigs, dtype=np.uint32)))
+        return find_clusters(self._base.ids[keep].tolist() + ids, matrix, threshold)
+
+
+def _union_find_clusters(ids: Sequence[int], sigs: Sequence[Signature], threshold: float) -> List[List[int]]:
+    parent = list(range(len(ids)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for start in range(0, NUM_PERM, ROWS):
+        heads: Dict[Signature, int] = {}
+        for i, sig in enumerate(sigs):
+            if sig == EMPTY:
+                continue
+            head = heads.setdefault(sig[start:start + ROWS], i)
+            if head != i and similarity(sig, sigs[head]) >= threshold:
+                parent[root(i)] = root(head)
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(ids)):
+        groups.setdefault(root(i), []).append(ids[i])
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: g[0])
+
+
+def find_clusters(ids: Sequence[int], sigs, threshold: float = THRESHOLD) -> List[List[int]]:
+    """Các cụm sự kiện gần trùng (>= 2 id, id tăng dần, cụm theo id nhỏ nhất).
+
+    sigs: danh sách chữ ký hoặc mảng numpy (len(ids), NUM_PERM). Trong mỗi dải, các dòng cùng khóa
+    được so với dòng đầu tiên của khóa đó và nối lại nếu đủ giống; cụm là các thành phần liên thông.
+    """
+    if np is None:
+        return _union_find_clusters(ids, [tuple(s) for s in sigs], threshold)
+    n = len(ids)
+    if n == 0:
+        return []
+    matrix = np.ascontiguousarray(sigs, dtype=np.uint32).reshape(n, NUM_PERM)
+    valid = np.flatnonzero(matrix[:, 0] != 0xFFFFFFFF)
+    band_keys = _band_key_matrix(matrix[valid])
+    lefts, rights = [], []
+    for band in range(BANDS):
+        key = band_keys[:, band]
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        new_run = np.ones(len(order), dtype=bool)
+        new_run[1:] = sorted_key[1:] != sorted_key[:-1]
+        heads = order[np.maximum.accumulate(np.where(new_run, np.arange(len(order)), 0))]
+        lefts.append(valid[order[~new_run]])
+        rights.append(valid[heads[~new_run]])
+    # Cặp ứng viên lặp lại ở nhiều dải chỉ so độ giống một lần; va chạm khóa cũng bị loại ở đây
+    pairs = np.sort(np.concatenate(lefts).astype(np.int64) * n + np.concatenate(rights))
+    if not len(pairs):
+        return []
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+    left, right = pairs // n, pairs % n
+    same = (matrix[left] == matrix[right]).sum(axis=1) >= threshold * NUM_PERM
+    left, right = left[same], right[same]
+    if not len(left):
+        return []
+
+    # Thành phần liên thông: nối gốc của hai đầu mỗi cạnh vào gốc nhỏ hơn, rồi nhảy con trỏ đến khi mọi
+    # nút trỏ thẳng tới gốc; lặp đến khi hai đầu mọi cạnh cùng gốc (số vòng ~ log của đường kính cụm)
+    labels = np.arange(n)
+    while True:
+        a, b = labels[left], labels[right]
+        differ = a != b
+        if not differ.any():
+            break
+        a, b = a[differ], b[differ]
+        low = np.minimum(a, b)
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+    ids_array = np.asarray(ids)
+    member = labels != np.arange(n)
+    member[labels[member]] = True
+    rows = np.flatnonzero(member)
+    rows = rows[np.lexsort((ids_array[rows], labels[rows]))]
+    bounds = [0] + (np.flatnonzero(np.diff(labels[rows])) + 1).tolist() + [len(rows)]
+    sorted_ids = ids_array[rows].tolist()
+    clusters = [sorted_ids[bounds[k]:bounds[k + 1]] for k in range(len(bounds) - 1)]
+    return sorted(clusters, key=lambda g: g[0])
+
+if __name__ == "__main__":
+    events = [(1, "Họp team", "phòng họp"), (2, "họp team tuần", "Phòng họp"), (3, "Đi siêu thị", None),
+              (4, "đi sieu thi", None), (5, "Ăn trưa với khách hàng", "nhà hàng"), (6, "Học tiếng Anh", None)]
+    index = LSHIndex()
+    for event_id, name, place in events:
+        index.add(event_id, signature(name, place))
+    print(f"Cụm trùng: {index.clusters()}")
+    print(f"Gần giống 'họp team' @ phòng họp: {index.query(signature('họp team', 'phòng họp'))}")
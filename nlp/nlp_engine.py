@@ -2,8 +2,11 @@ import re
 import sys
 import os
 import unicodedata
+import multiprocessing
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from functools import partial
+from typing import Dict, Any, Iterable, Iterator, Optional, List, Tuple
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
@@ -11,18 +14,28 @@ try:
     from location_parser import LocationParser
     from time_parser import TimeParser
     from habit_parser import HabitParser
+    from result_cache import LRUCache
+    from text_utils import remove_diacritics
+    from event_grouper import EventGrouper
+    from parse_result import ParseResult
+    from instrumentation import PipelineInstrumentation, Trace
 except ImportError:
     from nlp.preprocessor import Preprocessor
     from nlp.location_parser import LocationParser
     from nlp.time_parser import TimeParser
     from nlp.habit_parser import HabitParser
+    from nlp.result_cache import LRUCache
+    from nlp.text_utils import remove_diacritics
+    from nlp.event_grouper import EventGrouper
+    from nlp.parse_result import ParseResult
+    from nlp.instrumentation import PipelineInstrumentation, Trace
 
 
 class NLPEngine:
     """Engine xử lý NLP: Trích xuất intent, thời gian, địa điểm và tên sự kiện từ câu đầu vào."""
     
-    def __init__(self):
-        self.preprocessor = Preprocessor()
+    def __init__(self, cache_size: int = 0, segmenter: Optional[str] = None, instrument: Optional[bool] = None):
+        self.preprocessor = Preprocessor(segmenter=segmenter)
         self.location_parser = LocationParser()
         self.time_parser = TimeParser()
         self.habit_parser = HabitParser()
@@ -39,60 +52,44 @@ class NLPEngine:
         ]
         self.priority_verbs = ["đi", "về", "ăn", "ngủ", "học", "chơi", "làm", "đá", "xem", "coi", "mua", "bán", "gặp"]
 
-    def _remove_substring(self, text: str, substr: str) -> str:
-        """Xóa substring từ text (kèm giới từ đứng trước)."""
-        if not substr:
-            return text
-        # Regex xóa: (giới từ tùy chọn) + (địa điểm)
-        preps = r"(?:ở|tại|đến|về|ghé|ra|vào|trong|trên|tới|khu|phòng)"
-        pattern = rf'(?:{preps}\s+)?\b' + re.escape(substr) + r'\b'
-        return re.sub(pattern, " ", text, flags=re.IGNORECASE).strip()
-
-    def _remove_time_patterns(self, text: str) -> str:
-        """Xóa các pattern chỉ thời gian từ text."""
-        unit_pattern = r"(?:giờ|h|g|:)" 
-
-        patterns = [
-            rf"\b(?:vào|lúc|vào lúc)\s+\d{{1,2}}\s*{unit_pattern}\s*\d{{0,2}}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?",
-            r"\b(?:vào|lúc|vào lúc)?\s*\d{1,2}:\d{1,2}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?",
-            rf"\b(?:trước|sau|tầm|khoảng|từ|đến|kéo dài|trong)\s+\d{{1,2}}\s*{unit_pattern}\s*\d{{0,2}}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?(?:\s*kém\s*\d+)?",
-            rf"\d{{1,2}}\s*{unit_pattern}\s*\d{{0,2}}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?(?:\s*kém\s*\d+)?(?:\s*rưỡi)?",
-            r"\bkém\s*\d+(?:\s*(?:phút|p))?",
-            r"\b(?:hôm nay|bữa nay|ngày mai|sáng mai|chiều mai|tối mai|mốt|kia|hôm qua)\b",
-            r"\b(?:tuần sau|tháng sau|năm sau)\b",
-            r"(?<!buổi\s)\b(?:sáng|trưa|chiều|tối|đêm)\b",
-            r"(?<!buổi\s)\b(?:mai|nay)\b",
-            r"\b(?:thứ)\s+(?:\d+|hai|ba|tư|năm|sáu|bảy)\b",
-            r"\b(?:chủ nhật|cn)\b",
-            r"\b(?:nãy giờ|tới giờ|ban nãy|lát nữa|sắp tới)\b",
-            r"\bbuổi\s+(?:sáng|trưa|chiều|tối|đêm)\b",
-            r"\b\d+\s*(?:tiếng|phút|p|h|giờ)\b",
-            r"(?:nhắc|báo|gọi|alarm|nhac|bao)\s*(?:tôi|mình|me)?\s*(?:trước|sớm|lại|truoc|som|\s)*\d+(?:\.\d+)?\s*(?:phút|p|ph|tiếng|giờ|h|g)",
-            r"(?:sau|trong|khoảng)\s+\d+(?:\s*(?:phút|giờ|tiếng))+\s+(?:nữa)?\s*(?:nhắc|báo|gọi|alarm|nhac|bao)?"
-        ]
-        
-        cleaned_text = text
-        for pat in patterns:
-            cleaned_text = re.sub(pat, " ", cleaned_text, flags=re.IGNORECASE)
-        return cleaned_text.strip()
+        # Cache kết quả process_command (tắt khi cache_size = 0)
+        self.cache: Optional[LRUCache] = LRUCache(cache_size) if cache_size > 0 else None
 
-    def _remove_habit_patterns(self, text: str, habit_info: dict) -> str:
-        """Xóa các từ khóa thói quen (Bao gồm cả lỗi chính tả 'mõi')."""
-        
-        # Regex cho từ bắt đầu: mỗi, mõi, mọi, hàng, moi
-        start_words = r"(?:mỗi|mõi|moi|hàng|mọi)"
-        
-        patterns = [
-            # Bắt: mỗi ngày, mõi ngày, hàng tuần, mọi tháng...
-            rf"\b{start_words}\s+(?:ngày|tuần|tháng|năm|sáng|trưa|chiều|tối|đêm|thứ\s*\d+|chủ nhật)\b",
-            # Bắt: mỗi t2, hàng t3...
-            rf"\b{start_words}\s+(?:t2|t3|t4|t5|t6|t7|cn)\b"
-        ]
-        
-        cleaned_text = text
-        for pat in patterns:
-            cleaned_text = re.sub(pat, " ", cleaned_text, flags=re.IGNORECASE)
-        return cleaned_text.strip()
+        # Đo thời gian từng bước (tắt mặc định; bật bằng instrument=True hoặc NLP_INSTRUMENT=1)
+        if instrument is None:
+            instrument = os.environ.get("NLP_INSTRUMENT", "").lower() in ("1", "true", "yes")
+        self.instrumentation: Optional[PipelineInstrumentation] = PipelineInstrumentation() if instrument else None
+
+    # Giới từ đứng ngay trước địa điểm cũng bị bỏ khỏi tên sự kiện ("đi bơi ở hồ bơi X" -> "đi bơi"),
+    # kể cả khi gõ không dấu ("di choi o sai gon" -> "di choi"). Chỉ bỏ nguyên từ: "Mua áo Đà Lạt" giữ "áo"
+    LOCATION_PREFIX_PATTERN = re.compile(
+        r"(?<!\w)(?:ở|tại|đến|về|ghé|ra|vào|trong|trên|tới|khu|phòng"
+        r"|o|tai|den|ve|ghe|vao|trong|tren|toi|phong)\s+$",
+        re.IGNORECASE,
+    )
+
+    def _location_removal_spans(self, text: str, location_spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Mở rộng vị trí địa điểm sang giới từ đứng trước (nếu có)."""
+        spans = []
+        for start, end in location_spans:
+            prefix = self.LOCATION_PREFIX_PATTERN.search(text, 0, start)
+            spans.append((prefix.start() if prefix else start, end))
+        return spans
+
+    @staticmethod
+    def _subtract_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+        """Bỏ các đoạn [start, end) khỏi text trong một lượt, mỗi đoạn thay bằng một khoảng trắng."""
+        parts = []
+        pos = 0
+        for start, end in sorted(spans):
+            if end <= pos:
+                continue
+            if start > pos:
+                parts.append(text[pos:start])
+            parts.append(" ")
+            pos = max(pos, end)
+        parts.append(text[pos:])
+        return "".join(parts)
 
     def _clean_event_name(self, text: str) -> str:
         """Dọn dẹp tên sự kiện."""
@@ -115,73 +112,29 @@ class NLPEngine:
             
         return " ".join(words)
 
-    def extract_event_name(self, raw_text: str, location: Optional[str], habit_info: dict) -> str:
-        """Trích xuất tên sự kiện từ text GỐC."""
-        current_text = raw_text
-        
-        # 1. Xóa địa điểm (Nếu có)
-        if location:
-            current_text = self._remove_substring(current_text, location)
-            
-        # 2. Xóa thói quen
-        current_text = self._remove_habit_patterns(current_text, habit_info)
-            
-        # 3. Xóa thời gian
-        current_text = self._remove_time_patterns(current_text)
-        
-        # 4. Clean rác và trả về
-        result = self._clean_event_name(current_text)
+    def extract_event_name(
+        self,
+        raw_text: str,
+        location: Optional[str],
+        location_spans: Optional[List[Tuple[int, int]]] = None,
+    ) -> str:
+        """Trích xuất tên sự kiện từ text GỐC: bỏ các đoạn địa điểm/thói quen/thời gian mà parser đã tìm thấy."""
+        # 1. Địa điểm (dùng lại vị trí LocationParser trả về nếu có)
+        if location and location_spans is None:
+            location_spans = self.location_parser.find_spans(raw_text, location)
+        spans = self._location_removal_spans(raw_text, location_spans) if location else []
+
+        # 2. Thói quen + 3. Thời gian
+        spans += self.habit_parser.find_spans(raw_text)
+        spans += self.time_parser.find_spans(raw_text)
+
+        # 4. Bỏ mọi đoạn trong một lượt, clean rác và trả về
+        result = self._clean_event_name(self._subtract_spans(raw_text, spans))
         
         if result:
             return result[0].upper() + result[1:]
         return "Sự kiện mới"
 
-    def _format_display_data(self, time_data: dict, location: str, habit_info: dict) -> dict:
-        """Format dữ liệu hiển thị chuẩn cho Test Case (dd/mm/yyyy)."""
-        date_str = "---"
-        if time_data.get("date"):
-            date_str = time_data["date"].strftime("%d/%m/%Y") 
-
-        start_str = "---"
-        if time_data.get("start_time"):
-            h = time_data["start_time"]["hour"]
-            m = time_data["start_time"]["minute"]
-            start_str = f"{h:02}:{m:02}"
-
-        end_str = "---"
-        if time_data.get("end_time"):
-            h = time_data["end_time"]["hour"]
-            m = time_data["end_time"]["minute"]
-            end_str = f"{h:02}:{m:02}"
-
-        dur_str = "---"
-        if time_data.get("duration"):
-            total = int(time_data["duration"].total_seconds())
-            h = total // 3600
-            m = (total % 3600) // 60
-            if m > 0:
-                dur_str = f"{h}h{m}p" if h > 0 else f"{m}p"
-            else:
-                dur_str = f"{h}h"
-
-        rem_str = "---"
-        rem_min = time_data.get("reminder_minutes")
-        if rem_min is not None:
-            rem_str = f"{rem_min} phút"
-
-        habit_str = "---"
-        if habit_info.get("is_habit"):
-            habit_str = habit_info.get("frequency", "daily").upper()
-
-        return {
-            "date": date_str,
-            "start": start_str,
-            "end": end_str,
-            "duration": dur_str,
-            "reminder": rem_str,
-            "habit": habit_str,
-            "location": location if location else "---"
-        }
     def _restore_case(self, raw_text: str, clean_substr: str) -> str:
         """Khôi phục chữ hoa/thường từ chuỗi gốc."""
         if not clean_substr or not raw_text:
@@ -191,154 +144,230 @@ class NLPEngine:
         if match:
             return match.group(0)
         return clean_substr.title()
-    def process_command(self, raw_text: str) -> Dict[str, Any]:
-        """Xử lý câu lệnh qua toàn bộ pipeline NLP."""
+
+    def _cache_key(self, raw_text: str, now: datetime) -> Tuple[str, str, int, int]:
+        """Khóa cache: câu lệnh (NFC, chữ thường) + ngày của mốc thời gian, vì "mai", "thứ 2"... đổi nghĩa qua nửa đêm.
+
+        Kèm phiên bản từ điển để kết quả tính bằng dữ liệu cũ không được dùng lại sau khi nạp lại.
+        """
+        return (
+            unicodedata.normalize("NFC", raw_text.lower()),
+            now.date().isoformat(),
+            self.preprocessor.version,
+            self.location_parser.version,
+        )
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Chờ các phần nạp ở luồng nền (model tách từ, chỉ mục địa điểm khớp mờ). True nếu đã sẵn sàng."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ready = self.preprocessor.wait_until_ready(timeout)
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return self.location_parser.wait_until_ready(remaining) and ready
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Nạp lại các file trong nlp/data đã bị sửa (từ điển + địa điểm) mà không cần tạo lại engine."""
+        reloaded = self.preprocessor.reload_if_changed(force)
+        reloaded = self.location_parser.reload_if_changed(force) or reloaded
+        if reloaded and self.cache is not None:
+            self.cache.clear()
+        return reloaded
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Thống kê cache (None nếu không bật cache)."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def enable_instrumentation(self, window: int = 1000, trace_size: int = 50) -> PipelineInstrumentation:
+        """Bật đo thời gian từng bước của process_command (giữ số liệu cũ nếu đã bật)."""
+        if self.instrumentation is None:
+            self.instrumentation = PipelineInstrumentation(window, trace_size)
+        return self.instrumentation
+
+    def disable_instrumentation(self) -> None:
+        self.instrumentation = None
+
+    def timing_stats(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """p50/p95/p99 (ms) của từng bước (None nếu không bật đo thời gian)."""
+        return self.instrumentation.stats() if self.instrumentation is not None else None
+
+    def process_command(self, raw_text: str, now: Optional[datetime] = None) -> ParseResult:
+        """Xử lý câu lệnh qua toàn bộ pipeline NLP.
+
+        now: mốc thời gian để hiểu "mai", "thứ 2", "nãy giờ"... (mặc định datetime.now()).
+        Khi bật cache, kết quả trả về có thể được dùng chung giữa các lần gọi: không sửa trực tiếp.
+        """
         if not raw_text or not isinstance(raw_text, str): return self._error_response()
         raw_text = raw_text.strip()
         if not raw_text: return self._error_response()
 
-        # B1: Chuẩn hóa sơ bộ
-        clean_text = self.preprocessor.process(raw_text)
-        clean_text_lite = self.preprocessor.process_lite(raw_text)
+        # Khóa cache và TimeParser dùng cùng một mốc (không lệch ngày khi gọi sát nửa đêm)
+        if now is None:
+            now = datetime.now()
+
+        # Biến cục bộ: tắt đo ở luồng khác giữa chừng không làm hỏng lời gọi đang chạy
+        instrumentation = self.instrumentation
+        trace = instrumentation.start(raw_text) if instrumentation is not None else None
+        result = self._process_cached(raw_text, now, trace)
+        if trace is not None:
+            instrumentation.finish(trace)
+        return result
+
+    def _process_cached(self, raw_text: str, now: datetime, trace: Optional[Trace]) -> ParseResult:
+        if self.cache is None:
+            return self._process(raw_text, now, trace)[0]
+
+        # Trên nhánh cache hit không đi qua prepare()/extract() nên phải tự kiểm tra file dữ liệu
+        self.reload_if_changed()
+        key = self._cache_key(raw_text, now)
+        # Tên sự kiện/địa điểm giữ chữ hoa của câu gốc nên chỉ dùng lại khi câu gốc trùng khớp
+        cached = self.cache.get(key, accept=lambda entry: entry[0] == raw_text)
+        if cached is not None:
+            if trace is not None:
+                trace.cache_hit = True
+            return cached[1]
+
+        # Khi model tách từ còn đang nạp ở luồng nền, kết quả dùng tách từ dự phòng (text.split()),
+        # khi chỉ mục khớp mờ chưa dựng xong thì không tìm được địa điểm gõ không dấu:
+        # không cache, kẻo kết quả kém hơn được dùng lại cả ngày sau khi mọi thứ đã sẵn sàng
+        ready = self.preprocessor.segmenter.is_ready() and self.location_parser.is_ready()
+        result, uses_clock = self._process(raw_text, now, trace)
+        if not uses_clock and ready:
+            self.cache.put(key, (raw_text, result))
+        return result
+
+    def process_many(
+        self,
+        texts: Iterable[str],
+        workers: Optional[int] = None,
+        chunksize: int = 16,
+        now: Optional[datetime] = None,
+    ) -> Iterator[ParseResult]:
+        """Xử lý hàng loạt câu lệnh trên nhiều tiến trình, trả kết quả dần dần theo đúng thứ tự đầu vào.
+
+        workers=None dùng toàn bộ CPU; workers <= 1 chạy tuần tự trong tiến trình hiện tại.
+        Mỗi tiến trình con tạo NLPEngine của riêng nó một lần, các câu được gửi đi theo lô chunksize câu.
+        Cả lô dùng chung một mốc thời gian now (mặc định: lúc gọi), kể cả khi chạy qua nửa đêm.
+        """
+        if now is None:
+            now = datetime.now()
+
+        # Nạp xong model tách từ / chỉ mục khớp mờ trước: kết quả không phụ thuộc thời điểm gọi, và tiến trình con
+        # tạo bằng fork không kế thừa một luồng nạp đang chạy dở
+        self.wait_until_ready()
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for text in texts:
+                yield self.process_command(text, now)
+            return
+
+        options = {
+            "cache_size": self.cache.maxsize if self.cache is not None else 0,
+            "segmenter": self.preprocessor.segmenter.name,
+        }
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(options,)) as pool:
+            yield from pool.imap(partial(_worker_process_command, now=now), texts, chunksize)
+
+    def _process(self, raw_text: str, now: datetime, trace: Optional[Trace] = None) -> Tuple[ParseResult, bool]:
+        """Chạy pipeline, kèm cờ cho biết kết quả có phụ thuộc giờ hiện tại (không cache được).
+
+        trace (khi bật đo thời gian) ghi thời gian từng bước; tắt thì mỗi bước chỉ tốn một phép so sánh None.
+        """
+        # B1: Chuẩn hóa sơ bộ (process và process_lite dùng chung một lần dịch từ điển), rồi tách từ
+        prepared = self.preprocessor.prepare(raw_text)
+        clean_text_lite = prepared.lite
+        if trace is not None: trace.lap("preprocess")
+        clean_text = prepared.segmented
+        if trace is not None: trace.lap("segment")
         
         # B2: Phân tích thói quen
         habit_info = self.habit_parser.parse(clean_text)
+        if trace is not None: trace.lap("habit")
         
-        location_raw = self.location_parser.extract(raw_text)
+        location_raw, location_spans = self.location_parser.extract_with_spans(raw_text)
+        if trace is not None: trace.lap("location")
         
         # B4: Trích xuất thời gian
-        time_data = self.time_parser.parse(clean_text_lite)
-        
-        event_name = self.extract_event_name(raw_text, location_raw, habit_info)
+        time_data, uses_clock = self.time_parser.parse_detailed(clean_text_lite, now)
+        if trace is not None: trace.lap("time")
         
-        # Logic fallback: Nếu xóa sạch quá hóa ra rỗng, thử lại với clean_text
-        if not event_name or event_name == "Sự kiện mới":
-             event_temp = self.extract_event_name(clean_text, location_raw, habit_info)
-             if event_temp and event_temp != "Sự kiện mới":
-                 event_name = event_temp.capitalize()
+        event_name = self.extract_event_name(raw_text, location_raw, location_spans)
+        if trace is not None: trace.lap("event_name")
 
         intent = "create_habit" if habit_info['is_habit'] else "create_event"
         
         # Format dữ liệu hiển thị (ưu tiên lấy chữ hoa từ raw text nếu có thể)
         final_location = location_raw
-        if location_raw:
+        if location_spans:
              # Đảm bảo hiển thị đúng case từ input gốc
+             start, end = location_spans[0]
+             final_location = raw_text[start:end]
+             # Khớp mờ ("sai gon" -> "sài gòn"): hiển thị tên chuẩn có dấu thay cho chữ người dùng gõ
+             if final_location.lower().split() != location_raw.lower().split():
+                 final_location = self._restore_case(raw_text, location_raw)
+        elif location_raw:
              final_location = self._restore_case(raw_text, location_raw)
 
-        display_data = self._format_display_data(time_data, final_location, habit_info)
-        
-        return {
-            "intent": intent,
-            "processed_text": clean_text,
-            "data": {
-                "event_name": event_name,
-                "location": final_location,
-                "time": time_data, 
-                "habit_frequency": habit_info['frequency'],
-                "reminder_minutes": time_data.get('reminder_minutes')
-            },
-            "display_data": display_data
-        }
+        # display_data được format khi có người đọc (xem ParseResult)
+        return ParseResult(intent, clean_text, {
+            "event_name": event_name,
+            "location": final_location,
+            "time": time_data,
+            "habit_frequency": habit_info['frequency'],
+            "habit_recurrence": habit_info['recurrence'].to_dict() if habit_info['recurrence'] else None,
+            "reminder_minutes": time_data.get('reminder_minutes')
+        }), uses_clock
 
     @staticmethod
-    def _error_response() -> Dict[str, Any]:
-        return {
-            "intent": "unknown",
-            "processed_text": "",
-            "data": { "event_name": "Sự kiện mới", "location": None, "time": {}, "habit_frequency": None, "reminder_minutes": None },
-            "display_data": {}
-        }
+    def _error_response() -> ParseResult:
+        return ParseResult(
+            "unknown", "",
+            { "event_name": "Sự kiện mới", "location": None, "time": {}, "habit_frequency": None, "habit_recurrence": None, "reminder_minutes": None },
+            display_data={}
+        )
     @staticmethod
     def _remove_diacritics(text: str) -> str:
-        if not text:
-            return ""
-        nfkd = unicodedata.normalize('NFKD', text)
-        return ''.join(c for c in nfkd if unicodedata.category(c) != 'Mn')
+        return remove_diacritics(text)
 
-    @staticmethod
-    def _date_key(time_obj: Any) -> str:
-        if not time_obj:
-            return "unknown"
-        d = time_obj.get("date")
-        try:
-            return d.strftime("%Y-%m-%d")
-        except Exception:
-            return "unknown"
+    def group_events(self, parsed_results: List[Dict[str, Any]], name_threshold: float = 0.5) -> List[Dict[str, Any]]:
+        """Gom các kết quả cùng ngày, cùng địa điểm và tên gần giống (xem EventGrouper)."""
+        return EventGrouper(name_threshold).add_all(parsed_results).groups()
 
-    @staticmethod
-    def _loc_key(loc: Optional[str]) -> str:
-        if not loc:
-            return "unknown"
-        s = NLPEngine._remove_diacritics(loc.lower())
-        s = re.sub(r'[^\w\s]', ' ', s)
-        s = re.sub(r'\s+', ' ', s).strip()
-        return s or "unknown"
+    def stream_groups(
+        self,
+        results: Iterable[Dict[str, Any]],
+        name_threshold: float = 0.5,
+        retention_days: Optional[int] = 0,
+        max_undated: Optional[int] = 10_000,
+    ) -> Iterator[Dict[str, Any]]:
+        """Gom nhóm theo luồng (vd. process_many trên một file rất lớn), trả về các cập nhật nhóm.
 
-    @staticmethod
-    def _token_overlap(a: List[str], b: List[str]) -> float:
-        if not a or not b:
-            return 0.0
-        sa, sb = set(a), set(b)
-        return len(sa & sb) / max(len(sa), len(sb)) if max(len(sa), len(sb)) > 0 else 0.0
+        Nhóm của các ngày cũ hơn ngày mới nhất quá retention_days ngày được đóng và bỏ khỏi bộ nhớ;
+        nhóm không rõ ngày được giữ tối đa max_undated nhóm (đóng nhóm lâu nhất chưa cập nhật).
+        Khi luồng kết thúc, các nhóm còn mở được đóng nốt.
+        """
+        grouper = EventGrouper(name_threshold, retention_days, max_undated)
+        yield from grouper.feed(results)
+        yield from grouper.flush()
 
-    def group_events(self, parsed_results: List[Dict[str, Any]], name_threshold: float = 0.5) -> List[Dict[str, Any]]:
-        buckets = []
-        for res in parsed_results:
-            data = res.get("data", {})
-            name = data.get("event_name") or ""
-            loc = data.get("location")
-            time_obj = data.get("time") or {}
-            
-            date_k = self._date_key(time_obj)
-            loc_k = self._loc_key(loc)
-            name_tokens = [t for t in name.split() if t and len(t) > 1]
-
-            placed = False
-            for b in buckets:
-                if b["date_key"] != date_k: continue
-                if b["loc_key"] != "unknown" and loc_k != "unknown" and b["loc_key"] != loc_k: continue
-                
-                overlap = self._token_overlap(name_tokens, b["name_tokens"])
-                if overlap >= name_threshold:
-                    b["members"].append(res)
-                    b["name_tokens"] = list(set(b["name_tokens"]) | set(name_tokens))
-                    rem = (time_obj.get("reminder_minutes") if isinstance(time_obj, dict) else None)
-                    if rem is not None:
-                        if b.get("reminder_minutes") is None:
-                            b["reminder_minutes"] = rem
-                        else:
-                            b["reminder_minutes"] = min(b["reminder_minutes"], rem)
-                    placed = True
-                    break
-
-            if not placed:
-                buckets.append({
-                    "name_tokens": name_tokens,
-                    "date_key": date_k,
-                    "loc_key": loc_k,
-                    "members": [res],
-                    "reminder_minutes": (time_obj.get("reminder_minutes") if isinstance(time_obj, dict) else None)
-                })
-
-        groups = []
-        for i, b in enumerate(buckets, 1):
-            first_member = b["members"][0]
-            rep_name = first_member["data"]["event_name"]
-            rep_loc = None if b["loc_key"] == "unknown" else first_member["data"]["location"]
-            groups.append({
-                "group_id": i,
-                "representative_name": rep_name,
-                "date": b["date_key"],
-                "location": rep_loc,
-                "count": len(b["members"]),
-                "members": b["members"],
-                "reminder_minutes": b.get("reminder_minutes")
-            })
-        return groups
+
+# Engine của tiến trình con trong process_many (tạo một lần khi khởi động tiến trình)
+_worker_engine: Optional[NLPEngine] = None
+
+
+def _init_worker(options: Dict[str, Any]) -> None:
+    global _worker_engine
+    _worker_engine = NLPEngine(**options)
+    _worker_engine.wait_until_ready()
+
+
+def _worker_process_command(raw_text: str, now: Optional[datetime] = None) -> ParseResult:
+    return _worker_engine.process_command(raw_text, now)
 
 
 if __name__ == "__main__":
     engine = NLPEngine()
+    engine.wait_until_ready()
     # Test case khó
     texts = [
         "Đi siêu thị BigC vào lúc 9 giờ tối nay",
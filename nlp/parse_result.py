@@ -0,0 +1,80 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+EMPTY_FIELD = "---"
+
+
+def _clock(value: Optional[Dict[str, int]]) -> str:
+    return f"{value['hour']:02}:{value['minute']:02}" if value else EMPTY_FIELD
+
+
+def format_display_data(time_data: dict, location: Optional[str], habit_frequency: Optional[str]) -> Dict[str, str]:
+    """Format dữ liệu hiển thị chuẩn cho Test Case (dd/mm/yyyy). habit_frequency = None: không phải thói quen."""
+    date_str = time_data["date"].strftime("%d/%m/%Y") if time_data.get("date") else EMPTY_FIELD
+
+    dur_str = EMPTY_FIELD
+    if time_data.get("duration"):
+        total = int(time_data["duration"].total_seconds())
+        h = total // 3600
+        m = (total % 3600) // 60
+        if m > 0:
+            dur_str = f"{h}h{m}p" if h > 0 else f"{m}p"
+        else:
+            dur_str = f"{h}h"
+
+    rem_min = time_data.get("reminder_minutes")
+
+    return {
+        "date": date_str,
+        "start": _clock(time_data.get("start_time")),
+        "end": _clock(time_data.get("end_time")),
+        "duration": dur_str,
+        "reminder": f"{rem_min} phút" if rem_min is not None else EMPTY_FIELD,
+        "habit": habit_frequency.upper() if habit_frequency else EMPTY_FIELD,
+        "location": location if location else EMPTY_FIELD,
+    }
+
+
+class ParseResult(Mapping):
+    """Kết quả process_command: đọc như dict cũ (result["data"], result.get("display_data")...).
+
+    Dùng __slots__ thay cho dict ngoài cùng, và display_data (strftime + format chuỗi) chỉ được tính
+    ở lần đọc đầu tiên: xử lý hàng loạt / gọi qua API mà không hiển thị thì không tốn thời gian
+    format lẫn bộ nhớ cho các chuỗi hiển thị. to_dict() trả về đúng dạng dict trước đây.
+    """
+
+    __slots__ = ("intent", "processed_text", "data", "_display_data")
+
+    KEYS = ("intent", "processed_text", "data", "display_data")
+
+    def __init__(self, intent: str, processed_text: str, data: Dict[str, Any],
+                 display_data: Optional[Dict[str, str]] = None):
+        self.intent = intent
+        self.processed_text = processed_text
+        self.data = data
+        self._display_data = display_data
+
+    @property
+    def display_data(self) -> Dict[str, str]:
+        if self._display_data is None:
+            data = self.data
+            habit = (data["habit_frequency"] or "daily") if self.intent == "create_habit" else None
+            self._display_data = format_display_data(data["time"], data["location"], habit)
+        return self._display_data
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"ParseResult(intent={self.intent!r}, processed_text={self.processed_text!r}, data={self.data!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self.KEYS}
@@ -6,25 +6,61 @@ import json
 from typing import Optional
 
 try:
-    from underthesea import word_tokenize
-    HAS_UNDERTHESEA = True
+    from data_watcher import FileWatcher
+    from dict_matcher import DictMatcher
+    from segmenter import Segmenter, get_segmenter
+    from text_utils import remove_diacritics
 except ImportError:
-    HAS_UNDERTHESEA = False
+    from nlp.data_watcher import FileWatcher
+    from nlp.dict_matcher import DictMatcher
+    from nlp.segmenter import Segmenter, get_segmenter
+    from nlp.text_utils import remove_diacritics
 
 
 class Preprocessor:
     """Preprocessor: Chuẩn hóa, dịch và khôi phục dấu văn bản tiếng Việt."""
 
-    def __init__(self):
+    # Tên thuộc tính từ điển / matcher tương ứng với từng file trong thư mục data
+    DICT_FILES = {
+        "replace_dict.json": ("replace_dict", "replace_matcher"),
+        "en_vi.json": ("en_vi_dict", "en_vi_matcher"),
+        "ambiguity.json": ("ambiguity_dict", "ambiguity_matcher"),
+    }
+
+    def __init__(
+        self,
+        block_on_segmenter: bool = False,
+        segmenter: Optional[str] = None,
+        auto_reload: bool = True,
+        reload_interval: float = 2.0,
+    ):
+        # Backend tách từ: "underthesea" (mặc định), "longest_match" hoặc "none" (xem segmenter.py)
+        self.segmenter: Segmenter = get_segmenter(segmenter)
+        # False: khi model tách từ chưa nạp xong thì tạm trả về bản chưa tách từ
+        self.block_on_segmenter = block_on_segmenter
+        self.segmenter.warm_up()
+
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
         self.data_dir = os.path.join(self.base_dir, "data")
         
         self.replace_dict = self._load_json("replace_dict.json")
         self.en_vi_dict = self._load_json("en_vi.json")
         self.ambiguity_dict = self._load_json("ambiguity.json")
+
+        # Biên dịch từ điển thành trie một lần, thay cho mỗi khóa một lần re.finditer
+        self.replace_matcher = DictMatcher(self.replace_dict)
+        self.en_vi_matcher = DictMatcher(self.en_vi_dict)
+        self.ambiguity_matcher = DictMatcher(self.ambiguity_dict)
+
+        # Tăng mỗi lần nạp lại từ điển (NLPEngine dùng để bỏ các kết quả cache cũ)
+        self.version = 0
+        self.watcher: Optional[FileWatcher] = None
+        if auto_reload:
+            paths = [os.path.join(self.data_dir, name) for name in self.DICT_FILES]
+            self.watcher = FileWatcher(paths, reload_interval)
         
-    def _load_json(self, file_name: str) -> dict:
-        """Tải từ điển JSON từ thư mục data."""
+    def _read_json(self, file_name: str) -> Optional[dict]:
+        """Đọc từ điển JSON từ thư mục data. None nếu không đọc được."""
         path = os.path.join(self.data_dir, file_name)
         if os.path.exists(path):
             try:
@@ -32,7 +68,32 @@ class Preprocessor:
                     return json.load(f)
             except Exception as e:
                 print(f"❌ Error loading {file_name}: {e}")
-        return {}
+        return None
+
+    def _load_json(self, file_name: str) -> dict:
+        """Tải từ điển JSON từ thư mục data."""
+        data = self._read_json(file_name)
+        return data if data is not None else {}
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Nạp lại các từ điển có file bị sửa, cập nhật trie tăng dần. True nếu có thay đổi."""
+        if self.watcher is None:
+            return False
+        reloaded = False
+        for path in self.watcher.changed(force):
+            file_name = os.path.basename(path)
+            data = self._read_json(file_name)
+            if data is None:
+                # File đang ghi dở hoặc lỗi cú pháp: giữ nguyên từ điển đang chạy
+                continue
+            dict_attr, matcher_attr = self.DICT_FILES[file_name]
+            added, removed, changed = getattr(self, matcher_attr).update(data)
+            setattr(self, dict_attr, data)
+            reloaded = True
+            print(f"🔄 Reloaded {file_name}: +{added} -{removed} ~{changed}")
+        if reloaded:
+            self.version += 1
+        return reloaded
 
     def _basic_normalize(self, text: str) -> str:
         """Chuẩn hóa: chuyển thường + NFC."""
@@ -42,85 +103,116 @@ class Preprocessor:
 
     def _remove_diacritics(self, text: str) -> str:
         """Loại bỏ dấu tiếng Việt để tương thích với parser."""
-        if not text:
-            return ""
-        nfkd = unicodedata.normalize('NFKD', text)
-        return ''.join(c for c in nfkd if unicodedata.category(c) != 'Mn')
+        return remove_diacritics(text)
 
-    def _apply_dict_translation(self, text: str, dictionary: dict) -> str:
+    def _apply_dict_translation(self, text: str, matcher: DictMatcher) -> str:
         """Áp dụng dịch từ điển với so khớp ranh giới từ."""
-        if not dictionary:
+        if not matcher:
             return text
-            
-        sorted_keys = sorted(dictionary.keys(), key=len, reverse=True)
-        for key in sorted_keys:
-            pattern = r'(?<!\w)' + re.escape(key) + r'(?!\w)'
-            matches = list(re.finditer(pattern, text, re.IGNORECASE))
-            
-            for match in reversed(matches):
-                start, end = match.span()
-                text = text[:start] + dictionary[key] + text[end:]
-        
-        return text
+        return matcher.translate(text)
     
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Chờ model tách từ nạp xong. Trả về True nếu đã sẵn sàng."""
+        return self.segmenter.wait_until_ready(timeout)
+
     def _segment_words(self, text: str) -> str:
-        """Tách từ sử dụng underthesea nếu có sẵn."""
-        if HAS_UNDERTHESEA:
-            try:
-                tokens = word_tokenize(text)
-                return " ".join(tokens).replace("_", " ")
-            except Exception:
-                pass
+        """Tách từ bằng backend đã chọn (mặc định underthesea)."""
+        if not self.segmenter.is_ready():
+            self.segmenter.warm_up()
+            if not self.block_on_segmenter:
+                return text
+            self.segmenter.wait_until_ready()
+        try:
+            tokens = self.segmenter.tokenize(text)
+            return " ".join(tokens).replace("_", " ")
+        except Exception:
+            pass
         return text
-    # Trong file preprocessor.py
+
+    def _translate(self, text: str) -> str:
+        """Chuẩn hóa + 3 tầng từ điển (phần chung của process và process_lite)."""
+        text = self._basic_normalize(text)
+        text = self._apply_dict_translation(text, self.ambiguity_matcher)
+        text = self._apply_dict_translation(text, self.en_vi_matcher)
+        text = self._apply_dict_translation(text, self.replace_matcher)
+        return text
+
+    def prepare(self, text: str) -> "PreprocessResult":
+        """Tiền xử lý theo tầng: các dạng lite/tách từ/không dấu chỉ tính khi cần, tối đa một lần."""
+        self.reload_if_changed()
+        return PreprocessResult(self, text)
 
     def process_lite(self, text: str) -> str:
         """[MỚI] Xử lý nhẹ: Chỉ sửa teencode/dấu, KHÔNG tách từ (để giữ format giờ 9:30)."""
-        if not text:
-            return ""
+        return self.prepare(text).lite
 
-        text = self._basic_normalize(text)
-        text = self._apply_dict_translation(text, self.ambiguity_dict)
-        text = self._apply_dict_translation(text, self.en_vi_dict)
-        text = self._apply_dict_translation(text, self.replace_dict)
-        
-        # [QUAN TRỌNG] KHÔNG GỌI self._segment_words(text) Ở ĐÂY
-        
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
     def process(self, text: str) -> str:
         """Pipeline: chuẩn hóa → nhập nhằng → anh-việt → teencode → tách từ."""
-        if not text:
-            return ""
-
-        text = self._basic_normalize(text)
-        text = self._apply_dict_translation(text, self.ambiguity_dict)
-        text = self._apply_dict_translation(text, self.en_vi_dict)
-        text = self._apply_dict_translation(text, self.replace_dict)
-        text = self._segment_words(text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        return text
+        return self.prepare(text).segmented
     
     def process_for_parsers(self, text: str) -> str:
         """Xử lý văn bản không dấu dành cho các parser."""
-        normalized = self.process(text)
-        return self._remove_diacritics(normalized)
+        return self.prepare(text).no_diacritics
 
     def humanize(self, text: Optional[str]) -> Optional[str]:
         """Khôi phục dấu từ tất cả các từ điển."""
         if not text:
             return text
         
-        text = self._apply_dict_translation(text, self.ambiguity_dict)
-        text = self._apply_dict_translation(text, self.en_vi_dict)
-        text = self._apply_dict_translation(text, self.replace_dict)
+        text = self._apply_dict_translation(text, self.ambiguity_matcher)
+        text = self._apply_dict_translation(text, self.en_vi_matcher)
+        text = self._apply_dict_translation(text, self.replace_matcher)
         
         return text
 
 
+class PreprocessResult:
+    """Kết quả tiền xử lý của một câu lệnh, mỗi dạng văn bản được tính lười và dùng chung."""
+
+    __slots__ = ("_preprocessor", "raw", "_translated", "_lite", "_segmented", "_no_diacritics")
+
+    def __init__(self, preprocessor: Preprocessor, raw: str):
+        self._preprocessor = preprocessor
+        self.raw = raw or ""
+        self._translated: Optional[str] = None
+        self._lite: Optional[str] = None
+        self._segmented: Optional[str] = None
+        self._no_diacritics: Optional[str] = None
+
+    @property
+    def translated(self) -> str:
+        """Văn bản đã chuẩn hóa và dịch từ điển (chưa gộp khoảng trắng)."""
+        if self._translated is None:
+            self._translated = self._preprocessor._translate(self.raw) if self.raw else ""
+        return self._translated
+
+    @property
+    def lite(self) -> str:
+        """Giống process_lite: KHÔNG tách từ (để giữ format giờ 9:30)."""
+        if self._lite is None:
+            self._lite = re.sub(r'\s+', ' ', self.translated).strip()
+        return self._lite
+
+    @property
+    def segmented(self) -> str:
+        """Giống process: có tách từ."""
+        if self._segmented is None:
+            text = self.translated
+            if text:
+                text = self._preprocessor._segment_words(text)
+            self._segmented = re.sub(r'\s+', ' ', text).strip()
+        return self._segmented
+
+    @property
+    def no_diacritics(self) -> str:
+        """Giống process_for_parsers: bản tách từ đã bỏ dấu."""
+        if self._no_diacritics is None:
+            self._no_diacritics = self._preprocessor._remove_diacritics(self.segmented)
+        return self._no_diacritics
+
+
 if __name__ == "__main__":
-    p = Preprocessor()
+    p = Preprocessor(block_on_segmenter=True)
     
     print("\n" + "="*120)
     print("🚀 TEST PREPROCESSOR")
@@ -0,0 +1,160 @@
+import calendar
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Hashable, Iterator, List, Optional, Tuple
+
+try:
+    from habit_parser import Frequency, RecurrenceRule
+    from result_cache import LRUCache
+except ImportError:
+    from nlp.habit_parser import Frequency, RecurrenceRule
+    from nlp.result_cache import LRUCache
+
+# Giờ mặc định của một lần lặp khi thói quen chỉ nói buổi ("mỗi tối") mà không có giờ cụ thể
+PERIOD_TIMES = {
+    "sáng": time(7, 0),
+    "trưa": time(12, 0),
+    "chiều": time(17, 0),
+    "tối": time(20, 0),
+    "đêm": time(22, 0),
+}
+
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def _week_index(d: date) -> int:
+    # Ngày 1 (0001-01-01) là thứ 2: mọi tuần tính từ thứ 2
+    return (d.toordinal() - 1) // 7
+
+
+def _clamped(year: int, month: int, day: int) -> date:
+    """Ngày `day` của tháng, lùi về ngày cuối tháng nếu tháng ngắn hơn (31 -> 30/4, 29/2 -> 28/2)."""
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def _phase(rule: RecurrenceRule, anchor: date) -> Hashable:
+    """Phần của ngày bắt đầu quyết định chuỗi ngày lặp (bỏ qua việc chuỗi bắt đầu từ đâu).
+
+    Các thói quen cùng luật và cùng pha sinh cùng một chuỗi ngày nên dùng chung cache:
+    "mỗi ngày" hay "mỗi t3 và t5" của hàng nghìn thói quen chỉ trải một lần mỗi tháng.
+    """
+    interval = rule.interval
+    if rule.frequency is Frequency.DAILY:
+        return anchor.toordinal() % interval
+    if rule.frequency is Frequency.WEEKLY:
+        return rule.weekdays or (anchor.weekday(),), _week_index(anchor) % interval
+    if rule.frequency is Frequency.MONTHLY:
+        return anchor.day, _month_index(anchor) % interval
+    return anchor.month, anchor.day, anchor.year % interval
+
+
+def _expand_month(rule: RecurrenceRule, phase: Hashable, year: int, month: int) -> Tuple[date, ...]:
+    """Các ngày lặp trong một tháng (chưa cắt theo ngày bắt đầu của thói quen)."""
+    interval = rule.interval
+    first = date(year, month, 1)
+    days = calendar.monthrange(year, month)[1]
+    if rule.frequency is Frequency.DAILY:
+        offset = (phase - first.toordinal()) % interval
+        return tuple(first + timedelta(days=i) for i in range(offset, days, interval))
+    if rule.frequency is Frequency.WEEKLY:
+        weekdays, week_phase = phase
+        result = []
+        for i in range(days):
+            d = first + timedelta(days=i)
+            if d.weekday() in weekdays and _week_index(d) % interval == week_phase:
+                result.append(d)
+        return tuple(result)
+    if rule.frequency is Frequency.MONTHLY:
+        day, month_phase = phase
+        if _month_index(first) % interval != month_phase:
+            return ()
+        return (_clamped(year, month, day),)
+    anchor_month, day, year_phase = phase
+    if month != anchor_month or year % interval != year_phase:
+        return ()
+    return (_clamped(year, month, day),)
+
+
+class RecurrenceExpander:
+    """Trải luật lặp thành các ngày cụ thể một cách lười, chỉ trong khoảng ngày được hỏi.
+
+    Kết quả được nhớ theo (luật, pha, tháng): lịch và vòng nhắc nhở hỏi "các lần lặp từ A đến B"
+    cho hàng nghìn thói quen mà không trải chuỗi vô hạn, và các thói quen cùng luật dùng chung một lần tính.
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache = LRUCache(cache_size)
+
+    def _month(self, rule: RecurrenceRule, phase: Hashable, year: int, month: int) -> Tuple[date, ...]:
+        # Buổi trong ngày không đổi các ngày lặp: không đưa vào khóa
+        key = (rule.frequency, rule.interval, phase, year, month)
+        days = self.cache.get(key)
+        if days is None:
+            days = _expand_month(rule, phase, year, month)
+            self.cache.put(key, days)
+        return days
+
+    def iter_occurrences(self, rule: RecurrenceRule, anchor: date, start: Optional[date] = None) -> Iterator[date]:
+        """Các ngày lặp từ max(anchor, start) trở đi, tăng dần. Chuỗi vô hạn: người gọi tự dừng."""
+        start = max(anchor, start) if start is not None else anchor
+        phase = _phase(rule, anchor)
+        index = _month_index(start)
+        while True:
+            year, month = divmod(index, 12)
+            for d in self._month(rule, phase, year, month + 1):
+                if d >= start:
+                    yield d
+            index += 1
+
+    def between(self, rule: RecurrenceRule, anchor: date, start: date, end: date) -> List[date]:
+        """Các ngày lặp trong [start, end] (tính cả hai đầu), không trước ngày bắt đầu anchor."""
+        start = max(anchor, start)
+        if start > end:
+            return []
+        phase = _phase(rule, anchor)
+        result: List[date] = []
+        for index in range(_month_index(start), _month_index(end) + 1):
+            year, month = divmod(index, 12)
+            for d in self._month(rule, phase, year, month + 1):
+                if start <= d <= end:
+                    result.append(d)
+        return result
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+
+def rule_for_habit(frequency: Optional[str], recurrence: Optional[str] = None) -> Optional[RecurrenceRule]:
+    """Luật lặp của một dòng trong bảng habits: cột recurrence (JSON) nếu có, không thì theo cột frequency."""
+    try:
+        if recurrence:
+            return RecurrenceRule.from_dict(json.loads(recurrence))
+        return RecurrenceRule(Frequency(frequency)) if frequency else None
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def occurrence_time(rule: RecurrenceRule, execution_time: Optional[str] = None) -> Optional[time]:
+    """Giờ của mỗi lần lặp: giờ thực hiện "HH:MM" nếu có, không thì giờ mặc định theo buổi; None = cả ngày."""
+    if execution_time:
+        try:
+            return datetime.strptime(execution_time.strip()[:5], "%H:%M").time()
+        except ValueError:
+            pass
+    return PERIOD_TIMES.get(rule.period) if rule.period else None
+
+
+if __name__ == "__main__":
+    from habit_parser import HabitParser
+
+    parser = HabitParser()
+    expander = RecurrenceExpander()
+    today = date.today()
+    for text in ["chạy bộ mỗi sáng", "học tiếng anh mỗi t3 và t5", "tưới cây mỗi 3 ngày",
+                 "trả tiền nhà mỗi tháng", "họp team hàng tuần", "đi du lịch hàng năm"]:
+        rule = parser.parse(text)["recurrence"]
+        days = expander.between(rule, today, today, today + timedelta(days=27))
+        print(f"{text:<30} | {rule.to_dict()} | {', '.join(d.strftime('%d/%m') for d in days[:8])}")
+    print(f"📊 Cache: {expander.cache_stats()}")
@@ -0,0 +1,162 @@
+import importlib.util
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set, Type
+
+# Backend mặc định, có thể đổi theo môi trường triển khai: NLP_SEGMENTER=longest_match
+DEFAULT_SEGMENTER = os.environ.get("NLP_SEGMENTER", "underthesea")
+
+# underthesea nạp model rất nặng: chỉ kiểm tra có cài hay không, việc import để luồng nền lo
+HAS_UNDERTHESEA = importlib.util.find_spec("underthesea") is not None
+
+
+class Segmenter:
+    """Giao diện chung cho các backend tách từ (mặc định: không tách, chỉ cắt theo khoảng trắng)."""
+
+    name = "none"
+
+    def warm_up(self) -> None:
+        """Bắt đầu nạp tài nguyên (nếu có), không chặn."""
+
+    def is_ready(self) -> bool:
+        return True
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Chờ backend sẵn sàng. Trả về True nếu đã sẵn sàng."""
+        return True
+
+    def tokenize(self, text: str) -> List[str]:
+        """Tách câu thành danh sách từ, từ ghép giữ khoảng trắng bên trong (vd: 'siêu thị')."""
+        return text.split()
+
+
+class UndertheseaSegmenter(Segmenter):
+    """underthesea.word_tokenize, model được nạp một lần cho cả tiến trình ở luồng nền."""
+
+    name = "underthesea"
+
+    _word_tokenize = None
+    _ready = threading.Event()
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def _load(cls) -> None:
+        """Import underthesea và chạy thử một câu để nạp model vào bộ nhớ."""
+        try:
+            from underthesea import word_tokenize
+            word_tokenize("khởi động")
+            cls._word_tokenize = staticmethod(word_tokenize)
+        except Exception as e:
+            print(f"❌ Error loading underthesea: {e}")
+        finally:
+            cls._ready.set()
+
+    def warm_up(self) -> None:
+        """Bắt đầu nạp underthesea ở luồng nền (gọi nhiều lần cũng chỉ nạp một lần)."""
+        cls = type(self)
+        with cls._lock:
+            if cls._thread is None:
+                cls._thread = threading.Thread(target=cls._load, name="underthesea-warmup", daemon=True)
+                cls._thread.start()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        self.warm_up()
+        return self._ready.wait(timeout)
+
+    def tokenize(self, text: str) -> List[str]:
+        if self._word_tokenize is None:
+            return text.split()
+        return self._word_tokenize(text)
+
+
+class LongestMatchSegmenter(Segmenter):
+    """Tách từ thuần Python: so khớp dài nhất theo âm tiết với từ vựng lấy từ nlp/data."""
+
+    name = "longest_match"
+
+    # Gần với cách underthesea tách âm tiết: giữ nguyên email, số thập phân, ngày tháng,
+    # tách số khỏi đơn vị ("9h" -> "9", "h") và tách dấu câu
+    TOKEN_PATTERN = re.compile(
+        r"\S+@\S+\.\w+"
+        r"|\d+(?:[./]\d+)+"
+        r"|\d+"
+        r"|[^\W\d]\w*(?:-\w+)*"
+        r"|\.\.\."
+        r"|[^\w\s]"
+    )
+    # words.json: từ ghép thông dụng; locations.json: tên địa điểm nhiều âm tiết
+    DATA_FILES = ["words.json", "locations.json"]
+
+    def __init__(self, data_dir: Optional[str] = None, vocabulary: Optional[Set[str]] = None):
+        if data_dir is None:
+            data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        self.vocabulary: Set[str] = vocabulary if vocabulary is not None else self._load_vocabulary(data_dir)
+        self.max_syllables = max((w.count(" ") + 1 for w in self.vocabulary), default=1)
+
+    def _load_vocabulary(self, data_dir: str) -> Set[str]:
+        """Gom mọi cụm nhiều âm tiết trong các file dữ liệu."""
+        vocabulary = set()
+        for file_name in self.DATA_FILES:
+            path = os.path.join(data_dir, file_name)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"❌ Error loading {file_name}: {e}")
+                continue
+
+            if isinstance(data, dict):
+                entries = []
+                for key, value in data.items():
+                    entries.append(key)
+                    entries.extend(value if isinstance(value, list) else [value])
+            else:
+                entries = data
+
+            for entry in entries:
+                if isinstance(entry, str):
+                    words = entry.lower().split()
+                    if len(words) > 1:
+                        vocabulary.add(" ".join(words))
+        return vocabulary
+
+    def tokenize(self, text: str) -> List[str]:
+        tokens = self.TOKEN_PATTERN.findall(text)
+        result = []
+        i = 0
+        n = len(tokens)
+        while i < n:
+            size = min(self.max_syllables, n - i)
+            while size > 1:
+                candidate = " ".join(tokens[i:i + size])
+                if candidate.lower() in self.vocabulary:
+                    break
+                size -= 1
+            result.append(" ".join(tokens[i:i + size]))
+            i += size
+        return result
+
+
+SEGMENTERS: Dict[str, Type[Segmenter]] = {
+    Segmenter.name: Segmenter,
+    UndertheseaSegmenter.name: UndertheseaSegmenter,
+    LongestMatchSegmenter.name: LongestMatchSegmenter,
+}
+
+
+def get_segmenter(name: Optional[str] = None) -> Segmenter:
+    """Tạo backend tách từ theo tên. Thiếu underthesea thì dùng longest_match thay thế."""
+    name = name or DEFAULT_SEGMENTER
+    if name not in SEGMENTERS:
+        raise ValueError(f"Unknown segmenter '{name}'. Available: {', '.join(SEGMENTERS)}")
+    if name == UndertheseaSegmenter.name and not HAS_UNDERTHESEA:
+        name = LongestMatchSegmenter.name
+    return SEGMENTERS[name]()
@@ -0,0 +1,46 @@
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Optional
+
+
+def _build_diacritics_table() -> Dict[int, Optional[str]]:
+    """Bảng str.translate: chữ có dấu (Latin + toàn bộ bảng chữ cái tiếng Việt) -> chữ không dấu."""
+    table: Dict[int, Optional[str]] = {}
+    ranges = [
+        (0x00A0, 0x0250),  # Latin-1 Supplement, Latin Extended-A/B (à, â, ă, ơ, ư... và NBSP, ², ½)
+        (0x1E00, 0x1F00),  # Latin Extended Additional (ạ, ả, ấ, ầ, ẩ, ẫ, ậ...)
+    ]
+    for start, end in ranges:
+        for code in range(start, end):
+            ch = chr(code)
+            nfkd = unicodedata.normalize("NFKD", ch)
+            base = "".join(c for c in nfkd if unicodedata.category(c) != "Mn")
+            if base != ch:
+                table[code] = base
+    # đ/Đ không có dạng tách dấu trong Unicode nên phải khai báo riêng
+    table[ord("đ")] = "d"
+    table[ord("Đ")] = "D"
+    # Dấu kết hợp rời (văn bản dạng NFD)
+    for code in range(0x0300, 0x0370):
+        table[code] = None
+    return table
+
+
+DIACRITICS_TABLE = _build_diacritics_table()
+
+# Chuỗi ngắn (tên địa điểm, khóa nhóm...) lặp lại rất nhiều nên được cache
+_CACHE_MAX_LEN = 64
+
+
+@lru_cache(maxsize=4096)
+def _remove_diacritics_cached(text: str) -> str:
+    return text.translate(DIACRITICS_TABLE)
+
+
+def remove_diacritics(text: Optional[str]) -> str:
+    """Bỏ dấu tiếng Việt (kể cả đ/Đ -> d/D) bằng bảng translate tính sẵn."""
+    if not text:
+        return ""
+    if len(text) <= _CACHE_MAX_LEN:
+        return _remove_diacritics_cached(text)
+    return text.translate(DIACRITICS_TABLE)
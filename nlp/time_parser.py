@@ -1,10 +1,152 @@
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
+from typing import Dict, List, Optional, Tuple
 import re
+import threading
+
+# =========================================================================
+# LEXER: tách câu (đã chuẩn hóa) thành token một lần, mọi parser con dùng chung
+# =========================================================================
+# Loại token: số, đơn vị, buổi, thứ, từ chỉ ngày tương đối, từ nhắc nhở, từ khác, dấu câu
+NUM = "num"
+UNIT = "unit"
+PERIOD = "period"
+WEEKDAY = "weekday"
+RELATIVE = "relative"
+CUE = "cue"
+WORD = "word"
+PUNCT = "punct"
+
+_TOKEN_PATTERN = re.compile(r"(\d+(?:\.\d+)?)|([^\W\d_]+)|(\S)")
+
+WORD_KINDS = {
+    **dict.fromkeys(["h", "g", "giờ", "tiếng", "phút", "p", "ph"], UNIT),
+    **dict.fromkeys(["sáng", "trưa", "chiều", "tối", "đêm"], PERIOD),
+    **dict.fromkeys(["thứ", "cn"], WEEKDAY),
+    **dict.fromkeys(["nay", "mai", "mốt", "kia", "qua"], RELATIVE),
+    **dict.fromkeys(["nhắc", "báo", "gọi", "alarm", "nhac", "bao"], CUE),
+}
+
+CUE_PREFIXES = ("nhắc", "báo", "gọi", "alarm", "nhac", "bao")
+REMINDER_ADVERBS = {"trước", "sớm", "sau", "lại", "truoc", "som", "lai"}
+REMINDER_UNITS = {"phút", "p", "ph", "tiếng", "giờ", "h", "g"}
+MINUTE_UNITS = {"phút", "p", "ph"}
+DURATION_MARKERS = ("sau", "trong", "khoảng")
+START_PREFIXES = {"lúc": 1, "vào": 1, "từ": 1, "bắt": 2, "kể": 2}
+RANGE_ENDS = [("đến",), ("tới",), ("kết", "thúc", "lúc"), ("xong", "lúc")]
+SINCE_PHRASES = [("nãy", "giờ"), ("tới", "giờ"), ("đến", "giờ"), ("tới", "nay"), ("từ", "nãy")]
+NEXT_WEEK_PHRASES = [("tuần", "sau"), ("tuần", "tới")]
+RELATIVE_DATES = [
+    ([("hôm", "nay"), ("bữa", "nay")], 0),
+    ([("ngày", "mai"), ("sáng", "mai"), ("chiều", "mai"), ("tối", "mai")], 1),
+    ([("mốt",), ("ngày", "kia")], 2),
+    ([("hôm", "qua")], -1),
+    ([("tuần", "sau"), ("tuần", "tới")], 'weeks:1'),
+    ([("tháng", "sau")], 'months:1'),
+    ([("năm", "sau")], 'years:1'),
+]
+# Lọc nhanh: câu không có các từ này thì không cần tìm thứ / ngày tương đối
+WEEKDAY_WORDS = {"thứ", "chủ", "cn"}
+RELATIVE_WORDS = {"nay", "mai", "mốt", "kia", "qua", "sau", "tới"}
+
+# Cổng lọc trước: giờ / thời lượng / nhắc trước đều cần một con số ("half past two" được đổi thành số khi chuẩn hóa)
+_TIME_GATE = re.compile(r"\d|half past")
+# Không có số thì chỉ còn ngày (thứ / ngày tương đối) có thể đọc được
+_DATE_GATE = re.compile("thứ|chủ nhật|cn|nay|mai|mốt|kia|qua|sau|tới")
+# Các cách nói thời gian không cần số trong mention_pattern (buổi, ngày, "nãy giờ", "lát nữa"...).
+# Dùng trên text.casefold(): nhanh hơn nhiều so với re.IGNORECASE
+_MENTION_GATE = re.compile(r"\d|thứ|chủ nhật|cn|nay|mai|mốt|kia|qua|sau|tới|sáng|trưa|chiều|tối|đêm|nãy|lát")
+
+
+def _is_word_char(ch: str) -> bool:
+    """Tương đương với \\w của regex Unicode."""
+    return ch.isalnum() or ch == "_"
+
+
+def _lead2(num: str) -> int:
+    """\\d{1,2} đặt ở đầu số: tối đa 2 chữ số đầu tiên."""
+    return int(num.split(".", 1)[0][:2])
+
+
+def _tail2(num: str) -> int:
+    """\\d{1,2} đứng ngay trước đơn vị: tối đa 2 chữ số cuối cùng."""
+    return int(num.rsplit(".", 1)[-1][-2:])
+
+
+class TimeTokens:
+    """Câu đã chuẩn hóa + danh sách token (kind, text, start, end)."""
+
+    __slots__ = ("text", "tokens", "words")
+
+    def __init__(self, text: str):
+        self.text = text
+        tokens = []
+        append = tokens.append
+        for m in _TOKEN_PATTERN.finditer(text):
+            word = m.group()
+            start, end = m.span()
+            kind = m.lastindex
+            if kind == 2:
+                append((WORD_KINDS.get(word, WORD), word, start, end))
+            else:
+                append((NUM if kind == 1 else PUNCT, word, start, end))
+        self.tokens = tokens
+        self.words = {token[1] for token in tokens}
+
+    def spaced(self, i: int) -> bool:
+        """Có khoảng trắng giữa token i-1 và token i (\\s+)."""
+        return self.tokens[i][2] > self.tokens[i - 1][3]
+
+    def space_after(self, i: int) -> bool:
+        """Ngay sau token i là khoảng trắng (\\s+)."""
+        end = self.tokens[i][3]
+        return end < len(self.text) and self.text[end].isspace()
+
+    def boundary_before(self, i: int) -> bool:
+        """Có ranh giới từ (\\b) ngay trước token i."""
+        start = self.tokens[i][2]
+        return start == 0 or not _is_word_char(self.text[start - 1])
+
+    def phrase_at(self, i: int, words: Tuple[str, ...]) -> bool:
+        """Các token từ i trở đi là đúng cụm words, cách nhau đúng một dấu cách."""
+        tokens = self.tokens
+        if i + len(words) > len(tokens):
+            return False
+        for k, word in enumerate(words):
+            if tokens[i + k][1] != word:
+                return False
+            if k and self.text[tokens[i + k - 1][3]:tokens[i + k][2]] != " ":
+                return False
+        return True
+
+    def has_phrase(self, words: Tuple[str, ...]) -> bool:
+        """Cụm từ xuất hiện nguyên vẹn (các từ cách nhau đúng một dấu cách)."""
+        if words[0] not in self.words or words[-1] not in self.words:
+            return False
+        return any(self.phrase_at(i, words) for i, token in enumerate(self.tokens) if token[1] == words[0])
+
+    def without(self, start: int, end: int) -> "TimeTokens":
+        """Bản sao với đoạn [start, end) thay bằng một khoảng trắng (không tách lại nếu không cắt ngang token)."""
+        text = self.text[:start] + " " + self.text[end:]
+        if any(s < start < e or s < end < e for _, _, s, e in self.tokens):
+            return TimeTokens(text)
+        shift = end - start - 1
+        result = TimeTokens.__new__(TimeTokens)
+        result.text = text
+        result.tokens = [t for t in self.tokens if t[3] <= start] + [
+            (kind, word, s - shift, e - shift) for kind, word, s, e in self.tokens if s >= end
+        ]
+        result.words = {token[1] for token in result.tokens}
+        return result
 
 
 class TimeParser:
     """Parser xử lý thời gian từ câu tiếng Việt tự nhiên."""
+
+    _KEM_PATTERN = re.compile(r'(\d{1,2})\s*(?:giờ|h|g)?\s*kém\s*(\d{1,2})')
+    _TIENG_RUOI_PATTERN = re.compile(r'(\d+)\s*tiếng\s*rưỡi')
+    _GIO_RUOI_PATTERN = re.compile(r'(\d+)\s*(?:giờ|h|g)?\s*rưỡi')
+    _ISH_PATTERN = re.compile(r'(\d+)-?ish')
     
     def __init__(self):
         self.num_map = {
@@ -19,6 +161,59 @@ class TimeParser:
             "thứ sáu": 4, "thứ 6": 4, "t6": 4, "thứ bảy": 5, "thứ 7": 5, "t7": 5,
             "chủ nhật": 6, "cn": 6
         }
+
+        self.mention_pattern = self._build_mention_pattern()
+        # Số lần gọi / số lần cổng lọc trước bỏ qua được (xem stats())
+        self.counters = {"parse": 0, "parse_date_only": 0, "parse_skipped": 0, "find_spans": 0, "find_spans_skipped": 0}
+        # parse/find_spans được gọi từ nhiều luồng (AsyncNLPEngine): "+= 1" trên dict không nguyên tử
+        self._counters_lock = threading.Lock()
+
+    def _count(self, *names: str) -> None:
+        with self._counters_lock:
+            for name in names:
+                self.counters[name] += 1
+
+    def _build_mention_pattern(self) -> re.Pattern:
+        """Mọi cách nói thời gian trong câu gốc (giờ, buổi, ngày, thứ, thời lượng, nhắc trước...)."""
+        unit_pattern = r"(?:giờ|h|g|:)"
+        patterns = [
+            rf"\b(?:vào|lúc|vào lúc)\s+\d{{1,2}}\s*{unit_pattern}\s*\d{{0,2}}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?",
+            r"\b(?:vào|lúc|vào lúc)?\s*\d{1,2}:\d{1,2}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?",
+            rf"\b(?:trước|sau|tầm|khoảng|từ|đến|kéo dài|trong)\s+\d{{1,2}}\s*{unit_pattern}\s*\d{{0,2}}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?(?:\s*kém\s*\d+)?",
+            rf"\d{{1,2}}\s*{unit_pattern}\s*\d{{0,2}}(?:\s*(?:sáng|trưa|chiều|tối|đêm))?(?:\s*kém\s*\d+)?(?:\s*rưỡi)?",
+            r"\bkém\s*\d+(?:\s*(?:phút|p))?",
+            r"\b(?:hôm nay|bữa nay|ngày mai|sáng mai|chiều mai|tối mai|mốt|kia|hôm qua)\b",
+            r"\b(?:hom nay|bua nay|ngay mai|sang mai|chieu mai|toi mai|hom qua)\b",
+            r"\b(?:tuần sau|tháng sau|năm sau)\b",
+            r"(?<!buổi\s)\b(?:sáng|trưa|chiều|tối|đêm)\b",
+            r"(?<!buổi\s)\b(?:mai|nay)\b",
+            r"\b(?:thứ)\s+(?:\d+|hai|ba|tư|năm|sáu|bảy)\b",
+            r"\b(?:chủ nhật|cn)\b",
+            r"\b(?:nãy giờ|tới giờ|ban nãy|lát nữa|sắp tới)\b",
+            r"\bbuổi\s+(?:sáng|trưa|chiều|tối|đêm)\b",
+            r"\b\d+\s*(?:tiếng|phút|p|h|giờ)\b",
+            r"(?:nhắc|báo|gọi|alarm|nhac|bao)\s*(?:tôi|mình|me)?\s*(?:trước|sớm|lại|truoc|som|\s)*\d+(?:\.\d+)?\s*(?:phút|p|ph|tiếng|giờ|h|g)",
+            r"(?:sau|trong|khoảng)\s+\d+(?:\s*(?:phút|giờ|tiếng))+\s+(?:nữa)?\s*(?:nhắc|báo|gọi|alarm|nhac|bao)?"
+        ]
+        # Gộp thành một regex: quét câu một lần, tại mỗi vị trí pattern đứng trước được ưu tiên
+        return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+    def find_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Vị trí (start, end) các cụm chỉ thời gian trong text."""
+        if not _MENTION_GATE.search(text.casefold()):
+            self._count("find_spans", "find_spans_skipped")
+            return []
+        self._count("find_spans")
+        return [m.span() for m in self.mention_pattern.finditer(text)]
+
+    def stats(self) -> Dict[str, int]:
+        """Số lần gọi parse/find_spans và số lần cổng lọc trước cho phép bỏ qua.
+
+        - parse_date_only: câu không có số, chỉ đọc ngày (bỏ qua giờ, thời lượng, nhắc trước).
+        - parse_skipped: câu không có số lẫn từ chỉ ngày, trả kết quả mặc định ngay (không tách token).
+        """
+        with self._counters_lock:
+            return dict(self.counters)
     
     def _normalize_text(self, text: str) -> str:
         text = text.lower()
@@ -37,7 +232,9 @@ class TimeParser:
         return text
     
     def _normalize_kem(self, text: str) -> str:
-        match = re.search(r'(\d{1,2})\s*(?:giờ|h|g)?\s*kém\s*(\d{1,2})', text)
+        if "kém" not in text:
+            return text
+        match = self._KEM_PATTERN.search(text)
         if not match:
             return text
         h = int(match.group(1))
@@ -47,26 +244,45 @@ class TimeParser:
         return text.replace(match.group(0), f"{target_h}:{target_m}")
     
     def _normalize_ruoi(self, text: str) -> str:
-        text = re.sub(r'(\d+)\s*tiếng\s*rưỡi', r'\1.5 tiếng', text)
-        text = re.sub(r'(\d+)\s*(?:giờ|h|g)?\s*rưỡi', r'\1:30', text)
+        if "rưỡi" not in text:
+            return text
+        text = self._TIENG_RUOI_PATTERN.sub(r'\1.5 tiếng', text)
+        text = self._GIO_RUOI_PATTERN.sub(r'\1:30', text)
         return text
     
     def _normalize_ish(self, text: str) -> str:
-        return re.sub(r'(\d+)-?ish', r'\1:00', text)
+        if "ish" not in text:
+            return text
+        return self._ISH_PATTERN.sub(r'\1:00', text)
+
+    def tokenize(self, text: str) -> TimeTokens:
+        """Chuẩn hóa rồi tách token một lần; các bước phân tích bên dưới chỉ đọc danh sách token này."""
+        return TimeTokens(self._normalize_text(text))
     
-    def _parse_time_str(self, time_str: str, context_text: str = "") -> dict:
-        match = re.search(r'(\d{1,2})\s*(?::|h|g|giờ)\s*(\d{1,2})?', time_str)
-        
-        if not match:
-            if "lúc" in context_text or "vào" in context_text or ":" in time_str:
-                match = re.search(r'(\d{1,2})', time_str)
-                if match:
-                    return self._adjust_am_pm(int(match.group(1)), 0, context_text)
+    def _parse_time_tokens(self, tt: TimeTokens, lo: int, hi: int) -> dict:
+        """Giờ đầu tiên trong tokens[lo:hi]: số + (:|h|g|giờ) + phút (nếu có)."""
+        tokens, text = tt.tokens, tt.text
+        for i in range(lo, hi - 1):
+            kind, num, _, _ = tokens[i]
+            if kind != NUM:
+                continue
+            unit_kind, unit, _, _ = tokens[i + 1]
+            if unit != ":" and (unit_kind in (NUM, PUNCT) or unit[0] not in "hg"):
+                continue
+            # "giờ" chỉ khớp tới chữ "g" nên không đọc phút phía sau (giữ đúng hành vi cũ)
+            m = 0
+            if unit in (":", "h", "g") and i + 2 < hi and tokens[i + 2][0] == NUM:
+                m = _lead2(tokens[i + 2][1])
+            return self._adjust_am_pm(_tail2(num), m, text)
+
+        if lo >= hi:
             return None
-        
-        h = int(match.group(1))
-        m = int(match.group(2)) if match.group(2) else 0
-        return self._adjust_am_pm(h, m, context_text)
+        time_str = text[tokens[lo][2]:tokens[hi - 1][3]]
+        if "lúc" in text or "vào" in text or ":" in time_str:
+            for i in range(lo, hi):
+                if tokens[i][0] == NUM:
+                    return self._adjust_am_pm(_lead2(tokens[i][1]), 0, text)
+        return None
     
     def _adjust_am_pm(self, h: int, m: int, text: str) -> dict:
         text = text.lower()
@@ -81,58 +297,100 @@ class TimeParser:
             return {'hour': h, 'minute': m}
         return None
     
-    def _parse_duration_str(self, text: str) -> timedelta:
+    def _parse_duration(self, tt: TimeTokens) -> timedelta:
+        """Cộng dồn mọi cụm "số + đơn vị" (không phải giờ bắt đầu hay giờ nhắc)."""
         hours = minutes = 0
         found = False
+        tokens, text = tt.tokens, tt.text
         
-        for match in re.finditer(r'(\d+(?:\.\d+)?)\s+(tiếng|giờ|h|g|phút|p|ph)\b', text):
-            val = float(match.group(1))
-            unit = match.group(2)
+        for i in range(len(tokens) - 1):
+            if tokens[i][0] != NUM or not tt.spaced(i + 1):
+                continue
+            unit = tokens[i + 1][1]
+            unit_end = tokens[i + 1][3]
+            if unit not in REMINDER_UNITS or (unit_end < len(text) and _is_word_char(text[unit_end])):
+                continue
+            val = float(tokens[i][1])
             
-            if self._is_reminder_context(text, match):
+            if self._is_reminder_context(tt, i, i + 1):
                 continue
             
-            if unit in ['phút', 'p', 'ph']:
+            if unit in MINUTE_UNITS:
                 minutes += int(val)
                 found = True
-            elif unit in ['tiếng']:
+            elif unit == 'tiếng':
+                hours += int(val)
+                minutes += int((val - int(val)) * 60)
+                found = True
+            elif self._is_duration_context(text, tokens[i][2], unit_end):
                 hours += int(val)
                 minutes += int((val - int(val)) * 60)
                 found = True
-            elif unit in ['giờ', 'h', 'g']:
-                if self._is_duration_context(text, match):
-                    hours += int(val)
-                    minutes += int((val - int(val)) * 60)
-                    found = True
         
         return timedelta(hours=hours, minutes=minutes) if found else None
     
-    def _is_reminder_context(self, text: str, match) -> bool:
-        start_idx = max(0, match.start() - 30)
-        end_idx = min(len(text), match.end() + 30)
-        
-        pre_text = text[start_idx:match.start()]
-        post_text = text[match.end():end_idx]
-        full_context = text[start_idx:end_idx]
-        
-        if re.search(r'\b(?:nhắc|báo|gọi|alarm|nhac|bao)\b', pre_text, re.IGNORECASE):
-            return True
-        
-        if re.search(r'\b(?:nhắc|báo|gọi|alarm|nhac|bao)\b', post_text, re.IGNORECASE):
-            return True
-        
-        if re.search(
-            r'(?:sau|trong|khoảng)\s+\d+(?:\s*(?:phút|giờ|tiếng))+\s+(?:nữa)?\s*(?:nhắc|báo|gọi|alarm|nhac|bao)',
-            full_context, re.IGNORECASE
-        ):
-            return True
+    def _is_reminder_context(self, tt: TimeTokens, i_num: int, i_unit: int) -> bool:
+        tokens = tt.tokens
+        match_start, match_end = tokens[i_num][2], tokens[i_unit][3]
+        start_idx = max(0, match_start - 30)
+        end_idx = min(len(tt.text), match_end + 30)
+        
+        # Từ nhắc nhở trong 30 ký tự trước hoặc sau
+        for kind, _, start, end in tokens:
+            if kind == CUE and (start_idx <= start and end <= match_start or match_end <= start and end <= end_idx):
+                return True
+        
+        # "sau/trong/khoảng N phút/giờ/tiếng (nữa) nhắc..." nằm gọn trong cửa sổ
+        for i, (_, word, _, end) in enumerate(tokens):
+            if end > end_idx:
+                break
+            marker = next((m for m in DURATION_MARKERS if word.endswith(m)), None)
+            if marker is None or end - len(marker) < start_idx:
+                continue
+            k = self._match_amount(tt, i + 1)
+            cue = self._match_cue(tt, k) if k is not None else None
+            if cue is None:
+                continue
+            cue_word = tokens[cue][1]
+            if tokens[cue][2] + next(len(c) for c in CUE_PREFIXES if cue_word.startswith(c)) <= end_idx:
+                return True
         
         return False
+
+    def _match_amount(self, tt: TimeTokens, i: int) -> Optional[int]:
+        """Cụm "N phút/giờ/tiếng" (N nguyên, có thể lặp đơn vị) bắt đầu ở token i. Trả về chỉ số token ngay sau cụm."""
+        tokens = tt.tokens
+        if i + 1 >= len(tokens) or tokens[i][0] != NUM or not tt.spaced(i) or "." in tokens[i][1]:
+            return None
+        k = i + 1
+        while k < len(tokens) and tokens[k][1] in ("phút", "giờ", "tiếng"):
+            k += 1
+        if k == i + 1 or not tt.space_after(k - 1):
+            return None
+        return k
+
+    def _match_reminder_amount(self, tt: TimeTokens, i: int) -> bool:
+        """Cụm "N <đơn vị>" theo sau là khoảng trắng, bắt đầu ở token i."""
+        tokens = tt.tokens
+        return (
+            i + 1 < len(tokens) and tokens[i][0] == NUM and tt.spaced(i)
+            and tokens[i + 1][1] in REMINDER_UNITS and tt.space_after(i + 1)
+        )
+
+    def _match_cue(self, tt: TimeTokens, k: int) -> Optional[int]:
+        """Từ nhắc nhở (có thể sau "nữa") bắt đầu ở token k. Trả về chỉ số token nhắc nhở."""
+        tokens = tt.tokens
+        if k < len(tokens) and tokens[k][1] == "nữa":
+            if k + 1 < len(tokens) and tokens[k + 1][1].startswith(CUE_PREFIXES):
+                return k + 1
+        if k < len(tokens) and tokens[k][1].startswith(CUE_PREFIXES):
+            return k
+        return None
     
-    def _is_duration_context(self, text: str, match) -> bool:
-        start_idx = max(0, match.start() - 30)
-        pre_text = text[start_idx:match.start()]
-        post_text = text[match.end():match.end() + 20]
+    def _is_duration_context(self, text: str, start: int, end: int) -> bool:
+        start_idx = max(0, start - 30)
+        pre_text = text[start_idx:start]
+        post_text = text[end:end + 20]
         
         if any(x in pre_text for x in ['trong', 'khoảng', 'tầm', 'mất', 'dài', 'chừng', 'kéo dài']):
             return True
@@ -142,60 +400,94 @@ class TimeParser:
         
         return False
     
-    def _extract_reminder(self, text: str) -> int:
-        patterns = [
-            r"\b(?:nhắc|báo|gọi|alarm|nhac|bao)(?:\s+(?:tôi|mình|me))?\s+(?:trước|sớm|sau|lại|truoc|som|lai)\s+(\d+(?:\.\d+)?)\s*(phút|p|ph|tiếng|giờ|h|g)",
-            r"\b(?:nhắc|báo|gọi|alarm|nhac|bao).*?(?:sau|trong|khoảng)\s+(\d+(?:\.\d+)?)\s*(phút|p|ph|tiếng|giờ|h|g)\s+(?:nữa)?",
-            r"(?:sau|trong|khoảng)\s+(\d+(?:\.\d+)?)\s*(phút|p|ph|tiếng|giờ|h|g)\s+(?:nữa)?\s*(?:nhắc|báo|gọi|alarm|nhac|bao)"
-        ]
+    def _extract_reminder(self, tt: TimeTokens) -> int:
+        """Số phút nhắc trước: "nhắc trước 15p", "nhắc ... sau 5 phút nữa", "sau 5 phút nữa nhắc"."""
+        # Mọi mẫu đều cần một từ nhắc nhở và một con số
+        if not any(cue in tt.text for cue in CUE_PREFIXES) or not any(token[0] == NUM for token in tt.tokens):
+            return None
+        tokens = tt.tokens
+        n = len(tokens)
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return self._extract_reminder_value(match, text)
+        # nhắc (tôi) trước/sớm/sau... N phút
+        for i, (_, word, _, _) in enumerate(tokens):
+            if word not in CUE_PREFIXES or not tt.boundary_before(i):
+                continue
+            k = i + 1
+            if k < n and tokens[k][1] in ("tôi", "mình", "me") and tt.spaced(k) and k + 1 < n and tokens[k + 1][1] in REMINDER_ADVERBS:
+                k += 1
+            if not (k + 2 < n and tokens[k][1] in REMINDER_ADVERBS and tt.spaced(k) and tokens[k + 1][0] == NUM and tt.spaced(k + 1)):
+                continue
+            unit = tokens[k + 2][1]
+            val = float(tokens[k + 1][1])
+            if unit[0] == "p":
+                return int(val)
+            if unit.startswith("tiếng") or unit[0] in "gh":
+                return int(val * 60)
+        
+        # nhắc ... sau/trong/khoảng N phút
+        cue = next((i for i, token in enumerate(tokens) if token[1].startswith(CUE_PREFIXES) and tt.boundary_before(i)), None)
+        if cue is not None:
+            cue_word = tokens[cue][1]
+            after_cue = tokens[cue][2] + next(len(c) for c in CUE_PREFIXES if cue_word.startswith(c))
+            for j in range(cue, n):
+                word, end = tokens[j][1], tokens[j][3]
+                marker = next((m for m in DURATION_MARKERS if word.endswith(m)), None)
+                if marker is None or end - len(marker) < after_cue:
+                    continue
+                if not self._match_reminder_amount(tt, j + 1):
+                    continue
+                has_adverb = any(tokens[x][1] in REMINDER_ADVERBS for x in range(cue, j + 3))
+                return self._reminder_value(tokens[j + 1][1], tokens[j + 2][1], has_adverb)
+        
+        # sau/trong/khoảng N phút (nữa) nhắc
+        for j in range(n):
+            word = tokens[j][1]
+            marker = next((m for m in DURATION_MARKERS if word.endswith(m)), None)
+            if marker is None:
+                continue
+            if not self._match_reminder_amount(tt, j + 1):
+                continue
+            cue = self._match_cue(tt, j + 3)
+            if cue is None:
+                continue
+            has_adverb = marker == "sau" or any(tokens[x][1] in REMINDER_ADVERBS for x in range(j + 1, cue))
+            return self._reminder_value(tokens[j + 1][1], tokens[j + 2][1], has_adverb)
         
         return None
     
-    def _extract_reminder_value(self, match, text: str) -> int:
-        val = float(match.group(1))
-        unit = match.group(2).lower()
-        
-        if unit in ['giờ', 'h', 'g', 'tiếng']:
-            if re.search(r'\b(?:trước|sớm|sau|lại|truoc|som|lai)\b', match.group(0), re.IGNORECASE):
-                return int(val * 60)
-            return None
-        
-        if unit in ['phút', 'p', 'ph']:
+    def _reminder_value(self, num: str, unit: str, has_adverb: bool) -> int:
+        val = float(num)
+        if unit in MINUTE_UNITS:
             return int(val)
-        
-        return int(val * 60)
+        # Đơn vị giờ chỉ tính là giờ nhắc khi có "trước/sớm/sau/lại..."
+        if has_adverb:
+            return int(val * 60)
+        return None
     
-    def extract_date(self, text: str) -> datetime:
-        text = text.lower()
-        today = datetime.now()
-        weekday_date = self._extract_weekday_date(text, today)
+    def extract_date(self, text: str, now: Optional[datetime] = None) -> datetime:
+        return self._extract_date(TimeTokens(text.lower()), now or datetime.now())
+
+    def _extract_date(self, tt: TimeTokens, today: datetime) -> datetime:
+        weekday_date = self._extract_weekday_date(tt, today)
         if weekday_date:
             return weekday_date
 
-        relative_date = self._extract_relative_date(text, today)
+        relative_date = self._extract_relative_date(tt, today)
         if relative_date:
             return relative_date
         
         return today.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    def _extract_relative_date(self, text: str, today: datetime) -> datetime:
-        mapping = {
-            r'hôm nay|bữa nay': 0,
-            r'ngày mai|sáng mai|chiều mai|tối mai|mai\s': 1,
-            r'mốt|ngày kia': 2,
-            r'hôm qua': -1,
-            r'tuần sau|tuần tới': 'weeks:1',
-            r'tháng sau': 'months:1',
-            r'năm sau': 'years:1',
-        }
+    def _extract_relative_date(self, tt: TimeTokens, today: datetime) -> datetime:
+        if not tt.words & RELATIVE_WORDS:
+            return None
         
-        for pattern, offset in mapping.items():
-            if re.search(pattern, text):
+        for phrases, offset in RELATIVE_DATES:
+            matched = any(tt.has_phrase(p) for p in phrases)
+            # "mai" đứng riêng (phải có khoảng trắng phía sau)
+            if offset == 1 and not matched:
+                matched = any(word == "mai" and tt.space_after(i) for i, (_, word, _, _) in enumerate(tt.tokens))
+            if matched:
                 if isinstance(offset, int):
                     return (today + timedelta(days=offset)).replace(hour=0, minute=0, second=0, microsecond=0)
                 else:
@@ -210,12 +502,28 @@ class TimeParser:
         
         return None
     
-    def _extract_weekday_date(self, text: str, today: datetime) -> datetime:
-        match = re.search(r'(thứ\s+(\w+|\d+)|chủ nhật|cn)', text)
-        if not match:
+    def _extract_weekday_date(self, tt: TimeTokens, today: datetime) -> datetime:
+        if not tt.words & WEEKDAY_WORDS:
+            return None
+        text, tokens = tt.text, tt.tokens
+        thu_str = None
+        for i, (_, word, start, end) in enumerate(tokens):
+            if word == "thứ" and i + 1 < len(tokens) and tt.spaced(i + 1) and _is_word_char(text[tokens[i + 1][2]]):
+                # thứ + cả cụm chữ/số liền sau (vd: "thứ 2", "thứ hai")
+                run_end = tokens[i + 1][2]
+                while run_end < len(text) and _is_word_char(text[run_end]):
+                    run_end += 1
+                thu_str = text[start:run_end]
+            elif word == "chủ" and tt.phrase_at(i, ("chủ", "nhật")):
+                thu_str = "chủ nhật"
+            elif word == "cn":
+                thu_str = "cn"
+            if thu_str:
+                break
+        if not thu_str:
             return None
         
-        thu_str = match.group(1).replace("t2", "thứ 2").replace("t3", "thứ 3")
+        thu_str = thu_str.replace("t2", "thứ 2").replace("t3", "thứ 3")
         
         for key, target_weekday in self.weekday_map.items():
             if key in thu_str:
@@ -225,7 +533,7 @@ class TimeParser:
                 if days_ahead <= 0:
                     days_ahead += 7
                 
-                if ("tuần sau" in text or "tuần tới" in text) and days_ahead <= 7:
+                if any(tt.has_phrase(p) for p in NEXT_WEEK_PHRASES) and days_ahead <= 7:
                     days_ahead += 7
                 
                 result = today + timedelta(days=days_ahead)
@@ -233,32 +541,60 @@ class TimeParser:
         
         return None
     
-    def parse(self, text: str) -> dict:
-        original_text = text
-        text = self._normalize_text(text)
+    def parse(self, text: str, now: Optional[datetime] = None) -> dict:
+        """Phân tích thời gian; now là mốc "hiện tại" (mặc định datetime.now()), cùng now thì cùng kết quả."""
+        return self.parse_detailed(text, now)[0]
+
+    def parse_detailed(self, text: str, now: Optional[datetime] = None) -> Tuple[dict, bool]:
+        """Như parse, kèm cờ cho biết kết quả có phụ thuộc giờ hiện tại (không chỉ ngày) hay không."""
+        # Mọi bước (ngày, giờ nhắc mặc định, "nãy giờ") dùng chung một mốc thời gian
+        if now is None:
+            now = datetime.now()
+        uses_clock = False
+        lowered = text.lower()
+        
+        if not _TIME_GATE.search(lowered):
+            # Không có số: chuẩn hóa không đổi gì và mọi bước ngoài ngày đều trả về None
+            if _DATE_GATE.search(lowered):
+                self._count("parse", "parse_date_only")
+                date = self._extract_date(TimeTokens(lowered), now)
+            else:
+                self._count("parse", "parse_date_only", "parse_skipped")
+                date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            return {"date": date, "start_time": None, "end_time": None, "duration": None, "reminder_minutes": None}, uses_clock
+        
+        self._count("parse")
+        tt = self.tokenize(text)
+        # Ngày được đọc trên câu gốc (chưa chuẩn hóa "kém", "rưỡi"...)
+        date_tokens = tt if tt.text == lowered else TimeTokens(lowered)
         
         result = {
-            "date": self.extract_date(original_text),
+            "date": self._extract_date(date_tokens, now),
             "start_time": None,
             "end_time": None,
             "duration": None,
             "reminder_minutes": None
         }
         
-        result["reminder_minutes"] = self._extract_reminder(text)
+        result["reminder_minutes"] = self._extract_reminder(tt)
         
-        range_result = self._parse_range_time(text, result["date"])
+        range_result = self._parse_range_time(tt, result["date"])
         if range_result:
             result.update(range_result)
-            return result
+            return result, uses_clock
         
-        result["start_time"] = self._parse_start_time(text)
+        start_match = self._match_start_prefix(tt)
+        if start_match:
+            result["start_time"] = start_match[2]
+        else:
+            result["start_time"] = self._find_start_time(tt)
         if result["reminder_minutes"] is not None and result["start_time"] is None:
-            now = datetime.now()
             result["start_time"] = {'hour': now.hour, 'minute': now.minute}
+            uses_clock = True
         
-        text_for_duration = self._remove_start_time_from_text(text)
-        result["duration"] = self._parse_duration_str(text_for_duration)
+        # Giờ bắt đầu "lúc 9h" không được tính là thời lượng
+        tokens_for_duration = tt.without(start_match[0], start_match[1]) if start_match else tt
+        result["duration"] = self._parse_duration(tokens_for_duration)
         
         if result["start_time"] and result["duration"]:
             dt_start = result["date"].replace(
@@ -269,8 +605,7 @@ class TimeParser:
             result["end_time"] = {'hour': dt_end.hour, 'minute': dt_end.minute}
         
         if result["start_time"] and not result["end_time"] and not result["duration"]:
-            if re.search(r'(?:nãy giờ|tới giờ|đến giờ|tới nay|từ nãy)', text):
-                now = datetime.now()
+            if any(tt.has_phrase(p) for p in SINCE_PHRASES):
                 dt_start = result["date"].replace(
                     hour=result["start_time"]['hour'],
                     minute=result["start_time"]['minute']
@@ -279,20 +614,41 @@ class TimeParser:
                     dt_start -= timedelta(days=1)
                 result["end_time"] = {'hour': now.hour, 'minute': now.minute}
                 result["duration"] = now - dt_start
+                uses_clock = True
         
-        return result
+        return result, uses_clock
     
-    def _parse_range_time(self, text: str, date: datetime) -> dict:
-        match = re.search(
-            r'(?:từ|bắt đầu)\s+(.*?)\s+(?:đến|tới|kết thúc lúc|xong lúc)\s+(.*)',
-            text
-        )
+    def _parse_range_time(self, tt: TimeTokens, date: datetime) -> dict:
+        """từ/bắt đầu <giờ 1> đến/tới/kết thúc lúc/xong lúc <giờ 2>."""
+        tokens = tt.tokens
+        n = len(tokens)
+        first = None
+        for i, (_, word, _, _) in enumerate(tokens):
+            if word == "từ":
+                first = i + 1
+            elif word == "bắt" and tt.phrase_at(i, ("bắt", "đầu")):
+                first = i + 2
+            if first is not None:
+                break
+        if first is None or first >= n or not tt.spaced(first):
+            return None
         
+        match = None
+        for j in range(first + 1, n):
+            if not tt.spaced(j):
+                continue
+            for end_words in RANGE_ENDS:
+                last = j + len(end_words) - 1
+                if last + 1 < n and tt.phrase_at(j, end_words) and tt.space_after(last):
+                    match = (j, last + 1)
+                    break
+            if match:
+                break
         if not match:
             return None
         
-        t1 = self._parse_time_str(match.group(1), text)
-        t2 = self._parse_time_str(match.group(2), text)
+        t1 = self._parse_time_tokens(tt, first, match[0])
+        t2 = self._parse_time_tokens(tt, match[1], n)
         
         if not (t1 and t2):
             return None
@@ -309,35 +665,105 @@ class TimeParser:
             "duration": dt2 - dt1
         }
     
-    def _parse_start_time(self, text: str) -> dict:
-        match = re.search(
-            r'(?:lúc|vào|từ|bắt đầu|kể từ)\s*(\d{1,2}(?::\d{2}|h|g| giờ)?(?:\s*\d{1,2})?)',
-            text
-        )
-        
-        if match:
-            return self._parse_time_str(match.group(0), text)
-        
-        for match in re.finditer(r'(\d{1,2})(?::|h|g| giờ)\s*(\d{1,2})?', text):
-            pre = text[max(0, match.start()-10):match.start()]
+    def _match_start_prefix(self, tt: TimeTokens) -> Optional[Tuple[int, int, dict]]:
+        """lúc/vào/từ/bắt đầu/kể từ + giờ. Trả về (start, end) của cả cụm và giờ đọc được."""
+        tokens, text = tt.tokens, tt.text
+        n = len(tokens)
+        for i, (_, word, start, _) in enumerate(tokens):
+            width = START_PREFIXES.get(word)
+            if width is None:
+                continue
+            if width == 2 and not (tt.phrase_at(i, ("bắt", "đầu")) or tt.phrase_at(i, ("kể", "từ"))):
+                continue
+            j = i + width
+            if j >= n or tokens[j][0] != NUM:
+                continue
+            
+            num, num_start, num_end = tokens[j][1], tokens[j][2], tokens[j][3]
+            digits = num.split(".", 1)[0]
+            hour = int(digits[:2])
+            minute = None
+            end = num_start + min(len(digits), 2)
+            k = j + 1
+            if len(digits) > 2:
+                # Chữ số thứ 3, 4 được đọc như phần phút nhưng không có đơn vị
+                end = num_start + min(len(digits), 4)
+            elif "." in num:
+                pass
+            elif k + 1 < n and tokens[k][1] == ":" and tokens[k][2] == num_end and tokens[k + 1][0] == NUM \
+                    and tokens[k + 1][2] == tokens[k][3] and len(tokens[k + 1][1].split(".", 1)[0]) >= 2:
+                minute_digits = tokens[k + 1][1].split(".", 1)[0]
+                minute = int(minute_digits[:2])
+                end = tokens[k + 1][2] + 2
+                if len(minute_digits) > 2:
+                    end += min(len(minute_digits) - 2, 2)
+                elif "." not in tokens[k + 1][1] and k + 2 < n and tokens[k + 2][0] == NUM:
+                    end = tokens[k + 2][2] + min(len(tokens[k + 2][1].split(".", 1)[0]), 2)
+            elif k < n and tokens[k][2] == num_end and tokens[k][0] not in (NUM, PUNCT) and tokens[k][1][0] in "hg":
+                minute = 0
+                end = tokens[k][2] + 1
+                if tokens[k][1] in ("h", "g") and k + 1 < n and tokens[k + 1][0] == NUM:
+                    minute = _lead2(tokens[k + 1][1])
+                    end = tokens[k + 1][2] + min(len(tokens[k + 1][1].split(".", 1)[0]), 2)
+            elif k < n and text[num_end:tokens[k][2]] == " " and tokens[k][1].startswith("giờ"):
+                # " giờ": khớp tới chữ "g" nên phút phía sau không được đọc
+                minute = 0
+                end = tokens[k][2] + 3
+                if tokens[k][1] == "giờ" and k + 1 < n and tokens[k + 1][0] == NUM:
+                    end = tokens[k + 1][2] + min(len(tokens[k + 1][1].split(".", 1)[0]), 2)
+            elif k < n and tokens[k][0] == NUM and "." not in num:
+                end = tokens[k][2] + min(len(tokens[k][1].split(".", 1)[0]), 2)
+            
+            if minute is not None:
+                time = self._adjust_am_pm(hour, minute, text)
+            elif "lúc" in text or "vào" in text:
+                time = self._adjust_am_pm(hour, 0, text)
+            else:
+                time = None
+            return start, end, time
+        return None
+    
+    def _find_start_time(self, tt: TimeTokens) -> dict:
+        """Giờ viết liền đơn vị (9h, 7g30, 19:30, 8 giờ) không đứng sau trong/khoảng/nhắc..."""
+        tokens, text = tt.tokens, tt.text
+        n = len(tokens)
+        pos = 0
+        for i in range(n - 1):
+            kind, num, _, num_end = tokens[i]
+            if kind != NUM:
+                continue
+            unit_kind, unit, unit_start, _ = tokens[i + 1]
+            if unit_start == num_end and (unit == ":" or (unit_kind not in (NUM, PUNCT) and unit[0] in "hg")):
+                end = unit_start + 1
+                # Phút chỉ được đọc sau ":" / "h" / "g" đứng riêng
+                reads_minute = unit in (":", "h", "g")
+            elif text[num_end:unit_start] == " " and unit.startswith("giờ"):
+                end = unit_start + 3
+                reads_minute = False
+            else:
+                continue
+            match_start = num_end - min(len(num.rsplit(".", 1)[-1]), 2)
+            if match_start < pos:
+                # Cụm trước đã đọc một phần số này làm phút ("12:30|5 giờ"): phần còn lại vẫn có thể là giờ
+                if pos >= num_end:
+                    continue
+                match_start = pos
+            minute = 0
+            if (reads_minute or unit == "giờ") and i + 2 < n and tokens[i + 2][0] == NUM:
+                digits = tokens[i + 2][1].split(".", 1)[0]
+                end = tokens[i + 2][2] + min(len(digits), 2)
+                # " giờ 30": chỉ khớp tới chữ "g" nên phút không được tính (giữ đúng hành vi cũ)
+                if reads_minute:
+                    minute = int(digits[:2])
+            pos = end
             
+            pre = text[max(0, match_start - 10):match_start]
             if any(x in pre for x in ['trong', 'khoảng', 'mất', 'dài', 'trước', 'sớm', 'nhắc', 'báo']):
                 continue
             
-            return self._parse_time_str(match.group(0), text)
+            return self._adjust_am_pm(int(text[match_start:num_end]), minute, text)
         
         return None
-    
-    def _remove_start_time_from_text(self, text: str) -> str:
-        match = re.search(
-            r'(?:lúc|vào|từ|bắt đầu|kể từ)\s*(\d{1,2}(?::\d{2}|h|g| giờ)?(?:\s*\d{1,2})?)',
-            text
-        )
-        
-        if match:
-            return text[:match.start()] + " " + text[match.end():]
-        
-        return text
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 import json
 import os
 
+try:
+    from nlp.gazetteer import build_from_json
+except ImportError:
+    from gazetteer import build_from_json
+
 # ==========================================
 # 1. KHAI BÁO DỮ LIỆU AMBIGUITY (BIGRAM - TRỌNG TÂM)
 # ==========================================
@@ -354,6 +359,9 @@ def setup():
     with open(os.path.join(data_dir, "locations.json"), "w", encoding="utf-8") as f:
         json.dump(locations_dict, f, ensure_ascii=False, indent=2)
 
+    # Dựng lại locations.gaz (mmap) cùng lúc để file gọn không cũ hơn locations.json
+    build_from_json(os.path.join(data_dir, "locations.json"), os.path.join(data_dir, "locations.gaz"))
+
     print(f"✅ ĐÃ UPDATE DỮ LIỆU THÀNH CÔNG! ({len(ambiguity_dict)} cặp ngữ cảnh, {len(teencode_dict)} từ teencode)")
 
 if __name__ == "__main__":